@@ -0,0 +1,292 @@
+"""
+MikuBot Audio Cache Module
+Keeps a size-bounded local copy of frequently played tracks so hot songs
+(like the /playmiku playlist) don't get streamed from YouTube on every play.
+Disabled unless AUDIO_CACHE_ENABLED is set in .env
+"""
+
+import asyncio
+import json
+import os
+import time
+from dotenv import load_dotenv
+import metrics
+
+# Load environment variables
+load_dotenv()
+
+# Cache settings (all optional, set in .env)
+AUDIO_CACHE_ENABLED = os.getenv('AUDIO_CACHE_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+AUDIO_CACHE_DIR = os.getenv('AUDIO_CACHE_DIR', 'audio_cache')
+AUDIO_CACHE_MAX_MB = int(os.getenv('AUDIO_CACHE_MAX_MB', '2048'))  # Disk budget for cached audio
+AUDIO_CACHE_MIN_PLAYS = int(os.getenv('AUDIO_CACHE_MIN_PLAYS', '3'))  # Plays before a track gets downloaded
+
+# The index, cleanup and disk budget all assume one process owns the folder,
+# so each process of a sharded bot gets its own, e.g. audio_cache/shards-0-1
+_shard_ids = [shard_id.strip() for shard_id in os.getenv('SHARD_IDS', '').split(',') if shard_id.strip()]
+if _shard_ids:
+    AUDIO_CACHE_DIR = os.path.join(AUDIO_CACHE_DIR, 'shards-' + '-'.join(_shard_ids))
+
+INDEX_FILE = os.path.join(AUDIO_CACHE_DIR, 'index.json')
+
+# Play counters are kept for every track we've seen, so cap them
+MAX_TRACKED_PLAYS = 10000
+
+# Don't rewrite the index file more often than this (seconds) just for play counts
+INDEX_SAVE_INTERVAL = 30
+
+# yt-dlp options for background downloads (single video, straight into the cache dir)
+cache_ytdl_options = {
+    'format': 'bestaudio/best',
+    'outtmpl': os.path.join(AUDIO_CACHE_DIR, '%(id)s.%(ext)s'),
+    'restrictfilenames': True,
+    'noplaylist': True,
+    'nocheckcertificate': True,
+    'ignoreerrors': False,
+    'logtostderr': False,
+    'quiet': True,
+    'no_warnings': True,
+    'noprogress': True,
+    'source_address': '0.0.0.0',
+}
+
+# index = {'tracks': {video_id: entry}, 'plays': {video_id: count}}
+_index = None
+_index_dirty = False
+_last_index_save = 0
+_pending_downloads = set()
+_download_tasks = set()  # Keep references so background tasks aren't garbage collected
+_download_lock = None
+
+
+def _load_index():
+    """Load the cache index from disk (once) and drop entries that fail integrity checks"""
+    global _index
+    if _index is not None:
+        return _index
+
+    try:
+        with open(INDEX_FILE, 'r') as f:
+            _index = json.load(f)
+    except FileNotFoundError:
+        _index = {}
+    except Exception as e:
+        print(f"Error loading audio cache index: {e}")
+        _index = {}
+
+    _index.setdefault('tracks', {})
+    _index.setdefault('plays', {})
+    verify_cache()
+    return _index
+
+
+def _save_index(force=False):
+    """Write the cache index to disk (atomically, so a crash can't leave half a file)"""
+    global _index_dirty, _last_index_save
+    if _index is None:
+        return
+    if not force and time.time() - _last_index_save < INDEX_SAVE_INTERVAL:
+        _index_dirty = True
+        return
+
+    try:
+        os.makedirs(AUDIO_CACHE_DIR, exist_ok=True)
+        tmp_file = INDEX_FILE + '.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump(_index, f)
+        os.replace(tmp_file, INDEX_FILE)
+        _index_dirty = False
+        _last_index_save = time.time()
+    except Exception as e:
+        print(f"Error saving audio cache index: {e}")
+
+
+def _entry_is_valid(entry):
+    """Check that a cached file exists and is complete"""
+    path = os.path.join(AUDIO_CACHE_DIR, entry.get('file', ''))
+    if not entry.get('file') or not os.path.isfile(path):
+        return False
+    size = os.path.getsize(path)
+    return size > 0 and size == entry.get('size')
+
+
+def verify_cache():
+    """Remove partial downloads, broken index entries and files the index doesn't know about"""
+    if _index is None or not os.path.isdir(AUDIO_CACHE_DIR):
+        return
+
+    tracks = _index['tracks']
+    for video_id in list(tracks):
+        if not _entry_is_valid(tracks[video_id]):
+            print(f"Audio cache: dropping incomplete entry {video_id}")
+            del tracks[video_id]
+
+    known_files = {entry['file'] for entry in tracks.values()}
+    for filename in os.listdir(AUDIO_CACHE_DIR):
+        if filename in known_files or filename in ('index.json', 'index.json.tmp'):
+            continue
+        # Leftover .part/.ytdl files from interrupted downloads, or orphans
+        try:
+            os.remove(os.path.join(AUDIO_CACHE_DIR, filename))
+        except OSError:
+            pass
+
+    _save_index(force=True)
+
+
+def get_cached_track(video_id):
+    """
+    Get the cached copy of a track
+    Returns a track data dict with a local 'path' if cached, None otherwise
+    """
+    if not AUDIO_CACHE_ENABLED or not video_id:
+        return None
+
+    index = _load_index()
+    entry = index['tracks'].get(video_id)
+    if not entry:
+        metrics.cache_requests.inc(cache='audio', result='miss')
+        return None
+
+    if not _entry_is_valid(entry):
+        # File was removed or truncated behind our back
+        del index['tracks'][video_id]
+        _save_index(force=True)
+        metrics.cache_requests.inc(cache='audio', result='miss')
+        return None
+
+    entry['last_used'] = time.time()
+    _save_index()
+    metrics.cache_requests.inc(cache='audio', result='hit')
+    return {
+        'id': video_id,
+        'path': os.path.join(AUDIO_CACHE_DIR, entry['file']),
+        'url': f"https://www.youtube.com/watch?v={video_id}",
+        'title': entry.get('title', 'Unknown'),
+        'duration': entry.get('duration', 0),
+        'thumbnail': entry.get('thumbnail'),
+    }
+
+
+def record_play(video_id):
+    """Count a play and start a background download once a track gets popular enough"""
+    if not AUDIO_CACHE_ENABLED or not video_id:
+        return
+
+    index = _load_index()
+    plays = index['plays']
+    plays[video_id] = plays.get(video_id, 0) + 1
+
+    if len(plays) > MAX_TRACKED_PLAYS:
+        # Forget the least played half
+        keep = sorted(plays, key=plays.get, reverse=True)[:MAX_TRACKED_PLAYS // 2]
+        index['plays'] = {vid: plays[vid] for vid in keep}
+
+    _save_index()
+
+    if index['plays'].get(video_id, 0) >= AUDIO_CACHE_MIN_PLAYS:
+        _start_download(video_id)
+
+
+def prefetch(video_ids):
+    """Download tracks we expect to be played (like the most played ones) if they aren't cached yet"""
+    if not AUDIO_CACHE_ENABLED:
+        return 0
+    return sum(1 for video_id in video_ids if video_id and _start_download(video_id))
+
+
+def _start_download(video_id):
+    """Queue a background download unless the track is cached or already downloading"""
+    if video_id in _load_index()['tracks'] or video_id in _pending_downloads:
+        return False
+    _pending_downloads.add(video_id)
+    task = asyncio.get_running_loop().create_task(_download_track(video_id))
+    _download_tasks.add(task)
+    task.add_done_callback(_download_tasks.discard)
+    return True
+
+
+def _download_blocking(video_id):
+    """Download a track into the cache dir (runs in executor)"""
+    import yt_dlp  # Imported here so it isn't loaded at startup
+    os.makedirs(AUDIO_CACHE_DIR, exist_ok=True)
+    with yt_dlp.YoutubeDL(cache_ytdl_options) as ydl:
+        info = ydl.extract_info(f"https://www.youtube.com/watch?v={video_id}", download=True)
+        if 'entries' in info:
+            info = info['entries'][0]
+        path = ydl.prepare_filename(info)
+
+    # Integrity check - the file must exist and match the size yt-dlp expected
+    if not os.path.isfile(path):
+        raise Exception("download finished but file is missing")
+    size = os.path.getsize(path)
+    expected = info.get('filesize')
+    if size == 0 or (expected and size != expected):
+        os.remove(path)
+        raise Exception(f"downloaded file is incomplete ({size}/{expected} bytes)")
+    return path, size, info
+
+
+async def _download_track(video_id):
+    """Background download of a single track, followed by eviction"""
+    global _download_lock
+    if _download_lock is None:
+        # One download at a time so caching never competes with playback for bandwidth
+        _download_lock = asyncio.Lock()
+
+    try:
+        async with _download_lock:
+            loop = asyncio.get_running_loop()
+            path, size, info = await loop.run_in_executor(None, lambda: _download_blocking(video_id))
+
+            _index['tracks'][video_id] = {
+                'file': os.path.basename(path),
+                'size': size,
+                'last_used': time.time(),
+                'title': info.get('title', 'Unknown'),
+                'duration': info.get('duration', 0),
+                'thumbnail': info.get('thumbnail'),
+            }
+            _evict(keep=video_id)
+            _save_index(force=True)
+            print(f"Audio cache: stored {info.get('title', video_id)} ({size // 1024} KB)")
+    except Exception as e:
+        print(f"Audio cache: failed to download {video_id}: {e}")
+    finally:
+        _pending_downloads.discard(video_id)
+
+
+def _evict(keep=None):
+    """Remove least recently used tracks until the cache fits in the disk budget"""
+    tracks = _index['tracks']
+    budget = AUDIO_CACHE_MAX_MB * 1024 * 1024
+    total = sum(entry.get('size', 0) for entry in tracks.values())
+
+    for video_id in sorted(tracks, key=lambda vid: tracks[vid].get('last_used', 0)):
+        if total <= budget:
+            break
+        if video_id == keep:
+            continue
+        entry = tracks.pop(video_id)
+        total -= entry.get('size', 0)
+        try:
+            os.remove(os.path.join(AUDIO_CACHE_DIR, entry['file']))
+        except OSError:
+            pass
+
+
+def cache_stats():
+    """Get number of cached tracks and total size in bytes"""
+    if not AUDIO_CACHE_ENABLED:
+        return {'tracks': 0, 'bytes': 0}
+    tracks = _load_index()['tracks']
+    return {
+        'tracks': len(tracks),
+        'bytes': sum(entry.get('size', 0) for entry in tracks.values()),
+    }
+
+
+def flush():
+    """Write any pending index changes (call before shutting down)"""
+    if _index is not None and _index_dirty:
+        _save_index(force=True)
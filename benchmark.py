@@ -0,0 +1,285 @@
+"""
+MikuBot Offline Benchmarks
+Times the bot's hot paths without Discord, YouTube or network access.
+yt-dlp and Discord objects are replaced with small stand-ins.
+
+Usage:
+    python benchmark.py                         # Run everything and print a table
+    python benchmark.py --json results.json     # Also save machine-readable results
+    python benchmark.py --only queue            # Run benchmarks whose name contains 'queue'
+    python benchmark.py --compare old.json new.json
+"""
+
+import argparse
+import asyncio
+import atexit
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# Keep every file the bot writes inside a temp dir, and make sure optional features stay offline
+WORK_DIR = tempfile.mkdtemp(prefix='mikubot-bench-')
+os.environ['STATE_BACKEND'] = 'json'
+os.environ['AUDIO_CACHE_ENABLED'] = 'false'
+atexit.register(shutil.rmtree, WORK_DIR, ignore_errors=True)
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+ORIGINAL_DIR = os.getcwd()
+sys.path.insert(0, REPO_DIR)
+os.chdir(WORK_DIR)
+
+import main  # noqa: E402
+import miku_responses  # noqa: E402
+import state_backend  # noqa: E402
+
+
+class FakeUser:
+    """Stand-in for discord.User / discord.Member"""
+    def __init__(self, user_id):
+        self.id = user_id
+        self.bot = False
+
+
+def make_tracks(count, prefix='t'):
+    """Build track dicts like the ones add_to_queue creates"""
+    requester = FakeUser(1234)
+    return [{
+        'url': f"https://www.youtube.com/watch?v={prefix}{i:08d}",
+        'title': f"Hatsune Miku - Benchmark Song {i} (feat. Someone Else)",
+        'duration': 180 + i % 120,
+        'thumbnail': f"https://i.ytimg.com/vi/{prefix}{i:08d}/hqdefault.jpg",
+        'video_id': f"{prefix}{i:08d}",
+        'requester': requester,
+    } for i in range(count)]
+
+
+def make_messages(count):
+    """A mix of chat messages, mostly without triggers like real chat"""
+    words = ['the', 'song', 'is', 'really', 'good', 'today', 'anyone', 'playing', 'later', 'lol',
+             'what', 'do', 'you', 'think', 'about', 'this', 'new', 'album', 'gg', 'nice']
+    triggers = ['miku', 'good morning', 'merry christmas', 'hello', 'hatsune miku', 'xmas']
+    rng = random.Random(42)
+    messages = []
+    for i in range(count):
+        message = ' '.join(rng.choice(words) for _ in range(rng.randint(3, 25)))
+        if i % 10 == 0:
+            message += ' ' + rng.choice(triggers)
+        if i % 50 == 0:
+            message = '<@999> ' + message
+        messages.append(message)
+    return messages
+
+
+def time_it(func, repeat, setup=None):
+    """Run func repeat times (after optional setup each time) and return the durations"""
+    durations = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - started)
+    return durations
+
+
+def fresh_state():
+    """Start from an empty JSON backend"""
+    for filename in os.listdir(WORK_DIR):
+        os.remove(os.path.join(WORK_DIR, filename))
+    backend = state_backend.JsonFileBackend(state_backend.JSON_FILES)
+    state_backend._backend = backend
+    main.state = backend
+    main.music_players.clear()
+
+
+def bench_save_queue(guilds=200, tracks=500, repeat=20):
+    """save_queue for one guild while many guilds are saved"""
+    fresh_state()
+    players = []
+    for guild_id in range(1, guilds + 1):
+        player = main.MusicPlayer(guild_id=guild_id)
+        player.queue = make_tracks(tracks)
+        player.save_queue()
+        players.append(player)
+    return time_it(lambda: players[0].save_queue(), repeat), {'guilds': guilds, 'tracks_per_guild': tracks}
+
+
+def bench_load_queue(guilds=200, tracks=500, repeat=10):
+    """Cold load of every guild's saved queue (a restart)"""
+    fresh_state()
+    for guild_id in range(1, guilds + 1):
+        player = main.MusicPlayer(guild_id=guild_id)
+        player.queue = make_tracks(tracks)
+        player.save_queue()
+
+    def load_all():
+        backend = state_backend.JsonFileBackend(state_backend.JSON_FILES)
+        main.state = backend
+        for guild_id in range(1, guilds + 1):
+            main.MusicPlayer(guild_id=guild_id)
+
+    return time_it(load_all, repeat), {'guilds': guilds, 'tracks_per_guild': tracks}
+
+
+def bench_play_next_loop_wrap(tracks=5000, repeat=50):
+    """play_next when a looped queue runs out and is rebuilt from original_queue"""
+    player = main.MusicPlayer()
+    player.voice_client = object()
+    player.loop_queue = True
+    player.original_queue = make_tracks(tracks)
+    player.play_current = lambda ctx, start=0, paused=False: None  # No audio
+
+    def setup():
+        player.queue = []
+        player.current = player.original_queue[-1]
+
+    return time_it(lambda: player.play_next(None), repeat, setup), {'tracks': tracks}
+
+
+def bench_shuffle_queue(tracks=5000, repeat=50):
+    """shuffle_queue with queue loop on (rebuilds original_queue too)"""
+    player = main.MusicPlayer()
+    player.queue = make_tracks(tracks)
+    player.loop_queue = True
+    player.current = player.queue[0]
+    return time_it(player.shuffle_queue, repeat), {'tracks': tracks}
+
+
+def bench_queue_display(tracks=5000, repeat=200):
+    """get_queue_display_text for the first, a middle and the last page"""
+    player = main.MusicPlayer()
+    player.queue = make_tracks(tracks)
+    player.current = player.queue[0]
+    last_page = (tracks - 1) // 15
+
+    def render():
+        for page in (0, last_page // 2, last_page):
+            player.get_queue_display_text(page=page, per_page=15)
+
+    return time_it(render, repeat), {'tracks': tracks, 'pages_per_op': 3}
+
+
+def bench_message_triggers(messages=2000, repeat=10):
+    """check_message_triggers over a corpus of chat messages"""
+    corpus = make_messages(messages)
+    bot_user = FakeUser(999)
+
+    def check_all():
+        for message in corpus:
+            miku_responses.check_message_triggers(message, bot_user)
+
+    return time_it(check_all, repeat), {'messages': messages}
+
+
+def bench_actor_throughput(senders=50, messages_per_sender=200, repeat=5):
+    """Concurrent state changes through one player's actor mailbox"""
+    async def run():
+        player = main.MusicPlayer()
+        counter = {'n': 0}
+
+        def bump():
+            counter['n'] += 1
+
+        async def sender():
+            for _ in range(messages_per_sender):
+                await player.send(bump)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(sender() for _ in range(senders)))
+        duration = time.perf_counter() - started
+        player.close()
+        assert counter['n'] == senders * messages_per_sender
+        return duration
+
+    durations = [asyncio.run(run()) for _ in range(repeat)]
+    total = senders * messages_per_sender
+    return durations, {'messages': total, 'messages_per_s': round(total / statistics.median(durations))}
+
+
+BENCHMARKS = {
+    'save_queue': bench_save_queue,
+    'load_queue': bench_load_queue,
+    'play_next_loop_wrap': bench_play_next_loop_wrap,
+    'shuffle_queue': bench_shuffle_queue,
+    'queue_display': bench_queue_display,
+    'message_triggers': bench_message_triggers,
+    'actor_throughput': bench_actor_throughput,
+}
+
+
+def git_commit():
+    """Current commit hash, so results can be matched to code"""
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return None
+
+
+def run_benchmarks(only=None):
+    """Run benchmarks and return results as a dict"""
+    results = {
+        'meta': {
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'benchmarks': {},
+    }
+    for name, bench in BENCHMARKS.items():
+        if only and only not in name:
+            continue
+        durations, params = bench()
+        results['benchmarks'][name] = {
+            'median_s': statistics.median(durations),
+            'min_s': min(durations),
+            'max_s': max(durations),
+            'runs': len(durations),
+            'params': params,
+        }
+        print(f"{name:<22} median {statistics.median(durations) * 1000:9.3f} ms   "
+              f"min {min(durations) * 1000:9.3f} ms   {params}")
+    return results
+
+
+def compare(old_file, new_file):
+    """Print median time changes between two result files"""
+    with open(os.path.join(ORIGINAL_DIR, old_file), 'r') as f:
+        old = json.load(f)
+    with open(os.path.join(ORIGINAL_DIR, new_file), 'r') as f:
+        new = json.load(f)
+
+    print(f"{'benchmark':<22} {'old (ms)':>10} {'new (ms)':>10} {'change':>8}")
+    for name, new_result in new['benchmarks'].items():
+        old_result = old['benchmarks'].get(name)
+        if not old_result:
+            print(f"{name:<22} {'-':>10} {new_result['median_s'] * 1000:10.3f} {'new':>8}")
+            continue
+        ratio = new_result['median_s'] / old_result['median_s'] if old_result['median_s'] else 0
+        print(f"{name:<22} {old_result['median_s'] * 1000:10.3f} "
+              f"{new_result['median_s'] * 1000:10.3f} {(ratio - 1) * 100:+7.1f}%")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline benchmarks for MikuBot's hot paths")
+    parser.add_argument('--json', help="Write results to this file")
+    parser.add_argument('--only', help="Only run benchmarks whose name contains this")
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help="Compare two result files")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+    else:
+        results = run_benchmarks(args.only)
+        if args.json:
+            with open(os.path.join(ORIGINAL_DIR, args.json), 'w') as f:
+                json.dump(results, f, indent=2)
+            print(f"Saved results to {args.json}")
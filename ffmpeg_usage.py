@@ -0,0 +1,170 @@
+"""
+MikuBot ffmpeg Usage Module
+Tracks the CPU, memory and bytes read of each guild's ffmpeg process (from /proc),
+enforces per-process limits, and caps how many ffmpeg processes run at once so
+new playback waits for a slot instead of overloading the host.
+
+All limits are off unless set in .env; usage sampling only works on Linux.
+"""
+
+import asyncio
+import os
+import time
+from dotenv import load_dotenv
+import metrics
+
+# Load environment variables
+load_dotenv()
+
+FFMPEG_MAX_PROCESSES = int(os.getenv('FFMPEG_MAX_PROCESSES', '0'))  # Concurrent ffmpeg processes, 0 = no cap
+FFMPEG_MAX_CPU_PERCENT = float(os.getenv('FFMPEG_MAX_CPU_PERCENT', '0'))  # Per process (100 = one core), 0 = no limit
+FFMPEG_MAX_RSS_MB = int(os.getenv('FFMPEG_MAX_RSS_MB', '0'))  # Per process, 0 = no limit
+FFMPEG_LIMIT_ACTION = os.getenv('FFMPEG_LIMIT_ACTION', 'skip').lower()  # skip, or downgrade (lower quality stream first)
+FFMPEG_SAMPLE_INTERVAL = int(os.getenv('FFMPEG_SAMPLE_INTERVAL', '5'))  # Seconds between samples
+
+# Consecutive samples over a limit before acting, so a short spike (like startup) isn't punished
+LIMIT_STRIKES = 3
+
+try:
+    _CLOCK_TICKS = os.sysconf('SC_CLK_TCK')
+    _PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+except (AttributeError, ValueError, OSError):
+    _CLOCK_TICKS = _PAGE_SIZE = None
+
+# {guild_id: {'pid', 'cpu_percent', 'rss_bytes', 'read_bytes', 'read_rate', 'strikes', ...}}
+usage = {}
+
+_slots = None
+_in_use = 0
+_waiting = 0
+
+
+def read_process_stats(pid):
+    """
+    Read a process' total CPU time, resident memory and bytes read from /proc
+    Returns None if the process is gone or /proc isn't available
+    """
+    if _CLOCK_TICKS is None:
+        return None
+    try:
+        with open(f'/proc/{pid}/stat', 'r') as f:
+            # The command name can contain spaces, so split after its closing parenthesis
+            fields = f.read().rsplit(')', 1)[1].split()
+        with open(f'/proc/{pid}/statm', 'r') as f:
+            rss_pages = int(f.read().split()[1])
+        read_bytes = 0
+        try:
+            with open(f'/proc/{pid}/io', 'r') as f:
+                for line in f:
+                    if line.startswith('rchar:'):
+                        # rchar includes socket reads, so it covers the network stream
+                        read_bytes = int(line.split()[1])
+                        break
+        except OSError:
+            pass  # /proc/<pid>/io needs extra permissions on some systems
+    except (OSError, IndexError, ValueError):
+        return None
+    return {
+        # utime and stime are fields 14 and 15 of stat, 12 and 13 after the command name
+        'cpu_seconds': (int(fields[11]) + int(fields[12])) / _CLOCK_TICKS,
+        'rss_bytes': rss_pages * _PAGE_SIZE,
+        'read_bytes': read_bytes,
+    }
+
+
+def sample(guild_id, pid):
+    """
+    Sample a guild's ffmpeg process and check it against the limits (blocking, file reads)
+    Returns a description of the limit it keeps going over, or None
+    """
+    stats = read_process_stats(pid)
+    if stats is None:
+        usage.pop(guild_id, None)
+        return None
+
+    now = time.monotonic()
+    entry = usage.get(guild_id)
+    if entry is None or entry['pid'] != pid:
+        # New song, new process
+        entry = usage[guild_id] = {'pid': pid, 'cpu_percent': 0.0, 'read_rate': 0.0, 'strikes': 0}
+    else:
+        elapsed = now - entry['sampled_at']
+        if elapsed > 0:
+            entry['cpu_percent'] = (stats['cpu_seconds'] - entry['cpu_seconds']) / elapsed * 100
+            entry['read_rate'] = (stats['read_bytes'] - entry['read_bytes']) / elapsed
+    entry.update(stats, sampled_at=now)
+
+    problem = None
+    if FFMPEG_MAX_CPU_PERCENT and entry['cpu_percent'] > FFMPEG_MAX_CPU_PERCENT:
+        problem = f"CPU ({entry['cpu_percent']:.0f}% > {FFMPEG_MAX_CPU_PERCENT:.0f}%)"
+    elif FFMPEG_MAX_RSS_MB and entry['rss_bytes'] > FFMPEG_MAX_RSS_MB * 1024 * 1024:
+        problem = f"memory ({entry['rss_bytes'] / 1024 / 1024:.0f} MB > {FFMPEG_MAX_RSS_MB} MB)"
+
+    entry['strikes'] = entry['strikes'] + 1 if problem else 0
+    if entry['strikes'] >= LIMIT_STRIKES:
+        entry['strikes'] = 0
+        return problem
+    return None
+
+
+def forget(guild_id):
+    """Drop a guild's usage once it has no ffmpeg process"""
+    usage.pop(guild_id, None)
+
+
+def top_usage(limit=5):
+    """Guilds using the most ffmpeg CPU, as (guild_id, entry) pairs"""
+    return sorted(list(usage.items()), key=lambda item: item[1]['cpu_percent'], reverse=True)[:limit]
+
+
+def _no_slot():
+    pass
+
+
+async def acquire_slot():
+    """
+    Wait for a free ffmpeg slot (immediately if there's no cap)
+    Returns a release function that's safe to call from any thread, more than once
+    """
+    global _slots, _waiting, _in_use
+    if not FFMPEG_MAX_PROCESSES:
+        return _no_slot
+    if _slots is None:
+        _slots = asyncio.Semaphore(FFMPEG_MAX_PROCESSES)
+
+    loop = asyncio.get_running_loop()
+    _waiting += 1
+    try:
+        with metrics.ffmpeg_slot_wait_seconds.time():
+            await _slots.acquire()
+    finally:
+        _waiting -= 1
+    _in_use += 1
+
+    released = False
+
+    def release():
+        nonlocal released
+        if not released:
+            released = True
+            # Sources are cleaned up on the voice thread, the semaphore belongs to the loop
+            loop.call_soon_threadsafe(_release_slot)
+
+    return release
+
+
+def _release_slot():
+    global _in_use
+    _in_use -= 1
+    _slots.release()
+
+
+def slot_stats():
+    """Slots in use and guilds waiting for one"""
+    return {'limit': FFMPEG_MAX_PROCESSES, 'in_use': _in_use, 'waiting': _waiting}
+
+
+# usage is updated from an executor thread, list() takes a consistent copy
+metrics.ffmpeg_cpu_percent.set_function(lambda: sum(entry['cpu_percent'] for entry in list(usage.values())))
+metrics.ffmpeg_rss_bytes.set_function(lambda: sum(entry.get('rss_bytes', 0) for entry in list(usage.values())))
+metrics.ffmpeg_slot_waiters.set_function(lambda: _waiting)
@@ -0,0 +1,150 @@
+"""
+MikuBot Event Loop Monitor
+Measures event loop lag and catches blocking calls: a watchdog thread notices when
+the loop stops responding, and records the stack of whatever is running on it along
+with the command or guild it was working for.
+
+Disabled unless LOOP_MONITOR_ENABLED is set in .env
+"""
+
+import asyncio
+import contextvars
+import os
+import sys
+import threading
+import time
+import traceback
+import weakref
+from collections import deque
+from dotenv import load_dotenv
+import metrics
+
+# Load environment variables
+load_dotenv()
+
+LOOP_MONITOR_ENABLED = os.getenv('LOOP_MONITOR_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+BLOCKING_THRESHOLD = int(os.getenv('LOOP_BLOCKING_THRESHOLD_MS', '100')) / 1000  # Stalls longer than this are recorded
+
+HEARTBEAT_INTERVAL = 0.05  # Seconds between lag measurements
+MAX_OFFENDERS = 50  # Recent stalls kept for /loopstatus
+MAX_STACK_FRAMES = 8  # Innermost frames kept per stall
+
+# What the current task is doing, e.g. "/play guild 123" (read by the watchdog thread through the task's context)
+_activity = contextvars.ContextVar('mikubot_activity', default=None)
+# Before Python 3.12 another thread can't read a task's context, so tasks that tag themselves are also tracked here
+_task_activity = weakref.WeakKeyDictionary()
+
+lags = deque(maxlen=1200)  # Last minute of lag measurements (seconds)
+offenders = deque(maxlen=MAX_OFFENDERS)
+_last_beat = None
+_pending_stall = None  # Captured by the watchdog, completed by the heartbeat once the loop is back
+_started = False
+
+
+def set_activity(label):
+    """Tag the running task (and anything it awaits or starts) with what it's working on"""
+    _activity.set(label)
+    task = asyncio.current_task()
+    if task is not None:
+        _task_activity[task] = label
+
+
+def _describe_task(loop):
+    """Name the task running on the loop and the activity it was tagged with"""
+    try:
+        task = asyncio.current_task(loop)
+    except Exception:
+        task = None
+    if task is None:
+        # A plain callback (like a voice after callback), not a task
+        return None, None
+    coro = task.get_coro()
+    if hasattr(task, 'get_context'):
+        activity = task.get_context().get(_activity)
+    else:
+        activity = _task_activity.get(task)
+    return getattr(coro, '__qualname__', repr(coro)), activity
+
+
+def _capture_stack(thread_id):
+    """The innermost frames of the loop thread, as 'file:line in function' strings"""
+    frame = sys._current_frames().get(thread_id)
+    if frame is None:
+        return []
+    frames = traceback.extract_stack(frame)[-MAX_STACK_FRAMES:]
+    return [f"{os.path.basename(entry.filename)}:{entry.lineno} in {entry.name}" for entry in frames]
+
+
+def _watchdog(loop, thread_id):
+    """Runs in its own thread and captures the loop's stack while it's stalled"""
+    global _pending_stall
+    while not loop.is_closed():
+        time.sleep(BLOCKING_THRESHOLD / 2)
+        beat = _last_beat
+        if beat is None or _pending_stall is not None:
+            continue
+        if time.monotonic() - beat > HEARTBEAT_INTERVAL + BLOCKING_THRESHOLD:
+            coroutine, activity = _describe_task(loop)
+            _pending_stall = {
+                'time': time.time(),
+                'beat': beat,
+                'coroutine': coroutine,
+                'activity': activity,
+                'stack': _capture_stack(thread_id),
+            }
+
+
+async def _heartbeat():
+    """Wake up on a fixed interval, measure how late we ran and close out captured stalls"""
+    global _last_beat, _pending_stall
+    set_activity('loop monitor')
+    loop = asyncio.get_running_loop()
+    while True:
+        _last_beat = time.monotonic()
+        expected = loop.time() + HEARTBEAT_INTERVAL
+        await asyncio.sleep(HEARTBEAT_INTERVAL)
+        lag = max(0.0, loop.time() - expected)
+        lags.append(lag)
+        metrics.loop_lag_seconds.observe(lag)
+
+        if lag >= BLOCKING_THRESHOLD:
+            stall = _pending_stall if _pending_stall is not None and _pending_stall['beat'] == _last_beat else None
+            if stall is None:
+                # Too short for the watchdog to catch in the act
+                stall = {'time': time.time(), 'coroutine': None, 'activity': None, 'stack': []}
+            stall.pop('beat', None)
+            stall['duration'] = lag
+            offenders.append(stall)
+            metrics.blocking_calls.inc()
+        _pending_stall = None
+
+
+def start():
+    """Start the heartbeat task and watchdog thread on the running loop (safe to call more than once)"""
+    global _started
+    if _started:
+        return
+    _started = True
+    loop = asyncio.get_running_loop()
+    loop.create_task(_heartbeat())
+    threading.Thread(
+        target=_watchdog, args=(loop, threading.get_ident()), name='loop-watchdog', daemon=True
+    ).start()
+    print(f"Loop monitor: recording stalls longer than {BLOCKING_THRESHOLD * 1000:.0f}ms")
+
+
+def get_lag_stats():
+    """p50/p99/max loop lag over the last minute, in seconds"""
+    if not lags:
+        return None
+    ordered = sorted(lags)
+    return {
+        'p50': ordered[len(ordered) // 2],
+        'p99': ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))],
+        'max': ordered[-1],
+    }
+
+
+def get_worst_offenders(limit=5):
+    """The longest recent stalls, worst first"""
+    return sorted(offenders, key=lambda stall: stall['duration'], reverse=True)[:limit]
@@ -0,0 +1,130 @@
+"""
+MikuBot Loudness Normalization Module
+Measures each track's loudness once (ffmpeg loudnorm analysis in the background)
+and caches it per video ID, so later plays only need a static volume adjustment.
+"""
+
+import asyncio
+import json
+import os
+import re
+from dotenv import load_dotenv
+import ffmpeg_usage
+import metrics
+import state_backend
+
+# Load environment variables
+load_dotenv()
+
+LOUDNESS_TARGET_LUFS = float(os.getenv('LOUDNESS_TARGET_LUFS', '-14'))
+LOUDNESS_NORMALIZE_DEFAULT = os.getenv('LOUDNESS_NORMALIZE_DEFAULT', 'false').lower() in ('1', 'true', 'yes')
+
+# Keep true peaks below this after applying gain (dBTP)
+MAX_TRUE_PEAK = -1.0
+# Never boost quiet tracks by more than this (dB), to avoid blowing up noise
+MAX_GAIN_DB = 12.0
+
+# {video_id: {'lufs': float, 'peak': float}}
+_cache = None
+_pending = set()
+_tasks = set()  # Keep references so background tasks aren't garbage collected
+_measure_lock = None
+
+
+def _load_cache():
+    """Load measured loudness values from the state backend (once)"""
+    global _cache
+    if _cache is None:
+        try:
+            _cache = state_backend.get_backend().get_all('loudness')
+        except Exception as e:
+            print(f"Error loading loudness cache: {e}")
+            _cache = {}
+    return _cache
+
+
+def _get_measurement(video_id):
+    """Get a measurement, checking the shared backend for ones made by other processes"""
+    cache = _load_cache()
+    if video_id not in cache and state_backend.get_backend().shared:
+        try:
+            measurement = state_backend.get_backend().get('loudness', video_id)
+        except Exception as e:
+            print(f"Error reading loudness cache: {e}")
+            measurement = None
+        if measurement:
+            cache[video_id] = measurement
+    return cache.get(video_id)
+
+
+def get_gain(video_id):
+    """
+    Get the linear gain that brings a track to the target loudness
+    Returns None if the track hasn't been measured yet
+    """
+    if not video_id:
+        return None
+    measurement = _get_measurement(video_id)
+    metrics.cache_requests.inc(cache='loudness', result='hit' if measurement else 'miss')
+    if not measurement:
+        return None
+
+    gain_db = LOUDNESS_TARGET_LUFS - measurement['lufs']
+    gain_db = min(gain_db, MAX_TRUE_PEAK - measurement['peak'], MAX_GAIN_DB)
+    return 10 ** (gain_db / 20)
+
+
+async def _measure(source):
+    """Run a loudnorm analysis pass with ffmpeg and return (lufs, peak)"""
+    process = await asyncio.create_subprocess_exec(
+        'ffmpeg', '-hide_banner', '-nostats', '-vn', '-i', source,
+        '-af', 'loudnorm=print_format=json', '-f', 'null', '-',
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    _, stderr = await process.communicate()
+    if process.returncode != 0:
+        raise Exception(f"ffmpeg exited with code {process.returncode}")
+
+    # loudnorm prints its stats as the last JSON object on stderr
+    match = re.search(r'\{[^{}]*"input_i"[^{}]*\}', stderr.decode(errors='ignore'))
+    if not match:
+        raise Exception("no loudnorm output from ffmpeg")
+    stats = json.loads(match.group(0))
+    return float(stats['input_i']), float(stats['input_tp'])
+
+
+async def _measure_track(video_id, source):
+    """Measure one track in the background and store the result"""
+    global _measure_lock
+    if _measure_lock is None:
+        # One analysis at a time so normalization never costs more than one extra ffmpeg
+        _measure_lock = asyncio.Lock()
+
+    try:
+        async with _measure_lock:
+            # Counts against FFMPEG_MAX_PROCESSES like playback does
+            release_slot = await ffmpeg_usage.acquire_slot()
+            try:
+                lufs, peak = await _measure(source)
+            finally:
+                release_slot()
+        # Silence measures as -inf, which isn't useful for gain
+        if lufs > -70:
+            measurement = {'lufs': lufs, 'peak': peak}
+            _load_cache()[video_id] = measurement
+            state_backend.get_backend().set('loudness', video_id, measurement)
+    except Exception as e:
+        print(f"Error measuring loudness for {video_id}: {e}")
+    finally:
+        _pending.discard(video_id)
+
+
+def schedule_measurement(video_id, source):
+    """Measure a track's loudness in the background if it isn't cached yet"""
+    if not video_id or not source or _get_measurement(video_id) or video_id in _pending:
+        return
+    _pending.add(video_id)
+    task = asyncio.get_running_loop().create_task(_measure_track(video_id, source))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
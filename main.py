@@ -1,15 +1,37 @@
+import time
+STARTUP_STARTED = time.perf_counter()  # For the startup timing breakdown
+
 import discord
 from discord.ext import commands
 from discord import app_commands
 import asyncio
-import yt_dlp
-import spotipy
-from spotipy.oauth2 import SpotifyClientCredentials
 import os
 from dotenv import load_dotenv
 import random
 import re
+import sys
 import json
+import hashlib
+import io
+import signal
+import threading
+from collections import deque
+from typing import Literal
+from urllib.parse import urlparse, parse_qs
+import audio_cache
+import state_backend
+import playlist_snapshots
+import loudness
+import metrics
+import loop_monitor
+import tracing
+import ffmpeg_usage
+import memory_profiler
+import saved_playlists
+import search_cache
+import urls
+import play_history
+import outbound
 
 # Optional: Miku GIF responses module
 # To disable this feature, comment out the import and the message handler below
@@ -26,18 +48,32 @@ load_dotenv()
 intents = discord.Intents.default()
 intents.message_content = True
 intents.voice_states = True
-bot = commands.Bot(command_prefix='!', intents=intents)
 
-# Spotify setup
+# Sharding - run several processes, each owning a range of shards, e.g.
+# SHARD_COUNT=4 and SHARD_IDS=0,1 in one process, SHARD_IDS=2,3 in another
+# Discord only sends a guild's events to the process owning its shard, so its audio always stays there
+SHARD_COUNT = int(os.getenv('SHARD_COUNT', '0'))
+SHARD_IDS = [int(shard_id) for shard_id in os.getenv('SHARD_IDS', '').split(',') if shard_id.strip()] or None
+if SHARD_COUNT:
+    bot = commands.AutoShardedBot(command_prefix='!', intents=intents, shard_count=SHARD_COUNT, shard_ids=SHARD_IDS)
+else:
+    bot = commands.Bot(command_prefix='!', intents=intents)
+
+# Commands showing the whole process (profiling, loop stalls, every server's usage) are owner-only
+# Defaults to the owner of the Discord application, or list user IDs, e.g. BOT_OWNER_IDS=123,456
+BOT_OWNER_IDS = {int(user_id) for user_id in os.getenv('BOT_OWNER_IDS', '').split(',') if user_id.strip()}
+
+
+def owns_guild(guild_id):
+    """Check if this process owns the shard a guild belongs to"""
+    if not SHARD_COUNT or SHARD_IDS is None:
+        return True
+    return (int(guild_id) >> 22) % SHARD_COUNT in SHARD_IDS
+
+# Spotify setup (the client is created on first use, see get_spotify)
 spotify_client_id = os.getenv('SPOTIFY_CLIENT_ID')
 spotify_client_secret = os.getenv('SPOTIFY_CLIENT_SECRET')
 spotify = None
-if spotify_client_id and spotify_client_secret:
-    client_credentials_manager = SpotifyClientCredentials(
-        client_id=spotify_client_id,
-        client_secret=spotify_client_secret
-    )
-    spotify = spotipy.Spotify(client_credentials_manager=client_credentials_manager)
 
 # yt-dlp options
 ytdl_format_options = {
@@ -60,92 +96,352 @@ ffmpeg_options = {
     'before_options': '-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5'
 }
 
-ytdl = yt_dlp.YoutubeDL(ytdl_format_options)
+# Cached tracks are local files, so no reconnect options
+local_ffmpeg_options = {
+    'options': '-vn'
+}
+
+# Queue persistence (see state_backend.py) and warm restore after a restart
+CHECKPOINT_INTERVAL = int(os.getenv('CHECKPOINT_INTERVAL', '30'))  # Seconds between playback position saves
+QUEUE_SAVE_DELAY = 2  # Seconds queue additions are batched before they're saved, so an import is written once
+RESTORE_ON_STARTUP = os.getenv('RESTORE_ON_STARTUP', 'true').lower() in ('1', 'true', 'yes')
+RESTORE_CONCURRENCY = int(os.getenv('RESTORE_CONCURRENCY', '5'))  # Guilds restored at the same time
+RESTORE_CONNECT_INTERVAL = float(os.getenv('RESTORE_CONNECT_INTERVAL', '1.0'))  # Seconds between voice connects per slot
+
+# Idle management
+IDLE_ALONE_TIMEOUT = int(os.getenv('IDLE_ALONE_TIMEOUT', '300'))  # Leave after this long alone in a voice channel
+IDLE_PAUSED_TIMEOUT = int(os.getenv('IDLE_PAUSED_TIMEOUT', '900'))  # Leave after this long paused
+IDLE_EVICT_TIMEOUT = int(os.getenv('IDLE_EVICT_TIMEOUT', '600'))  # Unload players not in voice after this long unused
+IDLE_CHECK_INTERVAL = 30
+
+# Pending state changes per guild before senders have to wait
+MAILBOX_SIZE = 100
+
+# Playback failure handling
+MAX_TRACK_FAILURES = int(os.getenv('MAX_TRACK_FAILURES', '3'))  # Failures before a track is skipped for good
+FAILURE_BACKOFF_BASE = float(os.getenv('FAILURE_BACKOFF_BASE', '1'))  # Seconds, doubled per consecutive failure
+FAILURE_BACKOFF_MAX = float(os.getenv('FAILURE_BACKOFF_MAX', '60'))
+MAX_LOADS_PER_MINUTE = int(os.getenv('MAX_LOADS_PER_MINUTE', '20'))  # Extraction attempts per guild per minute
+
+# Voice reconnects after Discord drops the connection or moves the voice server
+VOICE_RECONNECT_ATTEMPTS = int(os.getenv('VOICE_RECONNECT_ATTEMPTS', '5'))  # Also the resumes allowed per song
+VOICE_RECONNECT_BACKOFF = float(os.getenv('VOICE_RECONNECT_BACKOFF', '1'))  # Seconds, doubled per attempt
+VOICE_RECONNECT_BACKOFF_MAX = 30
+VOICE_CONNECT_TIMEOUT = 10  # Seconds per voice connect attempt
+VOICE_REGION_GRACE = 10  # Seconds discord.py gets to reconnect by itself after a region change
+VOICE_DISCONNECT_GRACE = 2  # Seconds before treating the bot leaving voice as a disconnect
 
 # Fast playlist extraction (flat mode - no full video info)
 playlist_ytdl_options = ytdl_format_options.copy()
 playlist_ytdl_options['extract_flat'] = True
-playlist_ytdl = yt_dlp.YoutubeDL(playlist_ytdl_options)
+
+# Lower quality stream for songs whose ffmpeg goes over its limits (see ffmpeg_usage.py)
+low_quality_ytdl_options = ytdl_format_options.copy()
+low_quality_ytdl_options['format'] = 'worstaudio/worst'
+
+# yt-dlp and spotipy are slow to import, so they're only loaded on first use (or by warm_up)
+ytdl = None
+playlist_ytdl = None
+low_quality_ytdl = None
+_lazy_init_lock = threading.Lock()
+
+
+def get_ytdl():
+    """Get the yt-dlp instance for full extraction"""
+    global ytdl
+    if ytdl is None:
+        with _lazy_init_lock:
+            if ytdl is None:
+                import yt_dlp
+                ytdl = yt_dlp.YoutubeDL(ytdl_format_options)
+    return ytdl
+
+
+def get_playlist_ytdl():
+    """Get the yt-dlp instance for flat playlist extraction"""
+    global playlist_ytdl
+    if playlist_ytdl is None:
+        with _lazy_init_lock:
+            if playlist_ytdl is None:
+                import yt_dlp
+                playlist_ytdl = yt_dlp.YoutubeDL(playlist_ytdl_options)
+    return playlist_ytdl
+
+
+def get_low_quality_ytdl():
+    """Get the yt-dlp instance for low quality streams"""
+    global low_quality_ytdl
+    if low_quality_ytdl is None:
+        with _lazy_init_lock:
+            if low_quality_ytdl is None:
+                import yt_dlp
+                low_quality_ytdl = yt_dlp.YoutubeDL(low_quality_ytdl_options)
+    return low_quality_ytdl
+
+
+def extract_playlist_info(url, download=False):
+    """Flat playlist extraction (blocking, run in an executor)"""
+    with metrics.time_extraction('playlist'):
+        return get_playlist_ytdl().extract_info(url, download=download)
+
+
+def search_youtube(query):
+    """Flat YouTube search for /search and autocomplete (blocking, run in an executor), as track dicts"""
+    with metrics.time_extraction('search_list'):
+        data = get_playlist_ytdl().extract_info(f"ytsearch{search_cache.SEARCH_RESULTS}:{query}", download=False)
+    return playlist_snapshots.tracks_from_info(data)
+
+
+def extract_info(url, kind, download=False, low_quality=False):
+    """Full extraction (blocking, run in an executor), timed as single, search or stream"""
+    with metrics.time_extraction(kind):
+        return (get_low_quality_ytdl() if low_quality else get_ytdl()).extract_info(url, download=download)
+
+
+async def run_in_executor(func, loop=None):
+    """Run a blocking call in the default executor, counting jobs still waiting for a thread"""
+    metrics.executor_queued.inc()
+    
+    def run():
+        metrics.executor_queued.dec()
+        return func()
+    
+    return await (loop or asyncio.get_running_loop()).run_in_executor(None, run)
+
+
+def get_spotify():
+    """Get the Spotify client, None if credentials aren't configured"""
+    global spotify
+    if spotify is None and spotify_client_id and spotify_client_secret:
+        with _lazy_init_lock:
+            if spotify is None:
+                import spotipy
+                from spotipy.oauth2 import SpotifyClientCredentials
+                client_credentials_manager = SpotifyClientCredentials(
+                    client_id=spotify_client_id,
+                    client_secret=spotify_client_secret
+                )
+                spotify = spotipy.Spotify(client_credentials_manager=client_credentials_manager)
+    return spotify
+
+
+def warm_up():
+    """Load yt-dlp and Spotify in the background so the first /play doesn't pay for it"""
+    started = time.perf_counter()
+    get_ytdl()
+    get_playlist_ytdl()
+    get_spotify()
+    return time.perf_counter() - started
+
+
+def parse_timestamp(text):
+    """Parse '90', '1:30' or '1:02:30' into seconds"""
+    seconds = 0
+    for part in text.strip().split(':'):
+        if not part.isdigit():
+            raise ValueError("Use a time like `90`, `1:30` or `1:02:30`")
+        seconds = seconds * 60 + int(part)
+    return seconds
+
+
+def format_timestamp(seconds):
+    """Format seconds as m:ss or h:mm:ss"""
+    seconds = int(seconds or 0)
+    hours, rest = divmod(seconds, 3600)
+    minutes, secs = divmod(rest, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{secs:02d}"
+    return f"{minutes}:{secs:02d}"
+
+
+def stream_url_is_fresh(url, margin=60):
+    """Check that an extracted stream URL hasn't expired (YouTube URLs carry an expire= timestamp)"""
+    if not url:
+        return False
+    try:
+        expire = parse_qs(urlparse(url).query).get('expire', [None])[0]
+    except Exception:
+        return False
+    return expire is None or int(expire) > time.time() + margin
+
+
+def with_seek(options, start):
+    """Add an input-side seek to ffmpeg options"""
+    if not start:
+        return options
+    options = dict(options)
+    # -ss before -i makes ffmpeg jump to the position instead of decoding from the start
+    options['before_options'] = f"-ss {start} {options.get('before_options', '')}".strip()
+    return options
 
 
 class YTDLSource(discord.PCMVolumeTransformer):
-    def __init__(self, source, *, data, volume=0.5):
+    def __init__(self, source, *, data, volume=0.5, start=0):
         super().__init__(source, volume)
         self.data = data
         self.title = data.get('title')
         self.url = data.get('url')
         self.duration = data.get('duration', 0)
         self.thumbnail = data.get('thumbnail')
+        self.start = start  # Where in the track this source started (seconds)
+        self.frames = 0  # 20ms frames delivered to the voice client
+        self.closed = False
+        self.on_first_frame = None  # Called on the voice thread when the first frame is read (for tracing)
+        self.on_cleanup = None  # Releases this source's ffmpeg slot
+        metrics.ffmpeg_processes.inc()
+
+    def read(self):
+        chunk = super().read()
+        if chunk:
+            if self.frames == 0 and self.on_first_frame is not None:
+                self.on_first_frame()
+            self.frames += 1
+        return chunk
+
+    def cleanup(self):
+        # Called by the voice client and by us, only count the process once
+        if not self.closed:
+            self.closed = True
+            metrics.ffmpeg_processes.dec()
+            if self.on_cleanup is not None:
+                self.on_cleanup()
+        super().cleanup()
+
+    @property
+    def pid(self):
+        """Process ID of this source's ffmpeg, None if it isn't running"""
+        process = getattr(self.original, '_process', None)
+        return process.pid if process is not None and process.poll() is None else None
+
+    @property
+    def position(self):
+        """Playback position in seconds, counted from the frames actually delivered"""
+        return self.start + self.frames * discord.opus.Encoder.FRAME_LENGTH / 1000
 
     @classmethod
-    async def from_url(cls, url, *, loop=None, stream=False):
+    def from_data(cls, data, *, start=0, volume=0.5):
+        """
+        Re-create a source from already extracted data, without extracting again
+        Returns None if the data can't be reused (stream URL expired or cached file gone)
+        """
+        if data.get('path'):
+            if not os.path.isfile(data['path']):
+                return None
+            source = discord.FFmpegPCMAudio(data['path'], **with_seek(local_ffmpeg_options, start))
+        elif stream_url_is_fresh(data.get('url')):
+            source = discord.FFmpegPCMAudio(data['url'], **with_seek(ffmpeg_options, start))
+        else:
+            return None
+        return cls(source, data=data, volume=volume, start=start)
+
+    @classmethod
+    async def from_url(cls, url, *, loop=None, stream=False, video_id=None, start=0, trace=tracing.NULL_TRACE,
+                       low_quality=False):
+        # Cache hit - play the local file, skipping extraction and the network
+        cached = audio_cache.get_cached_track(video_id)
+        if cached and not low_quality:
+            with trace.span('ffmpeg_spawn', cached=True):
+                source = cls.from_data(cached, start=start)
+            if source is not None:
+                return source
+            # The cached file is gone, extract as usual
+
         loop = loop or asyncio.get_event_loop()
-        data = await loop.run_in_executor(None, lambda: ytdl.extract_info(url, download=not stream))
+        with trace.span('stream_extract'):
+            data = await run_in_executor(
+                lambda: extract_info(url, 'stream', download=not stream, low_quality=low_quality), loop
+            )
 
         if 'entries' in data:
             # Playlist
             data = data['entries'][0]
 
-        filename = data['url'] if stream else ytdl.prepare_filename(data)
-        return cls(discord.FFmpegPCMAudio(filename, **ffmpeg_options), data=data)
+        filename = data['url'] if stream else get_ytdl().prepare_filename(data)
+        with trace.span('ffmpeg_spawn'):
+            source = discord.FFmpegPCMAudio(filename, **with_seek(ffmpeg_options, start))
+        return cls(source, data=data, start=start)
+
+
+# Shared store for queues, loudness measurements and playlist snapshots
+state = state_backend.get_backend()
 
 
 class MusicPlayer:
-    def __init__(self, guild_id=None):
+    def __init__(self, guild_id=None, saved_state=None):
         self.guild_id = guild_id
         self.queue = []
         self.original_queue = []  # Store original queue for looping
         self.current = None
         self.voice_client = None
+        self.audio_source = None  # YTDLSource currently playing
         self.loop_song = False
         self.loop_queue = False
         self.is_paused = False
         self.paused_position = None
+        self.source_playlist = None  # Name of the curated playlist this queue loops, if any
+        self.last_active = time.monotonic()  # Last time a command used this player
+        self.idle_since = None  # When the player was first seen alone or paused
+        
+        # All state changes run one at a time on this player's actor task
+        self.mailbox = None
+        self._actor_task = None
+        self.loading = False  # A song is being extracted/opened
+        self.play_generation = 0  # Bumped on every new load, to ignore stale callbacks
+        
+        # Failure tracking for the playback scheduler
+        self.track_failures = {}  # track key (video ID or URL) -> failed load attempts
+        self.consecutive_failures = 0
+        self.load_attempts = deque()  # Times of recent load attempts, for the per-minute cap
+        self.text_channel_id = None  # Where playback problems are reported
+        self.track_ended_at = None  # When the last song ended, for the gap metric
+        self.history_track = None  # The playing song, until it's written to the play history
+        self.low_quality = False  # Current song was switched to a lower quality stream
+        self.recovery = None  # (generation, cause, started) while reconnecting after a dropped voice connection
+        self.connecting = None  # Task joining voice for a command, shared by commands arriving meanwhile
+        self.region_changed_at = None  # When the voice channel's region last changed (monotonic)
+        self.song_recoveries = 0  # Resumes of the current song, so a song that keeps failing still moves on
+        self.normalize = loudness.LOUDNESS_NORMALIZE_DEFAULT
         
         # Load saved queue if guild_id is provided
         if guild_id:
-            self.load_queue()
+            self.load_queue(saved_state)
+    
+    def get_state(self):
+        """Get this player's queue state in its saved form"""
+        connected = self.voice_client is not None and self.voice_client.is_connected()
+        return {
+            'queue': [self._serialize_track(track) for track in self.queue],
+            'original_queue': [self._serialize_track(track) for track in self.original_queue],
+            'current': self._serialize_track(self.current) if self.current else None,
+            'loop_song': self.loop_song,
+            'loop_queue': self.loop_queue,
+            'source_playlist': self.source_playlist,
+            'normalize': self.normalize,
+            # Voice and playback state, used to resume after a restart
+            'voice_channel_id': self.voice_client.channel.id if connected else None,
+            'position': self.get_position() if connected and self.current else 0,
+            'is_paused': self.is_paused,
+            'text_channel_id': self.text_channel_id
+        }
     
     def save_queue(self):
-        """Save queue state to JSON file"""
+        """Save queue state to the state backend"""
         if not self.guild_id:
             return
         
         try:
-            queue_data = {
-                'queue': [self._serialize_track(track) for track in self.queue],
-                'original_queue': [self._serialize_track(track) for track in self.original_queue],
-                'current': self._serialize_track(self.current) if self.current else None,
-                'loop_song': self.loop_song,
-                'loop_queue': self.loop_queue
-            }
-            
-            # Load existing data
-            try:
-                with open('queue_data.json', 'r') as f:
-                    all_data = json.load(f)
-            except FileNotFoundError:
-                all_data = {}
-            
-            # Update this guild's data
-            all_data[str(self.guild_id)] = queue_data
-            
-            # Save back to file
-            with open('queue_data.json', 'w') as f:
-                json.dump(all_data, f, indent=2)
+            state.set('queues', str(self.guild_id), self.get_state())
         except Exception as e:
             print(f"Error saving queue for guild {self.guild_id}: {e}")
     
-    def load_queue(self):
-        """Load queue state from JSON file"""
+    def load_queue(self, guild_data=None):
+        """Load queue state from the state backend (or from already loaded guild_data)"""
         if not self.guild_id:
             return
         
         try:
-            with open('queue_data.json', 'r') as f:
-                all_data = json.load(f)
-            
-            guild_data = all_data.get(str(self.guild_id))
+            if guild_data is None:
+                guild_data = state.get('queues', str(self.guild_id))
             if not guild_data:
                 return
             
@@ -159,9 +455,9 @@ class MusicPlayer:
             
             self.loop_song = guild_data.get('loop_song', False)
             self.loop_queue = guild_data.get('loop_queue', False)
-        except FileNotFoundError:
-            # File doesn't exist yet, that's okay
-            pass
+            self.source_playlist = guild_data.get('source_playlist')
+            self.normalize = guild_data.get('normalize', loudness.LOUDNESS_NORMALIZE_DEFAULT)
+            self.text_channel_id = guild_data.get('text_channel_id')
         except Exception as e:
             print(f"Error loading queue for guild {self.guild_id}: {e}")
     
@@ -175,6 +471,7 @@ class MusicPlayer:
             'title': track.get('title', 'Unknown'),
             'duration': track.get('duration', 0),
             'thumbnail': track.get('thumbnail'),
+            'video_id': track.get('video_id'),
             'requester_id': track.get('requester').id if track.get('requester') else None
         }
         return serialized
@@ -184,136 +481,607 @@ class MusicPlayer:
         if not track_data:
             return None
         
+        # Queues saved before URLs were canonicalized can hold any variant of a link
+        url = urls.canonicalize(track_data.get('url'))
         track = {
-            'url': track_data.get('url'),
+            'url': url,
             'title': track_data.get('title', 'Unknown'),
             'duration': track_data.get('duration', 0),
             'thumbnail': track_data.get('thumbnail'),
+            'video_id': track_data.get('video_id') or urls.video_id(url),
             'requester': None  # Will be set when needed, user objects can't be stored
         }
         return track
 
+    async def resolve_tracks(self, url, requester):
+        """Look up a song or playlist and build its track dicts (doesn't touch the queue)"""
+        link = urls.parse(url)
+        if link and link['kind'] == 'playlist':
+            url = urls.build(link)
+            # Curated playlists are served from their snapshot without extraction
+            playlist_tracks = playlist_snapshots.get_tracks_for_url(url)
+            if playlist_tracks is None:
+                # Handle playlist - use fast flat extraction
+                data = await run_in_executor(lambda: extract_playlist_info(url))
+                playlist_tracks = playlist_snapshots.tracks_from_info(data)
+                curated_name = playlist_snapshots.get_curated_name(url)
+                if curated_name and playlist_tracks:
+                    playlist_snapshots.store_snapshot(curated_name, playlist_tracks)
+            
+            for track in playlist_tracks:
+                track['requester'] = requester
+            return playlist_tracks
+        
+        # Handle single song
+        if link:
+            url = urls.build(link)
+        kind = 'search' if url.startswith('ytsearch') else 'single'
+        data = await run_in_executor(lambda: extract_info(url, kind))
+        if 'entries' in data:
+            data = data['entries'][0]
+        
+        return [{
+            'url': url,
+            'title': data.get('title', 'Unknown'),
+            'duration': data.get('duration', 0),
+            'thumbnail': data.get('thumbnail'),
+            'video_id': data.get('id'),
+            'requester': requester
+        }]
+
     async def add_to_queue(self, url, ctx):
         """Add a song or playlist to the queue"""
+        trace = tracing.get_trace(ctx)
         try:
-            added_tracks = []
-            if 'youtube.com/playlist' in url or 'youtu.be/playlist' in url:
-                # Handle playlist - use fast flat extraction
-                data = await asyncio.get_event_loop().run_in_executor(
-                    None, lambda: playlist_ytdl.extract_info(url, download=False)
-                )
-                if 'entries' in data:
-                    for entry in data['entries']:
-                        if entry:
-                            # Build URL from video ID
-                            video_id = entry.get('id') or entry.get('url', '').split('watch?v=')[-1].split('&')[0]
-                            video_url = f"https://www.youtube.com/watch?v={video_id}"
-                            
-                            track = {
-                                'url': video_url,
-                                'title': entry.get('title', 'Unknown'),
-                                'duration': entry.get('duration', 0),
-                                'thumbnail': entry.get('thumbnail'),
-                                'requester': ctx.user
-                            }
-                            self.queue.append(track)
-                            added_tracks.append(track)
-                    # Update original queue if loop is enabled
-                    if self.loop_queue:
-                        self.original_queue.extend(added_tracks)
-                    self.save_queue()  # Save after adding
-                    return len(added_tracks)
-            else:
-                # Handle single song
-                data = await asyncio.get_event_loop().run_in_executor(
-                    None, lambda: ytdl.extract_info(url, download=False)
-                )
-                if 'entries' in data:
-                    data = data['entries'][0]
-                
-                track = {
-                    'url': url,
-                    'title': data.get('title', 'Unknown'),
-                    'duration': data.get('duration', 0),
-                    'thumbnail': data.get('thumbnail'),
-                    'requester': ctx.user
-                }
-                self.queue.append(track)
-                # Update original queue if loop is enabled
-                if self.loop_queue:
-                    self.original_queue.append(track)
-                self.save_queue()  # Save after adding
-                return 1
+            # Extraction happens outside the actor, only the queue update goes through it
+            with trace.span('resolve', kind='search' if url.startswith('ytsearch') else 'extract'):
+                tracks = await self.resolve_tracks(url, ctx.user)
+            with trace.span('queue_update'):
+                await self.send(self.append_tracks, tracks)
+            return len(tracks)
         except Exception as e:
             raise Exception(f"Error adding to queue: {str(e)}")
 
-    async def play_next(self, ctx):
-        """Play the next song in the queue"""
-        if self.voice_client is None:
+    def append_tracks(self, tracks):
+        """Append resolved tracks to the queue"""
+        self.queue.extend(tracks)
+        # Update original queue if loop is enabled
+        if self.loop_queue:
+            self.original_queue.extend(tracks)
+        schedule_queue_save(self.guild_id)
+
+    def _ensure_actor(self):
+        """Start the task that applies this player's state changes"""
+        if self._actor_task is None or self._actor_task.done():
+            self.mailbox = asyncio.Queue(maxsize=MAILBOX_SIZE)
+            self._actor_task = asyncio.get_running_loop().create_task(self._run_actor())
+
+    async def _run_actor(self):
+        """Apply state changes one at a time, in the order they were sent"""
+        loop_monitor.set_activity(f"player actor, guild {self.guild_id}")
+        while True:
+            action, args, future = await self.mailbox.get()
+            try:
+                result = action(*args)
+                if asyncio.iscoroutine(result):
+                    result = await result
+                if future is not None and not future.done():
+                    future.set_result(result)
+            except Exception as e:
+                if future is not None and not future.done():
+                    future.set_exception(e)
+                else:
+                    print(f"Error in player for guild {self.guild_id} ({action.__name__}): {e}")
+
+    async def send(self, action, *args):
+        """
+        Run a state change on this player's actor and wait for its result
+        Waits for room when the mailbox is full, so bulk enqueues can't flood it
+        """
+        self._ensure_actor()
+        future = asyncio.get_running_loop().create_future()
+        await self.mailbox.put((action, args, future))
+        return await future
+
+    def post(self, action, *args):
+        """Run a state change on this player's actor without waiting for it"""
+        self._ensure_actor()
+        try:
+            self.mailbox.put_nowait((action, args, None))
+        except asyncio.QueueFull:
+            # Internal events must not be dropped, wait for room in the background
+            asyncio.get_running_loop().create_task(self.mailbox.put((action, args, None)))
+
+    def post_threadsafe(self, action, *args):
+        """Post a state change from another thread (e.g. the voice thread's after callback)"""
+        bot.loop.call_soon_threadsafe(self.post, action, *args)
+
+    def close(self):
+        """Stop the actor task (used when the player is unloaded)"""
+        if self._actor_task is not None:
+            self._actor_task.cancel()
+            self._actor_task = None
+
+    def start_if_idle(self, ctx):
+        """Start playback unless something is already playing, loading or reconnecting"""
+        if self.voice_client is None or self.loading or self.recovering:
             return
+        if not self.voice_client.is_playing() and not self.voice_client.is_paused():
+            self.play_next(ctx)
+
+    def is_broken(self, track):
+        """Check if a track failed too many times to keep trying"""
+        return self.track_failures.get(urls.track_key(track), 0) >= MAX_TRACK_FAILURES
 
-        if self.loop_song and self.current:
+    def _stop_playback_state(self):
+        """Nothing left to play"""
+        self.current = None
+        self.audio_source = None
+        self.loading = False
+        self.play_generation += 1
+        self.track_ended_at = None
+
+    def play_next(self, ctx):
+        """Play the next song in the queue, skipping songs that keep failing"""
+        if self.voice_client is None or self.recovering:
+            return
+        self.song_recoveries = 0
+
+        if self.loop_song and self.current and not self.is_broken(self.current):
             # Loop current song
-            await self.play_song(self.current['url'], ctx)
+            self.play_current(ctx)
             return
 
-        if len(self.queue) == 0:
-            if self.loop_queue and len(self.original_queue) > 0:
-                # Restore original queue for looping
-                # If current song is in original_queue, start from after it
-                if self.current:
-                    current_url = self.current.get('url')
-                    found = False
-                    for track in self.original_queue:
-                        if not found and track.get('url') == current_url:
-                            found = True
-                            continue
-                        if found or not current_url:
-                            self.queue.append(track.copy())
-                    # If current wasn't found or we need to loop from start
-                    if not found or len(self.queue) == 0:
+        # Bounded, so a queue made only of broken songs can't spin forever
+        for _ in range(len(self.queue) + len(self.original_queue) + 1):
+            if len(self.queue) == 0:
+                if self.loop_queue and len(self.original_queue) > 0:
+                    # Restore original queue for looping
+                    # If current song is in original_queue, start from after it
+                    if self.current:
+                        current_key = urls.track_key(self.current)
+                        found = False
+                        for track in self.original_queue:
+                            if not found and urls.track_key(track) == current_key:
+                                found = True
+                                continue
+                            if found or not current_key:
+                                self.queue.append(track.copy())
+                        # If current wasn't found or we need to loop from start
+                        if not found or len(self.queue) == 0:
+                            self.queue = [track.copy() for track in self.original_queue]
+                    else:
                         self.queue = [track.copy() for track in self.original_queue]
                 else:
-                    self.queue = [track.copy() for track in self.original_queue]
+                    self._stop_playback_state()
+                    return
+
+            # Get next song
+            self.current = self.queue.pop(0)
+            if not self.is_broken(self.current):
+                self.save_queue()  # Save after changing current
+                self.play_current(ctx)
+                return
+
+        self._stop_playback_state()
+        self.save_queue()
+        self.report("⚠️ Stopped playing: every song left in the queue keeps failing.")
+
+    def _next_load_delay(self):
+        """How long to wait before the next load, from failure backoff and the per-minute cap"""
+        now = time.monotonic()
+        while self.load_attempts and now - self.load_attempts[0] >= 60:
+            self.load_attempts.popleft()
+        
+        delay = 0
+        if self.consecutive_failures:
+            delay = min(FAILURE_BACKOFF_BASE * 2 ** (self.consecutive_failures - 1), FAILURE_BACKOFF_MAX)
+        if len(self.load_attempts) >= MAX_LOADS_PER_MINUTE:
+            delay = max(delay, self.load_attempts[0] + 60 - now)
+        return delay
+
+    def play_current(self, ctx, start=0, paused=False, data=None):
+        """
+        Start loading the current song, optionally at start seconds
+        data is the song's already extracted data, reused while its stream URL is fresh
+        """
+        # Each load gets a generation, so results of superseded loads and stale after callbacks are ignored
+        self.play_generation += 1
+        self.loading = True
+        self.low_quality = False
+        trace = tracing.get_trace(ctx)
+        if trace.sampled:
+            trace.playback_started = True  # The trace ends at this song's first audio frame
+        delay = self._next_load_delay()
+        self.load_attempts.append(time.monotonic() + delay)
+        asyncio.get_running_loop().create_task(
+            self._load_source(self.current, ctx, self.play_generation, start, paused, delay, data)
+        )
+
+    async def _load_source(self, track, ctx, generation, start, paused, delay=0, data=None):
+        """Extract and open the audio source outside the actor, then hand it back"""
+        trace = tracing.get_trace(ctx)
+        if delay:
+            with trace.span('load_delay'):
+                await asyncio.sleep(delay)
+            if generation != self.play_generation:
+                # Skipped or stopped while waiting
+                return
+        
+        # Wait for a free ffmpeg slot when the host is at its process cap
+        with trace.span('ffmpeg_slot'):
+            release_slot = await ffmpeg_usage.acquire_slot()
+        if generation != self.play_generation:
+            release_slot()
+            return
+        
+        try:
+            source = YTDLSource.from_data(data, start=start) if data else None
+            if data:
+                metrics.cache_requests.inc(cache='stream_url', result='miss' if source is None else 'hit')
+            if source is None:
+                source = await YTDLSource.from_url(
+                    track['url'], loop=bot.loop, stream=True, video_id=track.get('video_id'), start=start, trace=trace
+                )
+        except Exception as e:
+            release_slot()
+            self.post(self._on_load_failed, e, ctx, generation)
+            return
+        source.on_cleanup = release_slot
+        self.post(self._on_source_ready, source, ctx, generation, paused)
+
+    def _on_source_ready(self, source, ctx, generation, paused):
+        """Start playing a loaded source, unless it was superseded while loading"""
+        trace = tracing.get_trace(ctx)
+        if generation != self.play_generation or self.voice_client is None:
+            source.cleanup()
+            trace.finish('superseded')
+            return
+        
+        if not trace.finished:
+            # ffmpeg startup and the first read happen on the voice thread
+            play_started = time.perf_counter()
+            
+            def first_frame():
+                trace.add_span('first_audio', play_started, time.perf_counter())
+                trace.finish('played')
+            
+            source.on_first_frame = first_frame
+        
+        self.loading = False
+        if self.normalize:
+            # Static gain from the cached measurement, or measure it for next time
+            gain = loudness.get_gain(source.data.get('id'))
+            if gain is not None:
+                source.volume *= gain
             else:
-                self.current = None
+                loudness.schedule_measurement(source.data.get('id'), source.data.get('path') or source.data.get('url'))
+        try:
+            self.voice_client.play(source, after=lambda e: self.post_threadsafe(self._on_track_end, ctx, generation, e))
+        except discord.ClientException as e:
+            # Voice dropped while the song was loading, no after callback will come for it
+            source.cleanup()
+            print(f"Couldn't start playback in guild {self.guild_id}: {e}")
+            self._on_play_failed(source, paused)
+            return
+        
+        self.consecutive_failures = 0
+        self.track_failures.pop(urls.track_key(self.current) if self.current else None, None)
+        if self.recovery is not None and self.recovery[0] == generation:
+            # Resumed after a dropped connection: the same play, not a new one
+            _, cause, started = self.recovery
+            self.recovery = None
+            metrics.voice_recovery_seconds.observe(time.perf_counter() - started, cause=cause)
+            metrics.voice_recoveries.inc(result='resumed')
+        else:
+            metrics.tracks_started.inc()
+            self.history_track = self.current
+            if self.track_ended_at is not None:
+                metrics.track_gap_seconds.observe(time.perf_counter() - self.track_ended_at)
+                self.track_ended_at = None
+            # Count the play so popular tracks get cached in the background
+            audio_cache.record_play(source.data.get('id'))
+        self.audio_source = source
+        self.is_paused = False
+        self.paused_position = None
+        if paused:
+            self.pause()
+
+    def _on_load_failed(self, error, ctx, generation):
+        """Report a song that couldn't be loaded and move on (the next load is backed off)"""
+        if generation != self.play_generation:
+            return
+        self.loading = False
+        self.consecutive_failures += 1
+        metrics.track_load_failures.inc()
+        if self.recovery is not None and self.recovery[0] == generation:
+            self.recovery = None
+            metrics.voice_recoveries.inc(result='failed')
+        
+        track = self.current or {}
+        key = urls.track_key(track)
+        self.track_failures[key] = self.track_failures.get(key, 0) + 1
+        message = f"⚠️ Couldn't play **{track.get('title', 'Unknown')}**: {str(error)[:200]}"
+        if self.is_broken(track):
+            message += "\nSkipping it from now on."
+        self.report(message)
+        self.play_next(ctx)
+
+    def report(self, message):
+        """Send a message to the guild's text channel (interactions may already be answered)"""
+        channel = bot.get_channel(self.text_channel_id) if self.text_channel_id else None
+        if channel is None:
+            print(f"Guild {self.guild_id}: {message}")
+            return
+        
+        async def send():
+            try:
+                await channel.send(message)
+            except Exception as e:
+                print(f"Error reporting to guild {self.guild_id}: {e}")
+        
+        asyncio.get_running_loop().create_task(send())
+
+    def _on_track_end(self, ctx, generation, error=None):
+        """Voice thread finished a song"""
+        if generation != self.play_generation:
+            # A skip, seek or stop already moved on from this song
+            return
+        if self.voice_client is not None and error:
+            # The song didn't end, the connection or the audio player broke under it
+            print(f"Playback error in guild {self.guild_id}: {error}")
+            if self.song_recoveries < VOICE_RECONNECT_ATTEMPTS:
+                self._on_voice_lost('error')
                 return
+        elif self.voice_client is not None and not self.voice_client.is_connected():
+            # Taken out of voice, not the end of the song
+            self.post(self._on_disconnected, generation)
+            return
+        self.track_ended_at = time.perf_counter()
+        self._record_play(skipped=False)
+        self.play_next(ctx)
+
+    def _record_play(self, skipped):
+        """Add the song that just stopped to the play history"""
+        track, self.history_track = self.history_track, None
+        if track is not None and track.get('video_id'):
+            play_history.record(self.guild_id, track['video_id'], track.get('title'), self.get_position(), skipped)
+
+    @property
+    def recovering(self):
+        """Reconnecting to voice or reloading the song after a dropped connection"""
+        return self.recovery is not None and self.recovery[0] == self.play_generation
+
+    def _on_voice_lost(self, cause, data=None, position=None, paused=None, started=None):
+        """
+        The voice connection or audio player broke under a song: keep the song, reconnect and resume where it was
+        data, position and paused describe the song when it isn't the playing source (it failed to start)
+        """
+        if self.voice_client is None or not self.current or self.recovering:
+            # Left on purpose, nothing to resume, or already on it
+            return
+        position = self.get_position() if position is None else position
+        if data is None and self.audio_source:
+            data = self.audio_source.data
+        paused = self.is_paused if paused is None else paused
+        channel = self.voice_client.channel
+        
+        # The old source's after callback must not advance the queue
+        self.play_generation += 1
+        self.recovery = (self.play_generation, cause, started or time.perf_counter())
+        self.song_recoveries += 1
+        if self.voice_client.is_playing() or self.voice_client.is_paused():
+            self.voice_client.stop()
+        self.loading = False
+        self.audio_source = None
+        self.paused_position = position  # Reported and checkpointed while reconnecting
+        print(f"Voice connection lost in guild {self.guild_id} ({cause}), resuming at {format_timestamp(position)}")
+        asyncio.get_running_loop().create_task(
+            self._recover_voice(channel, self.play_generation, data, position, paused)
+        )
 
-        # Get next song
-        if len(self.queue) > 0:
-            self.current = self.queue.pop(0)
-            self.save_queue()  # Save after changing current
-            await self.play_song(self.current['url'], ctx)
+    def _on_play_failed(self, source, paused):
+        """A loaded song couldn't start because voice dropped: resume it once reconnected, or leave keeping it"""
+        earlier = self.recovery if self.recovering else None
+        self.recovery = None
+        if self.song_recoveries >= VOICE_RECONNECT_ATTEMPTS:
+            if earlier:
+                metrics.voice_recoveries.inc(result='failed')
+            self.post(disconnect_idle_player, self, "couldn't start playback, the voice connection kept dropping")
+            return
+        self._on_voice_lost(earlier[1] if earlier else 'disconnected', data=source.data, position=source.start,
+                            paused=paused, started=earlier[2] if earlier else None)
+
+    async def _on_disconnected(self, generation):
+        """
+        Discord took the bot out of voice (a moderator, or a dropped connection discord.py couldn't restore)
+        Leave but keep the song for the next /play, unless it follows a region change we can recover from
+        """
+        voice_client = self.voice_client
+        if voice_client is None or generation != self.play_generation or self.recovering:
+            return
+        if voice_client.is_connected() and (voice_client.is_playing() or voice_client.is_paused() or self.loading):
+            # discord.py reconnected by itself
+            return
+        if self.region_changed_at is not None and time.monotonic() - self.region_changed_at < VOICE_REGION_GRACE:
+            # The voice server moved and discord.py didn't manage to follow it
+            self._on_voice_lost('region')
+            return
+        await disconnect_idle_player(self, "disconnected from voice")
+
+    async def _recover_voice(self, channel, generation, data, position, paused):
+        """Reconnect with backoff outside the actor, so commands aren't held up, then hand the connection back"""
+        for attempt in range(VOICE_RECONNECT_ATTEMPTS):
+            # The first wait also gives discord.py's own reconnect a moment to finish
+            await asyncio.sleep(min(VOICE_RECONNECT_BACKOFF * 2 ** attempt, VOICE_RECONNECT_BACKOFF_MAX))
+            voice_client = self.voice_client
+            if generation != self.play_generation or voice_client is None:
+                # Stopped or left while waiting
+                return
+            if not any(not member.bot for member in channel.members):
+                self.post(self._give_up_recovery, generation, "nobody is listening anymore")
+                return
+            try:
+                if not voice_client.is_connected():
+                    # Clears discord.py's record of the old connection, or connect() says we're still connected
+                    await voice_client.disconnect(force=True)
+                    voice_client = await channel.connect(timeout=VOICE_CONNECT_TIMEOUT)
+            except Exception as e:
+                print(f"Voice reconnect attempt {attempt + 1} failed in guild {self.guild_id}: {e}")
+                continue
+            self.post(self._resume_after_reconnect, generation, voice_client, data, position, paused)
+            return
+        self.post(self._give_up_recovery, generation)
+
+    async def _resume_after_reconnect(self, generation, voice_client, data, position, paused):
+        """Back in voice: reload the song where it was, from the stream URL we already have if it's fresh"""
+        if generation != self.play_generation or self.voice_client is None or not self.current:
+            # Stopped or left while reconnecting, the new connection isn't wanted
+            if voice_client is not self.voice_client:
+                await voice_client.disconnect()
+            return
+        self.voice_client = voice_client
+        cause, started = self.recovery[1:]
+        self.play_current(None, start=int(position), paused=paused, data=data)
+        self.recovery = (self.play_generation, cause, started)
+
+    async def _give_up_recovery(self, generation, reason="couldn't reconnect"):
+        """Leave voice but keep the song at the front of the queue for the next /play"""
+        if generation != self.play_generation:
+            return
+        self.recovery = None
+        metrics.voice_recoveries.inc(result='failed')
+        self.report(f"⚠️ Lost the voice connection and {reason}. Use /play to pick up where it left off.")
+        await disconnect_idle_player(self, f"voice connection lost, {reason}")
+
+    def get_position(self):
+        """Get the current playback position in seconds"""
+        if self.paused_position is not None:
+            return self.paused_position
+        if self.audio_source:
+            return self.audio_source.position
+        return 0
+
+    async def seek(self, position):
+        """Restart the current song at position (seconds)"""
+        old_source = self.audio_source
+        generation = self.play_generation
+        if not old_source or not self.voice_client or not self.voice_client.source:
+            raise ValueError("Nothing is playing!")
+        
+        # Reuse the stream URL we already have, only extract again if it expired
+        source = YTDLSource.from_data(old_source.data, start=position, volume=old_source.volume)
+        metrics.cache_requests.inc(cache='stream_url', result='miss' if source is None else 'hit')
+        if source is None:
+            source = await YTDLSource.from_url(
+                self.current['url'], loop=bot.loop, stream=True,
+                video_id=self.current.get('video_id'), start=position
+            )
+            source.volume = old_source.volume
+        
+        await self.send(self._swap_source, source, generation, position)
 
-    async def play_song(self, url, ctx):
-        """Play a specific song"""
+    def _swap_source(self, source, generation, position):
+        """Replace the playing source with a seeked (or lower quality) one"""
+        if generation != self.play_generation or not self.voice_client or not self.voice_client.source:
+            source.cleanup()
+            raise ValueError("The song changed before the seek finished")
+        
+        # Swapping the source keeps the after callback, so the queue doesn't advance
+        old_source = self.audio_source
+        # The new source takes over the old one's ffmpeg slot
+        source.on_cleanup, old_source.on_cleanup = old_source.on_cleanup, None
+        was_paused = self.voice_client.is_paused()
+        self.voice_client.source = source
+        old_source.cleanup()
+        self.audio_source = source
+        if was_paused:
+            self.voice_client.pause()
+            self.paused_position = position
+
+    def enforce_ffmpeg_limit(self, problem, generation):
+        """The current song's ffmpeg keeps going over a limit: switch to a lower quality stream, or skip it"""
+        if generation != self.play_generation or not self.current or not self.audio_source:
+            return
+        title = self.current.get('title', 'Unknown')
+        if ffmpeg_usage.FFMPEG_LIMIT_ACTION == 'downgrade' and not self.low_quality:
+            self.low_quality = True
+            metrics.ffmpeg_limit_actions.inc(action='downgrade')
+            self.report(f"⚠️ **{title}** is using too much {problem}, switching to a lower quality stream.")
+            asyncio.get_running_loop().create_task(self._downgrade(generation))
+        else:
+            metrics.ffmpeg_limit_actions.inc(action='skip')
+            self.report(f"⚠️ Skipped **{title}**: it kept using too much {problem}.")
+            self.skip()
+
+    async def _downgrade(self, generation):
+        """Restart the current song at the same position from a lower quality stream"""
+        position = self.get_position()
         try:
-            player = await YTDLSource.from_url(url, loop=bot.loop, stream=True)
-            self.voice_client.play(player, after=lambda e: asyncio.run_coroutine_threadsafe(
-                self.play_next(ctx), bot.loop
-            ))
-            self.is_paused = False
-            self.paused_position = None
+            source = await YTDLSource.from_url(
+                self.current['url'], loop=bot.loop, stream=True, video_id=self.current.get('video_id'),
+                start=int(position), low_quality=True
+            )
+            source.volume = self.audio_source.volume
+            await self.send(self._swap_source, source, generation, int(position))
         except Exception as e:
-            await ctx.response.send_message(f"Error playing song: {str(e)}", ephemeral=True)
-            await self.play_next(ctx)
+            print(f"Error switching guild {self.guild_id} to a lower quality stream: {e}")
 
-    def skip(self):
+    def skip(self, ctx=None):
         """Skip current song"""
-        if self.voice_client and self.voice_client.is_playing():
+        if self.voice_client and (self.voice_client.is_playing() or self.voice_client.is_paused()):
+            self._record_play(skipped=True)
+            # The after callback advances the queue
             self.voice_client.stop()
+        elif self.voice_client and self.loading:
+            # Skip the song that's still loading
+            self.play_next(ctx)
+
+    def attach_voice(self, voice_client):
+        """Use a voice client connected outside the actor. Returns False if there already is one"""
+        if self.voice_client is not None:
+            return False
+        self.voice_client = voice_client
+        return True
+
+    async def move_to(self, channel):
+        """Join a voice channel, moving if already connected elsewhere"""
+        if self.voice_client:
+            await self.voice_client.move_to(channel)
+        else:
+            self.voice_client = await channel.connect()
+
+    async def disconnect(self):
+        """Stop playing, clear everything and leave voice"""
+        self.play_generation += 1  # Ignore the after callback of the song being stopped
+        self.loading = False
+        self.track_ended_at = None
+        self.queue = []
+        self.current = None
+        self.audio_source = None
+        self.loop_song = False
+        self.loop_queue = False
+        self.original_queue = []
+        self.source_playlist = None
+        voice_client = self.voice_client
+        self.voice_client = None
+        self.save_queue()
+        if voice_client is not None:
+            await voice_client.disconnect()
 
     def pause(self):
         """Pause current song"""
         if self.voice_client and self.voice_client.is_playing():
             self.voice_client.pause()
             self.is_paused = True
+            self.paused_position = self.get_position()
 
     def resume(self):
         """Resume current song"""
         if self.voice_client and self.voice_client.is_paused():
             self.voice_client.resume()
             self.is_paused = False
+            self.paused_position = None
 
     def shuffle_queue(self):
         """Shuffle the queue"""
@@ -329,12 +1097,83 @@ class MusicPlayer:
                 self.original_queue = [track.copy() for track in self.queue]
         self.save_queue()  # Save after shuffling
 
+    def apply_playlist_changes(self, added, removed):
+        """Apply a curated playlist refresh to this looped queue"""
+        if removed:
+            self.queue = [track for track in self.queue if not was_removed(track, removed)]
+            self.original_queue = [track for track in self.original_queue if not was_removed(track, removed)]
+        for track in added:
+            self.queue.append(dict(track, requester=None))
+            self.original_queue.append(dict(track, requester=None))
+        self.save_queue()
+
+    def toggle_loop_song(self):
+        """Toggle loop for the current song"""
+        self.loop_song = not self.loop_song
+        self.loop_queue = False  # Disable queue loop when song loop is enabled
+        self.save_queue()  # Save loop state
+
+    def toggle_loop_queue(self):
+        """Toggle loop for the whole queue"""
+        self.loop_queue = not self.loop_queue
+        self.loop_song = False  # Disable song loop when queue loop is enabled
+        
+        # When enabling loop, save current queue + current song as original
+        if self.loop_queue:
+            self.original_queue = []
+            if self.current:
+                self.original_queue.append(self.current.copy())
+            self.original_queue.extend([track.copy() for track in self.queue])
+        else:
+            self.original_queue = []
+        
+        self.save_queue()  # Save loop state and original queue
+
+    def set_loop_mode(self, mode):
+        """Set the loop mode ('song', 'queue' or None) without toggling"""
+        if mode == 'queue':
+            if not self.loop_queue:
+                self.toggle_loop_queue()
+            return
+        self.loop_song = mode == 'song'
+        self.loop_queue = False
+        self.original_queue = []
+        self.save_queue()
+
+    def get_playlist_tracks(self):
+        """The songs a saved playlist would hold (the whole loop when looping the queue) and the loop mode"""
+        if self.loop_queue and self.original_queue:
+            tracks = self.original_queue
+        else:
+            tracks = ([self.current] if self.current else []) + self.queue
+        loop = 'song' if self.loop_song else 'queue' if self.loop_queue else None
+        return [saved_playlists.to_record(track) for track in tracks], loop
+
+    def toggle_normalize(self):
+        """Toggle loudness normalization"""
+        self.normalize = not self.normalize
+        self.save_queue()  # Save normalization setting
+
     def clear_queue(self):
         """Clear the queue"""
         self.queue = []
         self.original_queue = []
+        self.track_failures = {}
+        self.source_playlist = None
         self.save_queue()  # Save after clearing
 
+    def get_progress_text(self, bar_length=15):
+        """Get a progress readout like `▬▬▬🔘▬▬▬ 1:23 / 3:45`"""
+        position = self.get_position()
+        duration = (self.current or {}).get('duration') or 0
+        times = f"`{format_timestamp(position)} / {format_timestamp(duration)}`" if duration else f"`{format_timestamp(position)}`"
+        if not bar_length or not duration:
+            return times
+        
+        filled = min(bar_length - 1, int(position / duration * bar_length))
+        bar = "▬" * filled + "🔘" + "▬" * (bar_length - filled - 1)
+        return f"{bar} {times}"
+
     def get_queue_page(self, page=0, per_page=15):
         """Get a specific page of the queue"""
         if not self.queue:
@@ -354,7 +1193,7 @@ class MusicPlayer:
         
         # Header
         if self.current:
-            lines.append(f"**Now Playing:** {self.current['title']}")
+            lines.append(f"**Now Playing:** {self.current['title']} {self.get_progress_text(bar_length=0)}")
         
         # Show loop status
         loop_status = []
@@ -382,6 +1221,46 @@ class MusicPlayer:
 # Global music players per guild
 music_players = {}
 
+# Guilds whose queue changed since the last batched save
+queues_to_save = set()
+queue_save_task = None
+
+
+def schedule_queue_save(guild_id):
+    """Save a guild's queue within QUEUE_SAVE_DELAY, in one write with other guilds changed meanwhile"""
+    global queue_save_task
+    queues_to_save.add(guild_id)
+    if queue_save_task is None:
+        queue_save_task = asyncio.get_running_loop().create_task(save_pending_queues())
+
+
+async def save_pending_queues():
+    """Write the queues of every guild scheduled for a save"""
+    global queue_save_task
+    await asyncio.sleep(QUEUE_SAVE_DELAY)
+    queue_save_task = None
+    guild_ids = list(queues_to_save)
+    queues_to_save.clear()
+    # Evicted players saved their queue when they were unloaded
+    updates = {str(guild_id): music_players[guild_id].get_state() for guild_id in guild_ids if guild_id in music_players}
+    if updates:
+        try:
+            state.set_many('queues', updates)
+        except Exception as e:
+            print(f"Error saving queues: {e}")
+
+
+# Player gauges are read when metrics are scraped
+metrics.players.set_function(lambda: len(music_players))
+metrics.voice_connections.set_function(lambda: sum(
+    1 for player in music_players.values() if player.voice_client is not None and player.voice_client.is_connected()
+))
+metrics.queued_tracks.set_function(lambda: sum(len(player.queue) for player in music_players.values()))
+metrics.longest_queue.set_function(lambda: max((len(player.queue) for player in music_players.values()), default=0))
+
+# Load curated playlist snapshots so /playmiku can start without extraction
+playlist_snapshots.load_snapshots()
+
 
 class QueueView(discord.ui.View):
     """View for paginated queue display"""
@@ -456,33 +1335,338 @@ class QueueView(discord.ui.View):
             item.disabled = True
 
 
-def get_music_player(guild_id):
-    """Get or create music player for a guild"""
+class SearchResultsView(discord.ui.View):
+    """Pick list for /search results"""
+    def __init__(self, results, timeout=120):
+        super().__init__(timeout=timeout)
+        self.results = results
+        select = discord.ui.Select(
+            placeholder="Pick a song to add to the queue",
+            options=[
+                discord.SelectOption(label=track['title'][:100], description=format_timestamp(track['duration']),
+                                     value=str(index))
+                for index, track in enumerate(results[:25])
+            ]
+        )
+        select.callback = self.pick
+        self.add_item(select)
+    
+    async def pick(self, interaction: discord.Interaction):
+        """Queue the picked song like /play would"""
+        track = self.results[int(interaction.data['values'][0])]
+        await play.callback(interaction, track['url'])
+    
+    async def on_timeout(self):
+        """Disable the pick list when the view times out"""
+        for item in self.children:
+            item.disabled = True
+
+
+def get_music_player(guild_id, saved_state=None):
+    """Get or create music player for a guild (evicted players are reloaded from saved state)"""
     if guild_id not in music_players:
-        music_players[guild_id] = MusicPlayer(guild_id=guild_id)
-    return music_players[guild_id]
+        music_players[guild_id] = MusicPlayer(guild_id=guild_id, saved_state=saved_state)
+    player = music_players[guild_id]
+    player.last_active = time.monotonic()
+    return player
+
+
+async def disconnect_idle_player(player, reason):
+    """Leave voice but keep the queue, so playback can pick up again later"""
+    voice_client = player.voice_client
+    if voice_client is None:
+        return
+    # Clear first so the after callback doesn't advance the queue
+    player.voice_client = None
+    player.play_generation += 1
+    player.loading = False
+    player.track_ended_at = None
+    if player.current:
+        # Put the current song back at the front so it plays again next time
+        player.queue.insert(0, player.current)
+        player.current = None
+    player.audio_source = None
+    player.is_paused = False
+    player.paused_position = None
+    player.idle_since = None
+    player.save_queue()
+    await voice_client.disconnect()
+    print(f"Left voice in guild {player.guild_id}: {reason}")
+
+
+async def check_ffmpeg_usage():
+    """Sample every playing guild's ffmpeg process and act on ones over their limits"""
+    playing = [
+        (guild_id, player, player.audio_source.pid, player.play_generation)
+        for guild_id, player in list(music_players.items())
+        if player.audio_source is not None and player.audio_source.pid is not None
+    ]
+    playing_ids = {guild_id for guild_id, _, _, _ in playing}
+    for guild_id in list(ffmpeg_usage.usage):
+        if guild_id not in playing_ids:
+            ffmpeg_usage.forget(guild_id)
+    
+    # Reading /proc for every guild adds up, so it happens off the loop
+    problems = await run_in_executor(
+        lambda: [ffmpeg_usage.sample(guild_id, pid) for guild_id, _, pid, _ in playing]
+    )
+    for (guild_id, player, _, generation), problem in zip(playing, problems):
+        if problem:
+            player.post(player.enforce_ffmpeg_limit, problem, generation)
+
+
+async def ffmpeg_usage_loop():
+    """Run ffmpeg usage checks in the background"""
+    loop_monitor.set_activity("ffmpeg usage")
+    while True:
+        await asyncio.sleep(ffmpeg_usage.FFMPEG_SAMPLE_INTERVAL)
+        try:
+            await check_ffmpeg_usage()
+        except Exception as e:
+            print(f"Error checking ffmpeg usage: {e}")
+
+
+async def check_idle_players():
+    """Disconnect players that are alone or paused too long, and unload unused ones"""
+    now = time.monotonic()
+    for guild_id, player in list(music_players.items()):
+        voice_client = player.voice_client
+        if voice_client is not None and voice_client.is_connected():
+            alone = not any(not member.bot for member in voice_client.channel.members)
+            if alone or voice_client.is_paused():
+                player.idle_since = player.idle_since or now
+                timeout = IDLE_ALONE_TIMEOUT if alone else IDLE_PAUSED_TIMEOUT
+                if now - player.idle_since >= timeout:
+                    await player.send(disconnect_idle_player, player, "alone in channel" if alone else "paused too long")
+            else:
+                player.idle_since = None
+        elif now - player.last_active >= IDLE_EVICT_TIMEOUT and not player.loading and not player.recovering \
+                and (player.mailbox is None or player.mailbox.empty()):
+            # Not in voice and unused - state is saved, so drop it from memory
+            player.save_queue()
+            player.close()
+            del music_players[guild_id]
+
+
+async def idle_loop():
+    """Run idle checks in the background"""
+    loop_monitor.set_activity("idle checks")
+    while True:
+        await asyncio.sleep(IDLE_CHECK_INTERVAL)
+        try:
+            await check_idle_players()
+        except Exception as e:
+            print(f"Error checking idle players: {e}")
+
+
+def _deep_size(obj):
+    """Rough memory size of track dicts/lists in bytes"""
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(sys.getsizeof(key) + _deep_size(value) for key, value in obj.items())
+    elif isinstance(obj, list):
+        size += sum(_deep_size(item) for item in obj)
+    return size
+
+
+def get_process_memory():
+    """Get the bot's resident memory in bytes (Linux), None if unavailable"""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def get_player_stats():
+    """Get resident player count and memory use"""
+    return {
+        'players': len(music_players),
+        'connected': sum(1 for player in music_players.values()
+                         if player.voice_client is not None and player.voice_client.is_connected()),
+        'queued_tracks': sum(len(player.queue) + len(player.original_queue) for player in music_players.values()),
+        'queue_bytes': sum(_deep_size(player.queue) + _deep_size(player.original_queue)
+                           for player in music_players.values()),
+        'process_bytes': get_process_memory(),
+    }
+
+
+def _object_guild(obj, source_guilds):
+    """The guild a profiled object belongs to, None if it isn't attached to one"""
+    if isinstance(obj, MusicPlayer):
+        return obj.guild_id
+    if isinstance(obj, QueueView):
+        return obj.player.guild_id
+    return source_guilds.get(id(obj))
+
+
+def get_memory_census(count_objects=True):
+    """Per-guild queue and source sizes and live object counts for memory reports"""
+    objects = None
+    # Counting objects walks the whole heap on the event loop, so only reports asked for do it
+    if count_objects:
+        source_guilds = {}
+        for guild_id, player in music_players.items():
+            if player.audio_source is not None:
+                source_guilds[id(player.audio_source)] = guild_id
+                source_guilds[id(player.audio_source.original)] = guild_id
+        objects = memory_profiler.count_objects(
+            {'MusicPlayer', 'QueueView', 'YTDLSource', 'FFmpegPCMAudio', 'ClientSession'},
+            lambda obj: _object_guild(obj, source_guilds)
+        )
+    guilds = [
+        {
+            'guild_id': guild_id,
+            'queued': len(player.queue) + len(player.original_queue),
+            'queue_bytes': _deep_size(player.queue) + _deep_size(player.original_queue),
+            # yt-dlp's info dict for the playing song
+            'source_bytes': _deep_size(player.audio_source.data) if player.audio_source is not None else 0,
+            'views': objects['QueueView'].get(guild_id, 0) if objects is not None else 0,
+        }
+        for guild_id, player in music_players.items()
+    ]
+    return {'process_bytes': get_process_memory(), 'objects': objects, 'guilds': guilds}
+
+
+async def write_memory_report(reason, count_objects=True):
+    """Write a memory report, returns (path, summary) or None if profiling isn't running"""
+    if not memory_profiler.is_tracing():
+        return None
+    census = get_memory_census(count_objects)
+    result = await run_in_executor(lambda: memory_profiler.build_report(reason, census))
+    if result:
+        print(f"Memory report ({reason}) written to {result[0]}: {result[1]}")
+    return result
+
+
+async def on_memory_signal():
+    """SIGUSR1: start profiling the first time, write a report every time after that"""
+    try:
+        if memory_profiler.start():
+            print("Memory profiling started, send SIGUSR1 again to write a report")
+        else:
+            await write_memory_report('SIGUSR1')
+    except Exception as e:
+        print(f"Error writing memory report: {e}")
+
+
+async def memory_profile_loop():
+    """Trace allocations for a short window every MEMORY_PROFILE_INTERVAL minutes and write a report"""
+    loop_monitor.set_activity("memory profiler")
+    while True:
+        await asyncio.sleep(memory_profiler.MEMORY_PROFILE_INTERVAL * 60)
+        # Leave profiling started with /memprofile or SIGUSR1 alone
+        if not memory_profiler.start():
+            continue
+        try:
+            await asyncio.sleep(memory_profiler.MEMORY_PROFILE_WINDOW)
+            await write_memory_report('periodic', count_objects=False)
+        except Exception as e:
+            print(f"Error writing memory report: {e}")
+        finally:
+            # Tracing slows every allocation down, only keep it on for the window
+            memory_profiler.stop()
+
+
+async def check_saved_track(record):
+    """Re-extract a saved playlist song, returns its up to date record (raises if it can't be played)"""
+    track = saved_playlists.from_record(record)
+    data = await run_in_executor(lambda: extract_info(track['url'], 'validate'))
+    if 'entries' in data:
+        data = data['entries'][0]
+    return [data.get('id') or record[0], data.get('title') or record[1], data.get('duration') or record[2]]
+
+
+async def revalidate_saved_playlist(player, name):
+    """Check a stale saved playlist's songs in the background and drop the ones that are gone"""
+    loop_monitor.set_activity(f"playlist revalidation, guild {player.guild_id}")
+    try:
+        removed = await saved_playlists.revalidate(player.guild_id, name, check_saved_track)
+    except Exception as e:
+        print(f"Error revalidating playlist '{name}' for guild {player.guild_id}: {e}")
+        return
+    if removed:
+        # Also take them out of the queue the playlist was just loaded into
+        player.post(player.apply_playlist_changes, [], removed)
+        player.report(f"Removed {len(removed)} song(s) that are no longer available from saved playlist **{name}**.")
+
+
+def was_removed(track, removed):
+    """removed holds video IDs, or the URL of songs without one (like saved ytsearch: songs)"""
+    return track.get('video_id') in removed or track.get('url') in removed
+
+
+def update_saved_queues(name, added, removed, loaded):
+    """Apply a curated playlist refresh to saved queues of guilds that aren't loaded (blocking, run in an executor)"""
+    saved_added = [
+        {'url': track.get('url'), 'title': track.get('title', 'Unknown'), 'duration': track.get('duration', 0),
+         'thumbnail': track.get('thumbnail'), 'video_id': track.get('video_id'), 'requester_id': None}
+        for track in added
+    ]
+    updates = {}
+    for guild_id, guild_data in state.get_all('queues').items():
+        if (int(guild_id) in loaded or not owns_guild(guild_id)
+                or not guild_data.get('loop_queue') or guild_data.get('source_playlist') != name):
+            continue
+        guild_data = dict(guild_data)
+        for key in ('queue', 'original_queue'):
+            guild_data[key] = [
+                track for track in guild_data.get(key, []) if not was_removed(track, removed)
+            ] + saved_added
+        updates[guild_id] = guild_data
+    if updates:
+        state.set_many('queues', updates)
+
+
+async def on_curated_playlist_changed(name, added, removed):
+    """Push curated playlist refreshes into every queue that loops that playlist"""
+    for player in music_players.values():
+        if player.loop_queue and player.source_playlist == name:
+            player.post(player.apply_playlist_changes, added, removed)
+    
+    # Players unloaded by idle management come back from their saved state, so update that too
+    loaded = set(music_players)
+    try:
+        await run_in_executor(lambda: update_saved_queues(name, added, removed, loaded))
+    except Exception as e:
+        print(f"Error updating saved queues for playlist '{name}': {e}")
 
 
 async def get_spotify_track_info(url):
     """Get track info from Spotify and search on YouTube"""
+    spotify = get_spotify()
     if not spotify:
         raise Exception("Spotify credentials not configured")
     
-    # Check if it's a playlist
-    if 'playlist' in url:
-        playlist_id = url.split('playlist/')[-1].split('?')[0]
-        if not playlist_id:
-            raise Exception("Invalid Spotify playlist URL")
-        
-        # Get playlist tracks
-        results = spotify.playlist_tracks(playlist_id)
+    link = urls.parse(url)
+    if link is None or link['provider'] != 'spotify':
+        raise Exception("Invalid Spotify URL. Please provide a track, album, playlist or artist URL.")
+    
+    if link['kind'] == 'artist':
+        # An artist link plays their top tracks
+        results = spotify.artist_top_tracks(link['id'])
+        tracks = [
+            (f"ytsearch:{track['artists'][0]['name']} {track['name']}", f"{track['artists'][0]['name']} - {track['name']}")
+            for track in results['tracks']
+        ]
+        if not tracks:
+            raise Exception("This artist has no tracks")
+        return tracks
+    
+    # Check if it's a playlist or album
+    if link['kind'] in ('playlist', 'album'):
+        # Get playlist tracks (album tracks aren't wrapped in a playlist item)
+        if link['kind'] == 'playlist':
+            results = spotify.playlist_tracks(link['id'])
+        else:
+            results = spotify.album_tracks(link['id'])
         tracks = []
         
         # Handle pagination
         while results:
             for item in results['items']:
-                if item['track'] and item['track']['type'] == 'track':
-                    track = item['track']
+                track = item.get('track') if link['kind'] == 'playlist' else item
+                if track and track['type'] == 'track':
                     artist = track['artists'][0]['name']
                     title = track['name']
                     search_query = f"{artist} {title}"
@@ -501,14 +1685,7 @@ async def get_spotify_track_info(url):
         return tracks  # Return list of (yt_url, track_name) tuples
     
     # Handle single track
-    track_id = None
-    if 'track' in url:
-        track_id = url.split('track/')[-1].split('?')[0]
-    
-    if not track_id:
-        raise Exception("Invalid Spotify URL. Please provide a track or playlist URL.")
-    
-    track = spotify.track(track_id)
+    track = spotify.track(link['id'])
     artist = track['artists'][0]['name']
     title = track['name']
     
@@ -519,19 +1696,196 @@ async def get_spotify_track_info(url):
     return yt_search_url, f"{artist} - {title}"
 
 
+async def checkpoint_loop():
+    """Periodically save playback positions of active guilds in one write"""
+    loop_monitor.set_activity("checkpoint")
+    while True:
+        await asyncio.sleep(CHECKPOINT_INTERVAL)
+        active = [player for player in music_players.values() if player.current and player.voice_client]
+        if active:
+            try:
+                state.set_many('queues', {str(player.guild_id): player.get_state() for player in active})
+            except Exception as e:
+                print(f"Error saving playback positions: {e}")
+        await run_in_executor(play_history.flush)
+
+
+async def restore_guild(guild_id, guild_data, semaphore):
+    """Rejoin a guild's voice channel and resume its current song where it left off"""
+    channel = bot.get_channel(guild_data['voice_channel_id'])
+    if not isinstance(channel, (discord.VoiceChannel, discord.StageChannel)) or not channel.voice_states:
+        # Channel is gone or nobody is listening anymore
+        return False
+    
+    player = get_music_player(guild_id, saved_state=guild_data)
+    
+    def resume(voice_client):
+        if player.voice_client is not None or not player.current:
+            # Someone already started something else
+            return False
+        player.voice_client = voice_client
+        player.play_current(
+            None,
+            start=int(guild_data.get('position') or 0),
+            paused=guild_data.get('is_paused', False)
+        )
+        return True
+    
+    # Connecting and pacing happen outside the actor, so commands for this guild aren't held up
+    async with semaphore:
+        if player.voice_client is not None or not player.current:
+            return False
+        voice_client = await channel.connect()
+        resumed = await player.send(resume, voice_client)
+        # Bound the connection rate so a big restore doesn't hit voice rate limits
+        await asyncio.sleep(RESTORE_CONNECT_INTERVAL)
+    if not resumed:
+        await voice_client.disconnect()
+    return resumed
+
+
+async def restore_active_guilds():
+    """Restore every guild that was playing when the bot stopped"""
+    started = time.perf_counter()
+    # One pass over the saved state, instead of loading each guild separately
+    to_restore = [
+        (int(guild_id), guild_data) for guild_id, guild_data in state.get_all('queues').items()
+        if guild_data.get('voice_channel_id') and guild_data.get('current') and owns_guild(guild_id)
+    ]
+    if not to_restore:
+        return
+    
+    semaphore = asyncio.Semaphore(RESTORE_CONCURRENCY)
+    results = await asyncio.gather(
+        *(restore_guild(guild_id, guild_data, semaphore) for guild_id, guild_data in to_restore),
+        return_exceptions=True
+    )
+    
+    restored = sum(1 for result in results if result is True)
+    for (guild_id, _), result in zip(to_restore, results):
+        if isinstance(result, Exception):
+            print(f"Error restoring guild {guild_id}: {result}")
+    print(f"Restored {restored}/{len(to_restore)} guild(s) in {time.perf_counter() - started:.1f}s")
+
+
+def command_payload(command):
+    """A command's sync payload (to_dict only takes the tree from discord.py 2.4 on)"""
+    try:
+        return command.to_dict(bot.tree)
+    except TypeError:
+        return command.to_dict()
+
+
+def get_command_tree_hash():
+    """Hash of the slash command definitions, to tell if they need syncing"""
+    payloads = sorted(
+        (command_payload(command) for command in bot.tree.get_commands()),
+        key=lambda payload: (payload.get('type', 1), payload['name'])
+    )
+    return hashlib.sha256(json.dumps(payloads, sort_keys=True).encode()).hexdigest()
+
+
+async def sync_commands_if_changed():
+    """Sync slash commands only when they changed since the last sync"""
+    command_hash = get_command_tree_hash()
+    try:
+        if state.get('meta', 'command_tree_hash') == command_hash:
+            print("Slash commands unchanged, skipping sync")
+            return
+    except Exception as e:
+        print(f"Error reading command hash: {e}")
+    
+    synced = await bot.tree.sync()
+    print(f"Synced {len(synced)} command(s)")
+    state.set('meta', 'command_tree_hash', command_hash)
+
+
+async def warm_up_in_background():
+    """Run warm_up in a thread and report how long it took"""
+    try:
+        duration = await asyncio.get_running_loop().run_in_executor(None, warm_up)
+        print(f"Startup: yt-dlp/Spotify warm-up took {duration:.2f}s (in background)")
+    except Exception as e:
+        print(f"Error warming up: {e}")
+
+
+async def warm_caches_from_history():
+    """Download the most played songs into the audio cache, so they start instantly after a restart"""
+    try:
+        await run_in_executor(play_history.load)
+        if not audio_cache.AUDIO_CACHE_ENABLED:
+            print("Startup: not caching the most played songs, the audio cache is off (AUDIO_CACHE_ENABLED)")
+            return
+        top = play_history.top_tracks(limit=play_history.HISTORY_WARM_TRACKS)
+        started = audio_cache.prefetch([track['video_id'] for track in top])
+        if started:
+            print(f"Startup: caching {started} of the most played songs in the background")
+    except Exception as e:
+        print(f"Error warming caches from play history: {e}")
+
+
+startup_tasks_started = False
+
+
 @bot.event
 async def on_ready():
+    global startup_tasks_started
+    ready_at = time.perf_counter()
     print(f'{bot.user} has logged in!')
+    playlist_snapshots.start_refresh_loop(extract_playlist_info, on_curated_playlist_changed)
+    
+    # on_ready also fires after gateway reconnects, only restore once per process
+    if not startup_tasks_started:
+        startup_tasks_started = True
+        print(
+            f"Startup: imports/setup {IMPORTS_DONE - STARTUP_STARTED:.2f}s, "
+            f"login/gateway {ready_at - IMPORTS_DONE:.2f}s"
+        )
+        asyncio.create_task(warm_up_in_background())
+        asyncio.create_task(warm_caches_from_history())
+        asyncio.create_task(checkpoint_loop())
+        asyncio.create_task(idle_loop())
+        asyncio.create_task(ffmpeg_usage_loop())
+        if metrics.METRICS_PORT:
+            asyncio.create_task(metrics.start_server())
+        if loop_monitor.LOOP_MONITOR_ENABLED:
+            loop_monitor.start()
+        if memory_profiler.MEMORY_PROFILE_INTERVAL:
+            asyncio.create_task(memory_profile_loop())
+        if hasattr(signal, 'SIGUSR1'):
+            # Not available on Windows
+            asyncio.get_running_loop().add_signal_handler(
+                signal.SIGUSR1, lambda: asyncio.create_task(on_memory_signal())
+            )
+        if RESTORE_ON_STARTUP:
+            asyncio.create_task(restore_active_guilds())
+        if SHARD_COUNT and not state.shared:
+            print("Warning: the json state backend can't be shared between processes, use STATE_BACKEND=sqlite or redis")
+    if SHARD_IDS is not None and 0 not in SHARD_IDS:
+        # Commands are global, only the process owning shard 0 syncs them
+        return
     try:
-        synced = await bot.tree.sync()
-        print(f"Synced {len(synced)} command(s)")
+        sync_started = time.perf_counter()
+        await sync_commands_if_changed()
+        print(f"Startup: command sync check took {time.perf_counter() - sync_started:.2f}s")
     except Exception as e:
         print(f"Failed to sync commands: {e}")
 
 
+async def tag_interaction(interaction):
+    """Runs before every slash command, so the loop monitor knows which command and guild a stall belongs to"""
+    command_name = interaction.command.name if interaction.command else 'component'
+    loop_monitor.set_activity(f"/{command_name}, guild {interaction.guild_id}")
+    return True
+
+
+bot.tree.interaction_check = tag_interaction
+
+
 @bot.event
 async def on_message(message):
     """Handle messages for GIF responses"""
+    loop_monitor.set_activity(f"message, guild {message.guild.id if message.guild else None}")
     # Process commands first
     await bot.process_commands(message)
     
@@ -541,6 +1895,61 @@ async def on_message(message):
         await miku_responses.handle_message_response(message, bot.user, tenor_key)
 
 
+@bot.event
+async def on_voice_state_update(member, before, after):
+    """Notice when Discord takes the bot out of voice without us leaving"""
+    if bot.user is None or member.id != bot.user.id or after.channel is not None:
+        return
+    player = music_players.get(member.guild.id)
+    # Players clear voice_client before leaving on purpose, so this is only set when we didn't
+    if player is not None and player.voice_client is not None and not player.recovering:
+        asyncio.create_task(leave_if_still_disconnected(player, player.play_generation))
+
+
+async def leave_if_still_disconnected(player, generation):
+    """discord.py briefly leaves and rejoins when it reconnects by itself, so give it a moment first"""
+    await asyncio.sleep(VOICE_DISCONNECT_GRACE)
+    player.post(player._on_disconnected, generation)
+
+
+async def check_voice_after_region_change(player, generation):
+    """discord.py reconnects by itself when the voice server moves, take over if it didn't manage to"""
+    await asyncio.sleep(VOICE_REGION_GRACE)
+    voice_client = player.voice_client
+    if generation == player.play_generation and voice_client is not None and not voice_client.is_connected():
+        player.post(player._on_voice_lost, 'region')
+
+
+@bot.event
+async def on_guild_channel_update(before, after):
+    """Watch the bot's voice channel when its region (and so its voice server) changes"""
+    if getattr(before, 'rtc_region', None) == getattr(after, 'rtc_region', None):
+        return
+    player = music_players.get(after.guild.id)
+    if player is not None and player.voice_client is not None and player.voice_client.channel.id == after.id:
+        player.region_changed_at = time.monotonic()
+        asyncio.create_task(check_voice_after_region_change(player, player.play_generation))
+
+
+async def _connect_for_command(player, channel):
+    try:
+        voice_client = await channel.connect(timeout=VOICE_CONNECT_TIMEOUT)
+        if not await player.send(player.attach_voice, voice_client):
+            await voice_client.disconnect()
+    finally:
+        player.connecting = None
+
+
+async def join_voice(player, channel):
+    """Join a voice channel for a command. Returns False if already in a different one"""
+    # Connecting happens outside the actor, so the guild's other commands aren't held up meanwhile
+    if player.voice_client is None and player.connecting is None:
+        player.connecting = asyncio.create_task(_connect_for_command(player, channel))
+    if player.connecting is not None:
+        await asyncio.shield(player.connecting)
+    return player.voice_client is not None and player.voice_client.channel == channel
+
+
 @bot.tree.command(name="join", description="Join your voice channel")
 @app_commands.describe(channel="The voice channel to join (optional)")
 async def join(interaction: discord.Interaction, channel: discord.VoiceChannel = None):
@@ -550,7 +1959,7 @@ async def join(interaction: discord.Interaction, channel: discord.VoiceChannel =
         return
     
     player = get_music_player(interaction.guild_id)
-    player.clear_queue()
+    await player.send(player.clear_queue)
     
     if channel is None:
         if interaction.user.voice is None:
@@ -558,16 +1967,14 @@ async def join(interaction: discord.Interaction, channel: discord.VoiceChannel =
             return
         channel = interaction.user.voice.channel
     
-    if player.voice_client:
-        await player.voice_client.move_to(channel)
-    else:
-        player.voice_client = await channel.connect()
+    await player.send(player.move_to, channel)
+    player.text_channel_id = interaction.channel_id  # Report playback problems here
     
     await interaction.response.send_message(f"Joined {channel.name}")
 
 
 @bot.tree.command(name="play", description="Play a song from YouTube or Spotify")
-@app_commands.describe(url="YouTube or Spotify URL")
+@app_commands.describe(url="YouTube or Spotify URL, or what to search for")
 async def play(interaction: discord.Interaction, url: str):
     """Play a song from YouTube or Spotify"""
     player = get_music_player(interaction.guild_id)
@@ -577,42 +1984,70 @@ async def play(interaction: discord.Interaction, url: str):
         await interaction.response.send_message("You need to be in a voice channel!", ephemeral=True)
         return
     
-    # Connect to voice channel if not connected
-    if player.voice_client is None:
-        player.voice_client = await interaction.user.voice.channel.connect()
-    elif player.voice_client.channel != interaction.user.voice.channel:
-        await interaction.response.send_message("I'm already in a different voice channel!", ephemeral=True)
-        return
+    # Sampled requests are traced from here to the first audio frame
+    trace = tracing.start_trace('play', guild=interaction.guild_id, interaction=interaction.id)
+    interaction.extras['trace'] = trace
     
+    # Connecting can take seconds, longer than Discord waits for a response
     await interaction.response.defer()
     
+    # Connect to voice channel if not connected
+    with trace.span('voice_connect'):
+        connected = await join_voice(player, interaction.user.voice.channel)
+    if not connected:
+        trace.finish('rejected')
+        await interaction.followup.send("I'm already in a different voice channel!", ephemeral=True)
+        return
+    player.text_channel_id = interaction.channel_id  # Report playback problems here
+    
     try:
         # Check if it's Spotify or YouTube
-        if 'spotify.com' in url or 'open.spotify.com' in url:
+        link = urls.parse(url)
+        if link and link['provider'] == 'spotify':
             # Handle Spotify
-            spotify_result = await get_spotify_track_info(url)
+            with trace.span('spotify_lookup'), metrics.time_extraction('spotify'):
+                spotify_result = await get_spotify_track_info(url)
             
             # Check if it's a playlist (returns list) or single track (returns tuple)
             if isinstance(spotify_result, list):
                 # Playlist - add first batch and start playing, then continue in background
                 total_tracks = len(spotify_result)
-                await interaction.followup.send(f"Processing **{total_tracks} tracks** from Spotify playlist...")
+                # All progress goes into this one message, edited at a throttled rate
+                progress_message = await interaction.followup.send(
+                    f"Processing **{total_tracks} tracks** from Spotify playlist...", wait=True)
                 
                 # Process in batches of 5 for better performance
                 batch_size = 5
                 total_added = 0
+                total_failed = 0
                 started_playing = False
                 
+                def report_progress():
+                    remaining = total_tracks - total_added - total_failed
+                    if remaining:
+                        content = (f"⏳ Adding **{total_tracks} tracks** from Spotify playlist: "
+                                   f"{total_added} added, {total_failed} failed, {remaining} remaining")
+                        if started_playing:
+                            content = "🎵 Started playing! " + content
+                    else:
+                        content = f"✅ Finished! Added **{total_added}/{total_tracks} tracks** from Spotify playlist to queue!"
+                        if total_failed:
+                            content += f" ({total_failed} couldn't be found)"
+                    outbound.edit(interaction.channel_id, progress_message, content)
+                
                 async def add_track_to_queue(yt_url, track_name):
                     """Helper to add track and handle errors"""
-                    nonlocal total_added
+                    nonlocal total_added, total_failed
                     try:
                         await player.add_to_queue(yt_url, interaction)
                         total_added += 1
                         return True
                     except Exception as e:
                         print(f"Error adding track {track_name}: {e}")
+                        total_failed += 1
                         return False
+                    finally:
+                        report_progress()
                 
                 # Add first batch and start playing immediately
                 first_batch = spotify_result[:batch_size]
@@ -625,13 +2060,13 @@ async def play(interaction: discord.Interaction, url: str):
                 await asyncio.gather(*first_batch_tasks, return_exceptions=True)
                 
                 # Start playing if nothing is playing
-                if not player.voice_client.is_playing() and not player.voice_client.is_paused():
-                    await player.play_next(interaction)
+                if player.voice_client and not player.voice_client.is_playing() and not player.voice_client.is_paused():
+                    await player.send(player.start_if_idle, interaction)
                     started_playing = True
+                    report_progress()
                 
                 # Continue adding rest in background
                 async def add_remaining_tracks():
-                    nonlocal total_added
                     for i in range(batch_size, total_tracks, batch_size):
                         batch = spotify_result[i:i + batch_size]
                         batch_tasks = [
@@ -639,46 +2074,80 @@ async def play(interaction: discord.Interaction, url: str):
                             for yt_url, track_name in batch
                         ]
                         await asyncio.gather(*batch_tasks, return_exceptions=True)
-                    
-                    # Send final update
-                    await interaction.followup.send(
-                        f"✅ Finished! Added **{total_added}/{total_tracks} tracks** from Spotify playlist to queue!",
-                        ephemeral=False
-                    )
                 
                 # Start background task for remaining tracks
                 asyncio.create_task(add_remaining_tracks())
-                
-                # Send immediate feedback
-                if started_playing:
-                    await interaction.followup.send(
-                        f"🎵 Started playing! Adding remaining **{total_tracks - batch_size} tracks** in background...",
-                        ephemeral=False
-                    )
             else:
                 # Single track
                 yt_url, track_name = spotify_result
                 count = await player.add_to_queue(yt_url, interaction)
                 await interaction.followup.send(f"Added **{track_name}** to queue!")
-        elif 'youtube.com' in url or 'youtu.be' in url:
-            # Handle YouTube
-            count = await player.add_to_queue(url, interaction)
+        elif urls.is_youtube(url):
+            # Handle YouTube, other pages (channels, @handles) go to yt-dlp as they are
+            count = await player.add_to_queue(urls.canonicalize(url), interaction)
             if count > 1:
                 await interaction.followup.send(f"Added {count} songs to queue!")
             else:
                 track_title = player.queue[-1]['title'] if player.queue else "Unknown"
                 await interaction.followup.send(f"Added **{track_title}** to queue!")
+        elif not search_cache.looks_like_url(url):
+            # Plain text plays the top search result, as is (no extraction until it plays)
+            with trace.span('resolve', kind='search_list'):
+                results = await search_cache.search(url, search_youtube)
+            if not results:
+                trace.finish('no_results')
+                await interaction.followup.send(f"No results for **{url}**.", ephemeral=True)
+                return
+            await player.send(player.append_tracks, [dict(results[0], requester=interaction.user)])
+            await interaction.followup.send(f"Added **{results[0]['title']}** to queue!")
         else:
+            trace.finish('invalid_url')
             await interaction.followup.send("Please provide a valid YouTube or Spotify URL.", ephemeral=True)
             return
         
         # Start playing if nothing is playing
-        if not player.voice_client.is_playing() and not player.voice_client.is_paused():
-            await player.play_next(interaction)
+        await player.send(player.start_if_idle, interaction)
+        if not trace.playback_started:
+            # Queued behind another song, so there's no first frame to wait for
+            trace.finish('queued')
     except Exception as e:
+        trace.finish('error', error=str(e)[:200])
         await interaction.followup.send(f"Error: {str(e)}", ephemeral=True)
 
 
+@play.autocomplete('url')
+async def play_url_autocomplete(interaction: discord.Interaction, current: str):
+    """Suggest YouTube songs for what's been typed so far (nothing once it's a URL)"""
+    results = await search_cache.autocomplete(interaction.user.id, current, search_youtube)
+    choices = []
+    for track in results[:25]:
+        length = f" ({format_timestamp(track['duration'])})"
+        # Discord rejects the whole response if a name is over 100 characters
+        name = (track['title'][:100 - len(length)] + length)[:100]
+        choices.append(app_commands.Choice(name=name, value=track['url']))
+    return choices
+
+
+@bot.tree.command(name="search", description="Search YouTube and pick a song to play")
+@app_commands.describe(query="What to search for")
+async def search_command(interaction: discord.Interaction, query: str):
+    """Show YouTube search results as a pick list"""
+    await interaction.response.defer(ephemeral=True)
+    try:
+        results = await search_cache.search(query, search_youtube)
+    except Exception as e:
+        await interaction.followup.send(f"❌ Search failed: {e}", ephemeral=True)
+        return
+    if not results:
+        await interaction.followup.send(f"No results for **{query}**.", ephemeral=True)
+        return
+    
+    lines = [f"**Results for {query}:**"]
+    for index, track in enumerate(results, start=1):
+        lines.append(f"`{index}.` {track['title']} ({format_timestamp(track['duration'])})")
+    await interaction.followup.send("\n".join(lines)[:1900], view=SearchResultsView(results), ephemeral=True)
+
+
 @bot.tree.command(name="playmiku", description="Play a 24/7 playlist with only Hatsune Miku songs")
 async def playmiku(interaction: discord.Interaction):
     """Play the Hatsune Miku playlist"""
@@ -688,26 +2157,32 @@ async def playmiku(interaction: discord.Interaction):
         await interaction.response.send_message("You need to be in a voice channel!", ephemeral=True)
         return
     
-    if player.voice_client is None:
-        player.voice_client = await interaction.user.voice.channel.connect()
-    elif player.voice_client.channel != interaction.user.voice.channel:
-        await interaction.response.send_message("I'm already in a different voice channel!", ephemeral=True)
-        return
-    
     await interaction.response.defer()
     
-    playlist_url = "https://youtube.com/playlist?list=PLn79jv6mDuar0LS9n6o6JH6ZA5unZZ3x7&si=pu4wmmxL-NkeRVMx"
+    if not await join_voice(player, interaction.user.voice.channel):
+        await interaction.followup.send("I'm already in a different voice channel!", ephemeral=True)
+        return
+    player.text_channel_id = interaction.channel_id  # Report playback problems here
+    
+    playlist_url = playlist_snapshots.CURATED_PLAYLISTS.get('miku')
+    if not playlist_url:
+        await interaction.followup.send("The Miku playlist is not configured!", ephemeral=True)
+        return
     
     try:
         count = await player.add_to_queue(playlist_url, interaction)
-        # Enable queue loop and save the playlist as original queue
-        player.loop_queue = True
-        player.original_queue = [track.copy() for track in player.queue]
-        player.save_queue()  # Save loop state and original queue
+        
+        def enable_playlist_loop():
+            # Enable queue loop and save the playlist as original queue
+            player.loop_queue = True
+            player.source_playlist = 'miku'
+            player.original_queue = [track.copy() for track in player.queue]
+            player.save_queue()  # Save loop state and original queue
+        
+        await player.send(enable_playlist_loop)
         await interaction.followup.send(f"Added Hatsune Miku playlist ({count} songs) to queue! Queue looping enabled.")
         
-        if not player.voice_client.is_playing() and not player.voice_client.is_paused():
-            await player.play_next(interaction)
+        await player.send(player.start_if_idle, interaction)
     except Exception as e:
         await interaction.followup.send(f"Error: {str(e)}", ephemeral=True)
 
@@ -725,11 +2200,11 @@ async def skip(interaction: discord.Interaction):
         await interaction.response.send_message("You need to be in the same voice channel as the bot!", ephemeral=True)
         return
     
-    if not player.voice_client.is_playing() and not player.voice_client.is_paused():
+    if not player.voice_client.is_playing() and not player.voice_client.is_paused() and not player.loading:
         await interaction.response.send_message("Nothing is playing!", ephemeral=True)
         return
     
-    player.skip()
+    await player.send(player.skip, interaction)
     await interaction.response.send_message("Skipped!")
 
 
@@ -742,19 +2217,8 @@ async def stop(interaction: discord.Interaction):
         await interaction.response.send_message("I'm not in a voice channel!", ephemeral=True)
         return
     
-    # Stop playback
-    if player.voice_client.is_playing() or player.voice_client.is_paused():
-        player.voice_client.stop()
-    
-    # Clear queue and disconnect
-    player.clear_queue()
-    player.current = None
-    player.loop_song = False
-    player.loop_queue = False
-    player.original_queue = []
-    player.save_queue()
-    await player.voice_client.disconnect()
-    player.voice_client = None
+    # Stop playback, clear queue and disconnect
+    await player.send(player.disconnect)
     
     await interaction.response.send_message("Stopped playing and left the voice channel!")
 
@@ -768,14 +2232,7 @@ async def leave(interaction: discord.Interaction):
         await interaction.response.send_message("I'm not in a voice channel!", ephemeral=True)
         return
     
-    player.clear_queue()  # This already saves
-    player.current = None
-    player.loop_song = False
-    player.loop_queue = False
-    player.original_queue = []
-    player.save_queue()  # Save after clearing everything
-    await player.voice_client.disconnect()
-    player.voice_client = None
+    await player.send(player.disconnect)  # Clears and saves everything
     
     await interaction.response.send_message("Left the voice channel!")
 
@@ -799,7 +2256,7 @@ async def clearqueue(interaction: discord.Interaction):
     """Clear the queue"""
     player = get_music_player(interaction.guild_id)
     
-    player.clear_queue()
+    await player.send(player.clear_queue)
     await interaction.response.send_message("Queue cleared!")
 
 
@@ -809,7 +2266,7 @@ async def shuffle(interaction: discord.Interaction):
     player = get_music_player(interaction.guild_id)
     
     try:
-        player.shuffle_queue()
+        await player.send(player.shuffle_queue)
         await interaction.response.send_message("Queue shuffled!")
     except ValueError as e:
         await interaction.response.send_message(str(e), ephemeral=True)
@@ -820,9 +2277,7 @@ async def loop(interaction: discord.Interaction):
     """Toggle loop for current song"""
     player = get_music_player(interaction.guild_id)
     
-    player.loop_song = not player.loop_song
-    player.loop_queue = False  # Disable queue loop when song loop is enabled
-    player.save_queue()  # Save loop state
+    await player.send(player.toggle_loop_song)
     
     status = "enabled" if player.loop_song else "disabled"
     await interaction.response.send_message(f"Song loop {status}!")
@@ -833,23 +2288,75 @@ async def loopplaylist(interaction: discord.Interaction):
     """Toggle loop for current queue"""
     player = get_music_player(interaction.guild_id)
     
-    player.loop_queue = not player.loop_queue
-    player.loop_song = False  # Disable song loop when queue loop is enabled
-    
-    # When enabling loop, save current queue + current song as original
-    if player.loop_queue:
-        player.original_queue = []
-        if player.current:
-            player.original_queue.append(player.current.copy())
-        player.original_queue.extend([track.copy() for track in player.queue])
-    else:
-        player.original_queue = []
-    
-    player.save_queue()  # Save loop state and original queue
+    await player.send(player.toggle_loop_queue)
     status = "enabled" if player.loop_queue else "disabled"
     await interaction.response.send_message(f"Queue loop {status}!")
 
 
+@bot.tree.command(name="seek", description="Jump to a position in the current song")
+@app_commands.describe(position="Where to jump to, e.g. 90, 1:30 or 1:02:30")
+async def seek(interaction: discord.Interaction, position: str):
+    """Seek within the current song"""
+    player = get_music_player(interaction.guild_id)
+    
+    if player.voice_client is None or not player.voice_client.is_connected():
+        await interaction.response.send_message("I'm not in a voice channel!", ephemeral=True)
+        return
+    
+    if interaction.user.voice is None or interaction.user.voice.channel != player.voice_client.channel:
+        await interaction.response.send_message("You need to be in the same voice channel as the bot!", ephemeral=True)
+        return
+    
+    if not player.current or (not player.voice_client.is_playing() and not player.voice_client.is_paused()):
+        await interaction.response.send_message("Nothing is playing!", ephemeral=True)
+        return
+    
+    try:
+        seconds = parse_timestamp(position)
+    except ValueError as e:
+        await interaction.response.send_message(str(e), ephemeral=True)
+        return
+    
+    duration = player.current.get('duration') or 0
+    if duration and seconds >= duration:
+        await interaction.response.send_message(f"This song is only {format_timestamp(duration)} long!", ephemeral=True)
+        return
+    
+    await interaction.response.defer()
+    
+    try:
+        await player.seek(seconds)
+        await interaction.followup.send(f"Jumped to **{format_timestamp(seconds)}**")
+    except Exception as e:
+        await interaction.followup.send(f"Error: {str(e)}", ephemeral=True)
+
+
+@bot.tree.command(name="nowplaying", description="Show the current song and its progress")
+async def nowplaying(interaction: discord.Interaction):
+    """Show the current song with a progress bar"""
+    player = get_music_player(interaction.guild_id)
+    
+    if not player.current or player.voice_client is None:
+        await interaction.response.send_message("Nothing is playing!", ephemeral=True)
+        return
+    
+    status = "⏸️ Paused" if player.is_paused else "▶️ Playing"
+    await interaction.response.send_message(
+        f"{status}: **{player.current['title']}**\n{player.get_progress_text()}"
+    )
+
+
+@bot.tree.command(name="normalize", description="Toggle volume normalization between songs")
+async def normalize(interaction: discord.Interaction):
+    """Toggle loudness normalization for this server"""
+    player = get_music_player(interaction.guild_id)
+    
+    await player.send(player.toggle_normalize)
+    
+    status = "enabled" if player.normalize else "disabled"
+    await interaction.response.send_message(f"Volume normalization {status}! (applies from the next song)")
+
+
 @bot.tree.command(name="pause", description="Pause the currently playing song")
 async def pause(interaction: discord.Interaction):
     """Pause the current song"""
@@ -863,7 +2370,7 @@ async def pause(interaction: discord.Interaction):
         await interaction.response.send_message("Nothing is playing!", ephemeral=True)
         return
     
-    player.pause()
+    await player.send(player.pause)
     await interaction.response.send_message("Paused!")
 
 
@@ -880,7 +2387,7 @@ async def resume(interaction: discord.Interaction):
         await interaction.response.send_message("Nothing is paused!", ephemeral=True)
         return
     
-    player.resume()
+    await player.send(player.resume)
     await interaction.response.send_message("Resumed!")
 
 
@@ -935,6 +2442,289 @@ async def test_tenor(interaction: discord.Interaction):
         )
 
 
+async def is_bot_owner(user):
+    """Whether the user may use owner-only commands"""
+    if BOT_OWNER_IDS:
+        return user.id in BOT_OWNER_IDS
+    return await bot.is_owner(user)
+
+
+@bot.tree.command(name="botstatus", description="Show bot memory and player stats (Owner only)")
+async def botstatus(interaction: discord.Interaction):
+    """Show resident players and memory use (Owner only)"""
+    if not await is_bot_owner(interaction.user):
+        await interaction.response.send_message("Only the bot owner can use this command.", ephemeral=True)
+        return
+    
+    stats = get_player_stats()
+    process_mb = f"{stats['process_bytes'] / 1024 / 1024:.1f} MB" if stats['process_bytes'] else "unknown"
+    slots = ffmpeg_usage.slot_stats()
+    lines = [
+        f"**Players in memory:** {stats['players']} ({stats['connected']} in voice)",
+        f"**Queued tracks:** {stats['queued_tracks']} (~{stats['queue_bytes'] / 1024:.0f} KB)",
+        f"**Process memory:** {process_mb}",
+    ]
+    if slots['limit']:
+        lines.append(f"**ffmpeg slots:** {slots['in_use']}/{slots['limit']} in use, {slots['waiting']} waiting")
+    top = ffmpeg_usage.top_usage()
+    if top:
+        lines.append("**Top ffmpeg usage:**")
+        for guild_id, usage in top:
+            lines.append(
+                f"`{guild_id}` CPU {usage['cpu_percent']:.0f}%, {usage.get('rss_bytes', 0) / 1024 / 1024:.0f} MB, "
+                f"reading {usage['read_rate'] / 1024:.0f} KB/s"
+            )
+    await interaction.response.send_message("\n".join(lines), ephemeral=True)
+
+
+@bot.tree.command(name="loopstatus", description="Show event loop lag and the worst recent stalls (Owner only)")
+async def loopstatus(interaction: discord.Interaction):
+    """Show event loop lag and what blocked it recently (Owner only)"""
+    if not await is_bot_owner(interaction.user):
+        await interaction.response.send_message("Only the bot owner can use this command.", ephemeral=True)
+        return
+    
+    if not loop_monitor.LOOP_MONITOR_ENABLED:
+        await interaction.response.send_message(
+            "The loop monitor is off. Set `LOOP_MONITOR_ENABLED=true` in `.env` to turn it on.", ephemeral=True
+        )
+        return
+    
+    lines = []
+    lag = loop_monitor.get_lag_stats()
+    if lag:
+        lines.append(
+            f"**Loop lag (last minute):** p50 {lag['p50'] * 1000:.1f}ms, p99 {lag['p99'] * 1000:.1f}ms, "
+            f"max {lag['max'] * 1000:.1f}ms"
+        )
+    
+    worst = loop_monitor.get_worst_offenders()
+    if not worst:
+        lines.append("No stalls recorded")
+    for stall in worst:
+        when = time.strftime('%H:%M:%S', time.localtime(stall['time']))
+        lines.append(
+            f"\n**{stall['duration'] * 1000:.0f}ms** at {when} - {stall['activity'] or 'unknown'}"
+            f" ({stall['coroutine'] or 'callback'})"
+        )
+        if stall['stack']:
+            lines.append("```" + "\n".join(stall['stack'][-4:]) + "```")
+    
+    # Stay under Discord's message length limit
+    await interaction.response.send_message("\n".join(lines)[:1900], ephemeral=True)
+
+
+@bot.tree.command(name="memprofile", description="Profile what the bot's memory is used by (Owner only)")
+@app_commands.describe(action="start tracing, write a report, or stop tracing")
+async def memprofile(interaction: discord.Interaction, action: Literal['start', 'report', 'stop']):
+    """Start/stop tracing allocations and write memory reports (Owner only)"""
+    if not await is_bot_owner(interaction.user):
+        await interaction.response.send_message("Only the bot owner can use this command.", ephemeral=True)
+        return
+    
+    if action == 'start':
+        if memory_profiler.start():
+            message = "Memory profiling started. Use `/memprofile report` later to see what grew since now."
+        else:
+            message = "Memory profiling is already running."
+        await interaction.response.send_message(message, ephemeral=True)
+        return
+    
+    if action == 'stop':
+        if memory_profiler.is_tracing():
+            memory_profiler.stop()
+            message = "Memory profiling stopped."
+        else:
+            message = "Memory profiling isn't running."
+        await interaction.response.send_message(message, ephemeral=True)
+        return
+    
+    if not memory_profiler.is_tracing():
+        await interaction.response.send_message(
+            "Memory profiling isn't running, use `/memprofile start` first.", ephemeral=True
+        )
+        return
+    # Snapshots of a big heap take a while
+    await interaction.response.defer(ephemeral=True)
+    try:
+        result = await write_memory_report(f"/memprofile by {interaction.user}")
+    except Exception as e:
+        await interaction.followup.send(f"❌ Error writing memory report: {e}", ephemeral=True)
+        return
+    if result:
+        await interaction.followup.send(f"Report written to `{result[0]}` ({result[1]}).", ephemeral=True)
+    else:
+        await interaction.followup.send("Memory profiling was stopped before the report finished.", ephemeral=True)
+
+
+@bot.tree.command(name="top", description="Show the most played songs")
+@app_commands.describe(scope="This server (default) or every server")
+async def top(interaction: discord.Interaction, scope: Literal['server', 'everywhere'] = 'server'):
+    """Show the most played songs from the play history"""
+    guild_id = interaction.guild_id if scope == 'server' else None
+    tracks = play_history.top_tracks(guild_id)
+    if not tracks:
+        await interaction.response.send_message("Nothing has been played yet!", ephemeral=True)
+        return
+    
+    totals = play_history.totals(guild_id)
+    where = "on this server" if guild_id else "everywhere"
+    lines = [f"**Most played {where}** ({totals['plays']} plays)"]
+    for index, track in enumerate(tracks, start=1):
+        skip_rate = track['skips'] * 100 // track['plays']
+        lines.append(f"`{index}.` {track['title']} - {track['plays']} plays"
+                     + (f", skipped {skip_rate}%" if skip_rate else ""))
+    await interaction.response.send_message("\n".join(lines)[:1900])
+
+
+playlist_group = app_commands.Group(name="playlist", description="Save and load queues")
+
+
+async def saved_playlist_autocomplete(interaction: discord.Interaction, current: str):
+    """Suggest this server's saved playlist names"""
+    current = current.lower()
+    return [
+        app_commands.Choice(name=name, value=name)
+        for name in sorted(saved_playlists.get_playlists(interaction.guild_id))
+        if current in name
+    ][:25]
+
+
+@playlist_group.command(name="save", description="Save the current queue as a playlist")
+@app_commands.describe(name="Name for the playlist (replaces a saved playlist with the same name)")
+async def playlist_save(interaction: discord.Interaction, name: str):
+    """Save the current song, queue and loop mode"""
+    player = get_music_player(interaction.guild_id)
+    records, loop_mode = await player.send(player.get_playlist_tracks)
+    try:
+        playlist = saved_playlists.save_playlist(interaction.guild_id, name, records, loop_mode)
+    except ValueError as e:
+        await interaction.response.send_message(f"❌ {e}", ephemeral=True)
+        return
+    loop_text = f", {loop_mode} loop" if loop_mode else ""
+    await interaction.response.send_message(
+        f"Saved playlist **{saved_playlists.normalize_name(name)}** ({len(playlist['tracks'])} songs{loop_text})."
+    )
+
+
+@playlist_group.command(name="load", description="Add a saved playlist to the queue")
+@app_commands.describe(name="The saved playlist")
+@app_commands.autocomplete(name=saved_playlist_autocomplete)
+async def playlist_load(interaction: discord.Interaction, name: str):
+    """Queue a saved playlist straight from its saved songs, without extraction"""
+    player = get_music_player(interaction.guild_id)
+    
+    if interaction.user.voice is None:
+        await interaction.response.send_message("You need to be in a voice channel!", ephemeral=True)
+        return
+    
+    try:
+        playlist = saved_playlists.get_playlist(interaction.guild_id, name)
+    except ValueError as e:
+        await interaction.response.send_message(f"❌ {e}", ephemeral=True)
+        return
+    if playlist is None:
+        await interaction.response.send_message(f"There's no saved playlist called **{name}**.", ephemeral=True)
+        return
+    name = saved_playlists.normalize_name(name)
+    
+    await interaction.response.defer()
+    if not await join_voice(player, interaction.user.voice.channel):
+        await interaction.followup.send("I'm already in a different voice channel!", ephemeral=True)
+        return
+    player.text_channel_id = interaction.channel_id  # Report playback problems here
+    
+    tracks = [saved_playlists.from_record(record, interaction.user) for record in playlist['tracks']]
+    await player.send(player.append_tracks, tracks)
+    loop_text = ""
+    if playlist.get('loop'):
+        await player.send(player.set_loop_mode, playlist['loop'])
+        loop_text = f" {playlist['loop'].capitalize()} looping enabled."
+    await interaction.followup.send(f"Added saved playlist **{name}** ({len(tracks)} songs) to queue!{loop_text}")
+    await player.send(player.start_if_idle, interaction)
+    
+    if saved_playlists.needs_revalidation(playlist):
+        asyncio.create_task(revalidate_saved_playlist(player, name))
+
+
+@playlist_group.command(name="list", description="Show this server's saved playlists")
+async def playlist_list(interaction: discord.Interaction):
+    """List saved playlists with their song counts and length"""
+    playlists = saved_playlists.get_playlists(interaction.guild_id)
+    if not playlists:
+        await interaction.response.send_message("No saved playlists yet. Save the queue with `/playlist save`.", ephemeral=True)
+        return
+    
+    lines = ["**Saved playlists:**"]
+    for name, playlist in sorted(playlists.items()):
+        total = sum(record[2] or 0 for record in playlist['tracks'])
+        loop_text = f", {playlist['loop']} loop" if playlist.get('loop') else ""
+        lines.append(f"**{name}** - {len(playlist['tracks'])} songs, {format_timestamp(total)}{loop_text}")
+    await interaction.response.send_message("\n".join(lines)[:1900], ephemeral=True)
+
+
+@playlist_group.command(name="delete", description="Delete a saved playlist")
+@app_commands.describe(name="The saved playlist")
+@app_commands.autocomplete(name=saved_playlist_autocomplete)
+async def playlist_delete(interaction: discord.Interaction, name: str):
+    """Delete a saved playlist"""
+    try:
+        deleted = saved_playlists.delete_playlist(interaction.guild_id, name)
+    except ValueError as e:
+        await interaction.response.send_message(f"❌ {e}", ephemeral=True)
+        return
+    if deleted:
+        await interaction.response.send_message(f"Deleted saved playlist **{saved_playlists.normalize_name(name)}**.")
+    else:
+        await interaction.response.send_message(f"There's no saved playlist called **{name}**.", ephemeral=True)
+
+
+@playlist_group.command(name="export", description="Download a saved playlist as a file")
+@app_commands.describe(name="The saved playlist")
+@app_commands.autocomplete(name=saved_playlist_autocomplete)
+async def playlist_export(interaction: discord.Interaction, name: str):
+    """Send a saved playlist in the compact text format"""
+    try:
+        playlist = saved_playlists.get_playlist(interaction.guild_id, name)
+    except ValueError as e:
+        await interaction.response.send_message(f"❌ {e}", ephemeral=True)
+        return
+    if playlist is None:
+        await interaction.response.send_message(f"There's no saved playlist called **{name}**.", ephemeral=True)
+        return
+    name = saved_playlists.normalize_name(name)
+    text = saved_playlists.export_text(name, playlist)
+    await interaction.response.send_message(
+        f"Saved playlist **{name}** ({len(playlist['tracks'])} songs). Use `/playlist import` to add it to another server.",
+        file=discord.File(io.BytesIO(text.encode('utf-8')), filename=f"{name.replace(' ', '_')}.txt")
+    )
+
+
+@playlist_group.command(name="import", description="Save a playlist from an exported file")
+@app_commands.describe(name="Name for the playlist", file="A file from /playlist export")
+async def playlist_import(interaction: discord.Interaction, name: str, file: discord.Attachment):
+    """Save a playlist from an exported file (its songs are re-checked the first time it's loaded)"""
+    if file.size > 1024 * 1024:
+        await interaction.response.send_message("❌ That file is too big to be an exported playlist.", ephemeral=True)
+        return
+    try:
+        records, loop_mode = saved_playlists.parse_text((await file.read()).decode('utf-8'))
+        # Imported songs haven't been checked here, validate them on the first load
+        playlist = saved_playlists.save_playlist(interaction.guild_id, name, records, loop_mode, validated=0)
+    except (ValueError, UnicodeDecodeError) as e:
+        await interaction.response.send_message(f"❌ {e}", ephemeral=True)
+        return
+    except discord.HTTPException as e:
+        await interaction.response.send_message(f"❌ Couldn't download the file: {e}", ephemeral=True)
+        return
+    await interaction.response.send_message(
+        f"Imported playlist **{saved_playlists.normalize_name(name)}** ({len(playlist['tracks'])} songs)."
+    )
+
+
+bot.tree.add_command(playlist_group)
+
+
 @bot.tree.command(name="help", description="Show all the commands")
 async def help_command(interaction: discord.Interaction):
     """Show help message with all commands"""
@@ -945,7 +2735,8 @@ async def help_command(interaction: discord.Interaction):
 **MikuBot Commands:**
 
 `/join` - Make the bot join your voice channel (Admin only)
-`/play <url>` - Play a song from YouTube or Spotify
+`/play <url>` - Play a song from YouTube or Spotify (or type to search)
+`/search <query>` - Search YouTube and pick a song to play
 `/playmiku` - Play a 24/7 playlist with only Hatsune Miku songs
 `/skip` - Skip the current song (must be in VC)
 `/stop` - Stop playing and leave voice channel
@@ -955,8 +2746,17 @@ async def help_command(interaction: discord.Interaction):
 `/shuffle` - Shuffle the current queue (needs 2+ tracks)
 `/loop` - Loop the currently playing song
 `/loopplaylist` - Loop the current queue
+`/playlist save|load|list|delete` - Save the queue and load it again later
+`/playlist export|import` - Move a saved playlist to another server as a file
+`/top` - Show the most played songs
+`/seek <time>` - Jump to a position in the current song (e.g. 1:30)
+`/nowplaying` - Show the current song and its progress
+`/normalize` - Toggle volume normalization between songs
 `/pause` - Pause the currently playing song
 `/resume` - Resume currently playing song
+`/botstatus` - Show bot memory and player stats (Owner only)
+`/loopstatus` - Show event loop lag and recent stalls (Owner only)
+`/memprofile` - Find out what the bot's memory is used by (Owner only)
 `/help` - Show this help message
 
 **Notes:**
@@ -969,6 +2769,8 @@ async def help_command(interaction: discord.Interaction):
 """
     await interaction.response.send_message(help_text)
 
+IMPORTS_DONE = time.perf_counter()
+
 if __name__ == "__main__":
     token = os.getenv('DISCORD_TOKEN')
     if not token:
@@ -1005,4 +2807,6 @@ if __name__ == "__main__":
     except Exception as e:
         print(f"Unexpected error: {str(e)}")
         exit(1)
+    finally:
+        audio_cache.flush()
 
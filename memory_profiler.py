@@ -0,0 +1,194 @@
+"""
+MikuBot Memory Profiler
+Finds out what the bot's memory grows on: tracemalloc snapshots are diffed against a
+baseline and grouped by subsystem (the library or bot module that allocated) and by
+the bot code that led to it, next to a count of live players, queue views and audio
+sources per guild.
+
+Reports are written as text files to MEMORY_PROFILE_DIR. Profile on demand with
+/memprofile or SIGUSR1, or set MEMORY_PROFILE_INTERVAL for periodic samples.
+"""
+
+import gc
+import os
+import time
+import tracemalloc
+from collections import defaultdict
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+MEMORY_PROFILE_DIR = os.getenv('MEMORY_PROFILE_DIR', 'memory_profiles')
+MEMORY_PROFILE_FRAMES = int(os.getenv('MEMORY_PROFILE_FRAMES', '10'))  # Stack frames recorded per allocation
+MEMORY_PROFILE_INTERVAL = int(os.getenv('MEMORY_PROFILE_INTERVAL', '0'))  # Minutes between periodic samples, 0 = off
+MEMORY_PROFILE_WINDOW = int(os.getenv('MEMORY_PROFILE_WINDOW', '60'))  # Seconds traced per periodic sample
+MEMORY_PROFILE_KEEP = int(os.getenv('MEMORY_PROFILE_KEEP', '20'))  # Newest reports kept, older ones are deleted
+
+TOP_ENTRIES = 15  # Rows per report section
+
+_BOT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_baseline = None
+_baseline_at = None
+
+
+def is_tracing():
+    return tracemalloc.is_tracing() and _baseline is not None
+
+
+def start():
+    """Start tracing allocations and take the baseline. Returns False if already tracing"""
+    global _baseline, _baseline_at
+    if is_tracing():
+        return False
+    tracemalloc.start(MEMORY_PROFILE_FRAMES)
+    _baseline = _take_snapshot()
+    _baseline_at = time.time()
+    return True
+
+
+def stop():
+    """Stop tracing and drop the baseline (tracemalloc's own memory is freed)"""
+    global _baseline, _baseline_at
+    _baseline = _baseline_at = None
+    tracemalloc.stop()
+
+
+def _take_snapshot():
+    return tracemalloc.take_snapshot().filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+        tracemalloc.Filter(False, '<unknown>'),
+    ])
+
+
+def subsystem(filename):
+    """Name the package or bot module a source file belongs to, e.g. yt_dlp, discord, bot:main, python:json"""
+    parts = filename.replace('\\', '/').split('/')
+    for marker in ('site-packages', 'dist-packages'):
+        if marker in parts[:-1]:
+            return os.path.splitext(parts[parts.index(marker) + 1])[0]
+    if os.path.dirname(os.path.abspath(filename)) == _BOT_DIR:
+        return 'bot:' + os.path.splitext(parts[-1])[0]
+    for index, part in enumerate(parts[:-1]):
+        if part.startswith('python3'):
+            return 'python:' + os.path.splitext(parts[index + 1])[0]
+    return os.path.splitext(parts[-1])[0]
+
+
+def _bot_call_site(traceback):
+    """The innermost frame in the bot's own code, as file:line"""
+    for frame in reversed(traceback):
+        if os.path.dirname(os.path.abspath(frame.filename)) == _BOT_DIR:
+            return f"{os.path.basename(frame.filename)}:{frame.lineno}"
+    return 'outside bot code'
+
+
+def count_objects(type_names, guild_of):
+    """
+    Count live instances of the named classes per guild, as {type: {guild_id: count}}
+    Walks every tracked object, so it takes a while on a big heap
+    """
+    counts = defaultdict(lambda: defaultdict(int))
+    for obj in gc.get_objects():
+        name = type(obj).__name__
+        if name in type_names:
+            counts[name][guild_of(obj)] += 1
+    return counts
+
+
+def _format_size(size):
+    sign = '-' if size < 0 else '+'
+    size = abs(size)
+    if size >= 1024 * 1024:
+        return f"{sign}{size / 1024 / 1024:.1f} MB"
+    return f"{sign}{size / 1024:.1f} KB"
+
+
+def _format_table(title, rows):
+    lines = [f"\n== {title} =="]
+    for name, size, count in sorted(rows, key=lambda row: -row[1])[:TOP_ENTRIES]:
+        lines.append(f"{_format_size(size):>12}  {count:+9d} blocks  {name}")
+    return lines
+
+
+def _prune_reports():
+    """Delete all but the newest MEMORY_PROFILE_KEEP reports"""
+    # Timestamped names sort oldest first
+    reports = sorted(name for name in os.listdir(MEMORY_PROFILE_DIR)
+                     if name.startswith('memory-') and name.endswith('.txt'))
+    for name in reports[:max(len(reports) - MEMORY_PROFILE_KEEP, 0)]:
+        try:
+            os.remove(os.path.join(MEMORY_PROFILE_DIR, name))
+        except OSError as e:
+            print(f"Error deleting old memory report {name}: {e}")
+
+
+def build_report(reason, census):
+    """
+    Diff the heap against the baseline and write a report (blocking, run in an executor)
+    census is collected on the event loop by the caller. Returns (path, summary), or None if not tracing
+    """
+    baseline, baseline_at = _baseline, _baseline_at
+    if baseline is None or not tracemalloc.is_tracing():
+        return None
+    snapshot = _take_snapshot()
+    diffs = snapshot.compare_to(baseline, 'traceback')
+
+    by_subsystem = defaultdict(lambda: [0, 0])
+    by_call_site = defaultdict(lambda: [0, 0])
+    for diff in diffs:
+        for key, groups in ((subsystem(diff.traceback[-1].filename), by_subsystem),
+                            (_bot_call_site(diff.traceback), by_call_site)):
+            groups[key][0] += diff.size_diff
+            groups[key][1] += diff.count_diff
+    growth = sum(diff.size_diff for diff in diffs)
+    traced, peak = tracemalloc.get_traced_memory()
+
+    now = time.time()
+    lines = [
+        f"MikuBot memory report ({reason})",
+        f"Taken {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(now))}, "
+        f"baseline from {now - baseline_at:.0f}s earlier",
+        f"Process memory: {census['process_bytes'] / 1024 / 1024:.1f} MB" if census['process_bytes']
+        else "Process memory: unknown",
+        f"Traced: {traced / 1024 / 1024:.1f} MB (peak {peak / 1024 / 1024:.1f} MB), "
+        f"growth since baseline {_format_size(growth)}, "
+        f"tracemalloc overhead {tracemalloc.get_tracemalloc_memory() / 1024 / 1024:.1f} MB",
+    ]
+    lines += _format_table("Growth by subsystem",
+                           [(name, size, count) for name, (size, count) in by_subsystem.items()])
+    lines += _format_table("Growth by bot call site",
+                           [(name, size, count) for name, (size, count) in by_call_site.items()])
+
+    lines.append("\n== Largest growing allocations ==")
+    for diff in sorted(diffs, key=lambda diff: -diff.size_diff)[:TOP_ENTRIES // 3]:
+        lines.append(f"{_format_size(diff.size_diff):>12}  {diff.count_diff:+9d} blocks")
+        lines += ["    " + line for line in diff.traceback.format(limit=6)]
+
+    lines.append("\n== Live objects ==")
+    if census['objects'] is None:
+        lines.append("Not counted in periodic reports (it walks the whole heap)")
+    for name, guilds in sorted((census['objects'] or {}).items()):
+        unowned = guilds.get(None, 0)
+        lines.append(f"{name:<16} {sum(guilds.values()):8d}" + (f"  ({unowned} not attached to a guild)" if unowned else ""))
+
+    lines.append(f"\n== Guilds by memory (top {TOP_ENTRIES} of {len(census['guilds'])}) ==")
+    lines.append(f"{'guild':<22}{'tracks':>8}{'queue KB':>10}{'source KB':>11}{'views':>7}")
+    for guild in sorted(census['guilds'], key=lambda guild: -(guild['queue_bytes'] + guild['source_bytes']))[:TOP_ENTRIES]:
+        lines.append(f"{guild['guild_id']:<22}{guild['queued']:>8}{guild['queue_bytes'] / 1024:>10.1f}"
+                     f"{guild['source_bytes'] / 1024:>11.1f}{guild['views']:>7}")
+
+    os.makedirs(MEMORY_PROFILE_DIR, exist_ok=True)
+    path = os.path.join(MEMORY_PROFILE_DIR, time.strftime('memory-%Y%m%d-%H%M%S.txt', time.localtime(now)))
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("\n".join(lines) + "\n")
+    _prune_reports()
+
+    top = max(by_subsystem.items(), key=lambda item: item[1][0], default=None)
+    summary = f"growth {_format_size(growth)}"
+    if top:
+        summary += f", mostly {top[0]} ({_format_size(top[1][0])})"
+    return path, summary
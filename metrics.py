@@ -0,0 +1,250 @@
+"""
+MikuBot Metrics Module
+Counters, gauges and histograms for playback and extraction performance, served
+in Prometheus text format on a local HTTP endpoint.
+
+Metrics are always collected (it's just a few additions); the endpoint only runs
+when METRICS_PORT is set in .env
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))  # 0 = don't serve metrics
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')  # Local only by default
+
+# Seconds, from fast cache hits up to slow playlist extractions
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SIZE_BUCKETS = (1024, 10 * 1024, 100 * 1024, 1024 ** 2, 10 * 1024 ** 2, 100 * 1024 ** 2)
+
+# Updated from executor and voice threads too
+_lock = threading.Lock()
+_registry = []
+_server_runner = None
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """Base class - a named metric with optional labels, registered for export"""
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.values = {}
+        _registry.append(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labels):
+            raise ValueError(f"{self.name} expects labels {self.labels}, got {tuple(labels)}")
+        return tuple(labels[name] for name in self.labels)
+
+    def samples(self):
+        """(suffix, label string, value) tuples for the text format"""
+        with _lock:
+            items = list(self.values.items())
+        return [('', _format_labels(self.labels, key), value) for key, value in items]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, labels, value in self.samples():
+            lines.append(f"{self.name}{suffix}{labels} {_format_value(value)}")
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    """A value that only goes up"""
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with _lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """A value that goes up and down, or is read from a function at scrape time"""
+    kind = 'gauge'
+
+    def __init__(self, name, help_text, labels=()):
+        super().__init__(name, help_text, labels)
+        self.function = None
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with _lock:
+            self.values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with _lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, function):
+        """Read the value from function() whenever metrics are scraped"""
+        self.function = function
+
+    def samples(self):
+        if self.function is not None:
+            try:
+                return [('', '', self.function())]
+            except Exception:
+                return []
+        return super().samples()
+
+
+class Histogram(Metric):
+    """Counts observations in buckets, plus their sum and count"""
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=TIME_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with _lock:
+            entry = self.values.get(key)
+            if entry is None:
+                entry = self.values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe how long the with block took (also when it raises)"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        with _lock:
+            items = [(key, (list(entry[0]), entry[1], entry[2])) for key, entry in self.values.items()]
+        samples = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                samples.append(('_bucket', _format_labels(self.labels, key, ('le', _format_value(float(bound)))), cumulative))
+            samples.append(('_bucket', _format_labels(self.labels, key, ('le', '+Inf')), count))
+            samples.append(('_sum', _format_labels(self.labels, key), total))
+            samples.append(('_count', _format_labels(self.labels, key), count))
+        return samples
+
+
+# Extraction (kind: single, playlist, search, spotify, or stream for the extraction right before playback)
+extraction_seconds = Histogram('mikubot_extraction_seconds', 'Time spent in yt-dlp and Spotify lookups', ['kind'])
+extraction_failures = Counter('mikubot_extraction_failures_total', 'Failed yt-dlp and Spotify lookups', ['kind'])
+executor_queued = Gauge('mikubot_executor_queued', 'Blocking jobs waiting for an executor thread')
+
+# Playback
+track_gap_seconds = Histogram('mikubot_track_gap_seconds', 'Silence between one song ending and the next one starting')
+tracks_started = Counter('mikubot_tracks_started_total', 'Songs that started playing')
+track_load_failures = Counter('mikubot_track_load_failures_total', 'Songs that could not be loaded')
+ffmpeg_processes = Gauge('mikubot_ffmpeg_processes', 'Open ffmpeg audio sources')
+ffmpeg_cpu_percent = Gauge('mikubot_ffmpeg_cpu_percent', 'CPU used by all ffmpeg processes (100 = one core)')
+ffmpeg_rss_bytes = Gauge('mikubot_ffmpeg_rss_bytes', 'Resident memory of all ffmpeg processes')
+ffmpeg_slot_waiters = Gauge('mikubot_ffmpeg_slot_waiters', 'Songs waiting for an ffmpeg slot')
+ffmpeg_slot_wait_seconds = Histogram('mikubot_ffmpeg_slot_wait_seconds', 'Time spent waiting for an ffmpeg slot')
+ffmpeg_limit_actions = Counter('mikubot_ffmpeg_limit_actions_total', 'ffmpeg processes over a limit', ['action'])
+voice_connections = Gauge('mikubot_voice_connections', 'Connected voice clients')
+players = Gauge('mikubot_players', 'Music players in memory')
+queued_tracks = Gauge('mikubot_queued_tracks', 'Tracks queued across all guilds')
+longest_queue = Gauge('mikubot_longest_queue', 'Tracks in the longest guild queue')
+
+# Voice recovery (cause: disconnected, region, error; result: resumed or failed)
+voice_recovery_seconds = Histogram('mikubot_voice_recovery_seconds', 'Time from a dropped voice connection to audio again', ['cause'])
+voice_recoveries = Counter('mikubot_voice_recoveries_total', 'Attempts to resume after a dropped voice connection', ['result'])
+
+# Event loop (see loop_monitor.py)
+loop_lag_seconds = Histogram('mikubot_loop_lag_seconds', 'How late the event loop ran a 50ms timer')
+blocking_calls = Counter('mikubot_blocking_calls_total', 'Event loop stalls longer than the blocking threshold')
+
+# Persistence
+state_write_seconds = Histogram('mikubot_state_write_seconds', 'Time spent writing state', ['namespace'])
+state_write_bytes = Histogram('mikubot_state_write_bytes', 'Size of state writes', ['namespace'], buckets=SIZE_BUCKETS)
+
+# Caches (cache: audio, playlist_snapshot, loudness, stream_url; result: hit or miss)
+cache_requests = Counter('mikubot_cache_requests_total', 'Cache lookups', ['cache', 'result'])
+
+# GIF responses
+tenor_seconds = Histogram('mikubot_tenor_request_seconds', 'Time spent on Tenor API lookups')
+tenor_requests = Counter('mikubot_tenor_requests_total', 'Tenor API lookups', ['result'])
+gif_responses = Counter('mikubot_gif_responses_total', 'GIF responses sent', ['trigger'])
+
+# Progress message edits (result: sent, coalesced, rate_limited, failed; see outbound.py)
+outbound_edits = Counter('mikubot_outbound_edits_total', 'Progress message edits', ['result'])
+
+
+@contextmanager
+def time_extraction(kind):
+    """Time a lookup, counting it as failed if it raises"""
+    try:
+        with extraction_seconds.time(kind=kind):
+            yield
+    except Exception:
+        extraction_failures.inc(kind=kind)
+        raise
+
+
+def render():
+    """All metrics in Prometheus text format"""
+    return '\n'.join(metric.render() for metric in _registry) + '\n'
+
+
+async def start_server(host=METRICS_HOST, port=METRICS_PORT):
+    """Serve /metrics (safe to call more than once)"""
+    global _server_runner
+    if _server_runner is not None:
+        return
+    # Only imported when the endpoint is enabled, so importing metrics stays cheap
+    from aiohttp import web
+
+    async def _handle_metrics(request):
+        return web.Response(
+            body=render().encode(),
+            headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+        )
+
+    app = web.Application()
+    app.router.add_get('/metrics', _handle_metrics)
+    _server_runner = web.AppRunner(app, access_log=None)
+    await _server_runner.setup()
+    await web.TCPSite(_server_runner, host, port).start()
+    print(f"Metrics available at http://{host}:{port}/metrics")
@@ -10,6 +10,7 @@ import random
 import re
 import os
 from dotenv import load_dotenv
+import metrics
 
 # Load environment variables
 load_dotenv()
@@ -81,6 +82,7 @@ async def get_tenor_gif(search_term: str, api_key: str = None) -> str:
     if not api_key:
         return None
     
+    result = 'empty'
     try:
         async with aiohttp.ClientSession() as session:
             url = f"https://tenor.googleapis.com/v2/search"
@@ -91,15 +93,22 @@ async def get_tenor_gif(search_term: str, api_key: str = None) -> str:
                 'limit': 20,
                 'media_filter': 'gif'
             }
-            async with session.get(url, params=params) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    results = data.get('results', [])
-                    if results:
-                        gif = random.choice(results)
-                        return gif.get('media_formats', {}).get('gif', {}).get('url')
+            with metrics.tenor_seconds.time():
+                async with session.get(url, params=params) as response:
+                    if response.status == 200:
+                        data = await response.json()
+                        results = data.get('results', [])
+                        if results:
+                            gif = random.choice(results)
+                            result = 'ok'
+                            return gif.get('media_formats', {}).get('gif', {}).get('url')
+                    else:
+                        result = f'http_{response.status}'
     except Exception as e:
+        result = 'error'
         print(f"Error fetching Tenor GIF: {e}")
+    finally:
+        metrics.tenor_requests.inc(result=result)
     
     return None
 
@@ -197,6 +206,7 @@ async def handle_message_response(message: discord.Message, bot_user: discord.Us
             await message.reply(gif_url)
         else:
             await message.channel.send(gif_url)
+        metrics.gif_responses.inc(trigger=trigger_info['type'])
         return True
     except Exception as e:
         print(f"Error sending GIF response: {e}")
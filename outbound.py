@@ -0,0 +1,101 @@
+"""
+MikuBot Outbound Module
+Paces message edits that only show progress (like bulk imports), so they don't
+compete with command responses for Discord's rate limits. Edits are coalesced per
+channel: only the newest content for each message is sent, at most one edit per
+PROGRESS_EDIT_SECONDS in a channel and OUTBOUND_EDITS_PER_SECOND overall.
+
+discord.py already tracks the per-route rate-limit headers and waits inside the
+request when a bucket is empty, which just lets more updates coalesce here. A 429
+that still comes back pauses the channel for as long as Discord asks.
+"""
+
+import asyncio
+import os
+import time
+import discord
+from dotenv import load_dotenv
+import metrics
+
+# Load environment variables
+load_dotenv()
+
+PROGRESS_EDIT_SECONDS = float(os.getenv('PROGRESS_EDIT_SECONDS', '3'))  # Minimum time between edits in a channel
+OUTBOUND_EDITS_PER_SECOND = float(os.getenv('OUTBOUND_EDITS_PER_SECOND', '10'))  # Across all channels
+
+DEFAULT_RETRY_AFTER = 5  # Seconds to pause a channel when a 429 doesn't say how long
+
+_pending = {}  # channel_id -> {message_id: (message, content)}, oldest first
+_workers = {}  # channel_id -> task sending that channel's edits
+_channel_ready_at = {}  # channel_id -> when the channel may be edited again (monotonic)
+_next_global_slot = 0.0
+
+
+def edit(channel_id, message, content):
+    """Edit a message soon, replacing any edit of it that hasn't been sent yet"""
+    pending = _pending.setdefault(channel_id, {})
+    if message.id in pending:
+        metrics.outbound_edits.inc(result='coalesced')
+    pending[message.id] = (message, content)
+    if channel_id not in _workers:
+        _workers[channel_id] = asyncio.get_running_loop().create_task(_send_edits(channel_id))
+
+
+def pending_edits():
+    return sum(len(pending) for pending in _pending.values())
+
+
+async def _global_slot():
+    """Wait for a turn under the overall edit rate"""
+    global _next_global_slot
+    now = time.monotonic()
+    wait = _next_global_slot - now
+    _next_global_slot = max(now, _next_global_slot) + 1 / OUTBOUND_EDITS_PER_SECOND
+    if wait > 0:
+        await asyncio.sleep(wait)
+
+
+def _retry_after(error):
+    """Seconds Discord asked us to wait, from the exception or the response headers"""
+    if isinstance(error, discord.RateLimited):
+        return error.retry_after
+    headers = getattr(error.response, 'headers', None) or {}
+    for header in ('Retry-After', 'X-RateLimit-Reset-After'):
+        try:
+            return float(headers[header])
+        except (KeyError, TypeError, ValueError):
+            continue
+    return DEFAULT_RETRY_AFTER
+
+
+async def _send_edits(channel_id):
+    """Send a channel's pending edits, one at a time and no faster than allowed"""
+    pending = _pending[channel_id]
+    try:
+        while pending:
+            delay = _channel_ready_at.get(channel_id, 0) - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await _global_slot()
+            # Updates that arrived while waiting are already merged into this one
+            message_id = next(iter(pending))
+            message, content = pending.pop(message_id)
+
+            pause = PROGRESS_EDIT_SECONDS
+            try:
+                await message.edit(content=content)
+                metrics.outbound_edits.inc(result='sent')
+            except (discord.RateLimited, discord.HTTPException) as e:
+                if isinstance(e, discord.RateLimited) or e.status == 429:
+                    metrics.outbound_edits.inc(result='rate_limited')
+                    pause = max(pause, _retry_after(e))
+                    # Try again later, unless a newer update replaced it meanwhile
+                    pending.setdefault(message_id, (message, content))
+                else:
+                    metrics.outbound_edits.inc(result='failed')
+                    print(f"Error editing progress message in channel {channel_id}: {e}")
+            _channel_ready_at[channel_id] = time.monotonic() + pause
+    finally:
+        del _workers[channel_id]
+        if not pending:
+            _pending.pop(channel_id, None)
@@ -0,0 +1,283 @@
+"""
+MikuBot Play History Module
+Append-only log of every song played: time, guild, video ID, how long it played and
+whether it was skipped. The log is folded into per-guild and overall play counts
+when it grows too big, so "most played" queries are cheap. Used for /top and to warm
+the audio cache at startup.
+
+Each process of a sharded bot keeps its own log and counts (a guild's plays all happen
+in the process owning its shard). With a shared state backend, every process also
+publishes its most played songs there, so "everywhere" counts include all processes.
+
+One line per play, tab separated: time, guild, video ID, seconds played, skipped (0/1), title
+"""
+
+import atexit
+import heapq
+import json
+import os
+import threading
+import time
+import uuid
+from dotenv import load_dotenv
+import state_backend
+
+# Load environment variables
+load_dotenv()
+
+PLAY_HISTORY_FILE = os.getenv('PLAY_HISTORY_FILE', 'play_history.log')
+PLAY_STATS_FILE = os.getenv('PLAY_STATS_FILE', 'play_stats.json')
+PLAY_HISTORY_MAX_MB = float(os.getenv('PLAY_HISTORY_MAX_MB', '5'))  # Compact the log at this size
+HISTORY_WARM_TRACKS = int(os.getenv('HISTORY_WARM_TRACKS', '20'))  # Most played songs cached at startup
+
+# Sharded processes each get their own files, e.g. play_history.shards-0-1.log
+_shard_ids = [shard_id.strip() for shard_id in os.getenv('SHARD_IDS', '').split(',') if shard_id.strip()]
+PROCESS_KEY = 'shards-' + '-'.join(_shard_ids) if _shard_ids else 'main'
+if _shard_ids:
+    PLAY_HISTORY_FILE = '.{}'.join(os.path.splitext(PLAY_HISTORY_FILE)).format(PROCESS_KEY)
+    PLAY_STATS_FILE = '.{}'.join(os.path.splitext(PLAY_STATS_FILE)).format(PROCESS_KEY)
+
+ROTATED_FILE = PLAY_HISTORY_FILE + '.1'
+LOG_HEADER = '#play-history'
+
+# Keep the counts bounded, the least played songs are dropped first
+MAX_TRACKS_PER_GUILD = 300
+MAX_TRACKS_OVERALL = 5000
+FOLDED_IDS_KEPT = 20
+PUBLISHED_TRACKS = 500  # Most played songs each process shares with the others
+
+# {'folded': [log id, ...], 'overall': {video_id: [plays, skips, seconds, last_played]},
+#  'guilds': {guild_id: {video_id: [...]}}, 'titles': {video_id: title}}
+_stats = None
+_pending = []  # Lines recorded but not written yet
+_others = {}  # Other processes' published counts, {process key: {'tracks', 'titles', 'plays', 'skips'}}
+_lock = threading.Lock()  # Guards _pending and _stats, only held briefly (record runs on the event loop)
+_file_lock = threading.Lock()  # Loads, flushes and compaction run in an executor
+
+
+def _empty_stats():
+    return {'folded': [], 'overall': {}, 'guilds': {}, 'titles': {}}
+
+
+def _add(counts, video_id, played, skipped, when):
+    entry = counts.get(video_id)
+    if entry is None:
+        entry = counts[video_id] = [0, 0, 0, 0]
+    entry[0] += 1
+    entry[1] += skipped
+    entry[2] += played
+    entry[3] = max(entry[3], when)
+
+
+def _trim(counts, limit):
+    """Drop the least played songs once there are well over limit"""
+    if len(counts) > limit * 1.2:
+        keep = heapq.nlargest(limit, counts.items(), key=lambda item: (item[1][0], item[1][3]))
+        counts.clear()
+        counts.update(keep)
+
+
+def _apply(stats, fields):
+    """Count one log line's play"""
+    when, guild_id, video_id, played, skipped, title = fields
+    when, played, skipped = int(when), int(played), int(skipped)
+    _add(stats['overall'], video_id, played, skipped, when)
+    guild_counts = stats['guilds'].setdefault(guild_id, {})
+    _add(guild_counts, video_id, played, skipped, when)
+    if title:
+        stats['titles'][video_id] = title
+    _trim(guild_counts, MAX_TRACKS_PER_GUILD)
+    _trim(stats['overall'], MAX_TRACKS_OVERALL)
+
+
+def _read_stats():
+    try:
+        with open(PLAY_STATS_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return _empty_stats()
+    except Exception as e:
+        print(f"Error loading {PLAY_STATS_FILE}: {e}")
+        return _empty_stats()
+
+
+def _fold_log(stats, path):
+    """Count a log file's plays into stats, unless it was already folded. Returns the log's id"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            header = f.readline().split()
+            log_id = header[1] if len(header) == 2 and header[0] == LOG_HEADER else None
+            if log_id is None or log_id in stats['folded']:
+                return log_id
+            for line in f:
+                fields = line.rstrip('\n').split('\t', 5)
+                if len(fields) == 6:
+                    try:
+                        _apply(stats, fields)
+                    except ValueError:
+                        pass  # Damaged line, e.g. cut off by a crash
+            return log_id
+    except FileNotFoundError:
+        return None
+
+
+def load():
+    """Load the counts, including plays still in the log (blocking, run in an executor at startup)"""
+    global _stats
+    with _file_lock:
+        if _stats is not None:
+            return
+        stats = _read_stats()
+        for path in (ROTATED_FILE, PLAY_HISTORY_FILE):
+            _fold_log(stats, path)
+        with _lock:
+            # Plays recorded before the counts were loaded aren't in the log yet
+            for line in _pending:
+                _apply(stats, line.rstrip('\n').split('\t', 5))
+            _stats = stats
+    _read_others()
+
+
+def record(guild_id, video_id, title, played, skipped):
+    """Log a play (written out by the next flush, counted once load() has run)"""
+    title = ' '.join((title or '').split())  # Tabs and newlines would break the line format
+    fields = [str(int(time.time())), str(guild_id), video_id, str(int(played or 0)), str(int(skipped)), title]
+    with _lock:
+        _pending.append('\t'.join(fields) + '\n')
+        if _stats is not None:
+            _apply(_stats, fields)
+
+
+def _compact():
+    """Fold the log into the stats file and start a new log"""
+    stats = _read_stats()
+    # A compaction cut short by a crash leaves its rotated log behind, fold that first
+    paths = [ROTATED_FILE, PLAY_HISTORY_FILE] if os.path.exists(ROTATED_FILE) else [PLAY_HISTORY_FILE]
+    for path in paths:
+        os.replace(path, ROTATED_FILE)
+        log_id = _fold_log(stats, ROTATED_FILE)
+        if log_id and log_id not in stats['folded']:
+            stats['folded'] = (stats['folded'] + [log_id])[-FOLDED_IDS_KEPT:]
+    # Titles of songs that were trimmed away aren't needed anymore
+    known = set(stats['overall']).union(*stats['guilds'].values())
+    stats['titles'] = {video_id: title for video_id, title in stats['titles'].items() if video_id in known}
+
+    tmp_file = PLAY_STATS_FILE + '.tmp'
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(stats, f, separators=(',', ':'))
+    os.replace(tmp_file, PLAY_STATS_FILE)
+    # The log is only removed once its plays are safely in the stats file
+    os.remove(ROTATED_FILE)
+
+
+def _publish():
+    """Share this process' most played songs through the state backend"""
+    with _lock:
+        overall = _stats['overall']
+        tracks = dict(heapq.nlargest(PUBLISHED_TRACKS, overall.items(), key=lambda item: (item[1][0], item[1][3])))
+        published = {
+            'tracks': {video_id: list(entry) for video_id, entry in tracks.items()},
+            'titles': {video_id: _stats['titles'][video_id] for video_id in tracks if video_id in _stats['titles']},
+            'plays': sum(entry[0] for entry in overall.values()),
+            'skips': sum(entry[1] for entry in overall.values()),
+        }
+    state_backend.get_backend().set('play_stats', PROCESS_KEY, published)
+
+
+def _read_others():
+    """Fetch the counts the other processes published"""
+    global _others
+    backend = state_backend.get_backend()
+    if not backend.shared:
+        return
+    try:
+        _others = {key: value for key, value in backend.get_all('play_stats').items() if key != PROCESS_KEY}
+    except Exception as e:
+        print(f"Error reading other processes' play counts: {e}")
+
+
+def _write(lines):
+    """Append lines to the log, compacting it when it's too big"""
+    try:
+        new_file = not os.path.exists(PLAY_HISTORY_FILE)
+        with open(PLAY_HISTORY_FILE, 'a', encoding='utf-8') as f:
+            if new_file:
+                f.write(f"{LOG_HEADER} {uuid.uuid4().hex}\n")
+            f.writelines(lines)
+            size = f.tell()
+        if size > PLAY_HISTORY_MAX_MB * 1024 * 1024:
+            _compact()
+    except Exception as e:
+        print(f"Error writing play history: {e}")
+
+
+def flush():
+    """Append recorded plays to the log and trade counts with the other processes (blocking, run in an executor)"""
+    global _pending
+    with _file_lock:
+        with _lock:
+            lines, _pending = _pending, []
+        if lines:
+            _write(lines)
+    if not state_backend.get_backend().shared or _stats is None:
+        return
+    if lines:
+        try:
+            _publish()
+        except Exception as e:
+            print(f"Error publishing play counts: {e}")
+    _read_others()
+
+
+def _counts(guild_id):
+    """A guild's (or the overall, across processes) counts, empty until load() has run"""
+    if _stats is None:
+        return {}
+    if guild_id is not None:
+        return _stats['guilds'].get(str(guild_id), {})
+    if not _others:
+        return _stats['overall']
+    counts = {video_id: list(entry) for video_id, entry in _stats['overall'].items()}
+    for published in _others.values():
+        for video_id, (plays, skips, seconds, last_played) in published['tracks'].items():
+            entry = counts.setdefault(video_id, [0, 0, 0, 0])
+            entry[0] += plays
+            entry[1] += skips
+            entry[2] += seconds
+            entry[3] = max(entry[3], last_played)
+    return counts
+
+
+def _title(video_id):
+    if video_id in _stats['titles']:
+        return _stats['titles'][video_id]
+    for published in _others.values():
+        if video_id in published['titles']:
+            return published['titles'][video_id]
+    return video_id
+
+
+def top_tracks(guild_id=None, limit=10):
+    """Most played songs for a guild (or overall), as dicts with video_id, title, plays, skips and seconds"""
+    counts = _counts(guild_id)
+    top = heapq.nlargest(limit, counts.items(), key=lambda item: (item[1][0], item[1][3]))
+    return [
+        {'video_id': video_id, 'title': _title(video_id), 'plays': plays, 'skips': skips, 'seconds': seconds}
+        for video_id, (plays, skips, seconds, _) in top
+    ]
+
+
+def totals(guild_id=None):
+    """Total plays and skips for a guild (or overall), counting only songs still tracked"""
+    if guild_id is not None or _stats is None:
+        counts = _counts(guild_id)
+        return {'plays': sum(entry[0] for entry in counts.values()), 'skips': sum(entry[1] for entry in counts.values())}
+    overall = _stats['overall']
+    return {
+        'plays': sum(entry[0] for entry in overall.values()) + sum(other['plays'] for other in _others.values()),
+        'skips': sum(entry[1] for entry in overall.values()) + sum(other['skips'] for other in _others.values()),
+    }
+
+
+# Plays since the last flush would be lost on a normal exit otherwise
+atexit.register(flush)
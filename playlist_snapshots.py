@@ -0,0 +1,161 @@
+"""
+MikuBot Playlist Snapshot Module
+Keeps a saved copy of curated 24/7 playlists (like /playmiku) so they can be
+queued instantly, and refreshes them in the background on a schedule.
+"""
+
+import asyncio
+import os
+import time
+from dotenv import load_dotenv
+import metrics
+import state_backend
+import urls
+
+# Load environment variables
+load_dotenv()
+
+DEFAULT_CURATED_PLAYLISTS = 'miku=https://youtube.com/playlist?list=PLn79jv6mDuar0LS9n6o6JH6ZA5unZZ3x7&si=pu4wmmxL-NkeRVMx'
+
+# Curated playlists as comma separated name=url pairs, e.g.
+# CURATED_PLAYLISTS=miku=https://youtube.com/playlist?list=...,vocaloid=https://youtube.com/playlist?list=...
+CURATED_PLAYLISTS = {}
+for pair in os.getenv('CURATED_PLAYLISTS', DEFAULT_CURATED_PLAYLISTS).split(','):
+    if '=' in pair:
+        name, playlist_url = pair.split('=', 1)
+        CURATED_PLAYLISTS[name.strip()] = playlist_url.strip()
+
+REFRESH_INTERVAL = int(os.getenv('PLAYLIST_REFRESH_MINUTES', '360')) * 60
+
+# {name: {'url': str, 'updated': timestamp, 'tracks': [track, ...]}}
+snapshots = {}
+_refresh_task = None
+
+
+def _playlist_id(url):
+    """Get the list= id from a YouTube playlist URL"""
+    link = urls.parse(url)
+    return link['id'] if link and link['provider'] == 'youtube' and link['kind'] == 'playlist' else None
+
+
+def get_curated_name(url):
+    """Get the curated playlist name for a URL, None if it isn't one of ours"""
+    playlist_id = _playlist_id(url)
+    if not playlist_id:
+        return None
+    for name, curated_url in CURATED_PLAYLISTS.items():
+        if _playlist_id(curated_url) == playlist_id:
+            return name
+    return None
+
+
+def tracks_from_info(data):
+    """Build track dicts (without requester) from a flat playlist extraction"""
+    tracks = []
+    for entry in (data or {}).get('entries') or []:
+        if entry:
+            # Build URL from video ID
+            video_id = entry.get('id') or entry.get('url', '').split('watch?v=')[-1].split('&')[0]
+            tracks.append({
+                'url': f"https://www.youtube.com/watch?v={video_id}",
+                'title': entry.get('title', 'Unknown'),
+                'duration': entry.get('duration', 0),
+                'thumbnail': entry.get('thumbnail'),
+                'video_id': video_id,
+            })
+    return tracks
+
+
+def load_snapshots():
+    """Load saved snapshots from the state backend"""
+    global snapshots
+    try:
+        snapshots = state_backend.get_backend().get_all('playlists')
+        if snapshots:
+            print(f"Loaded {len(snapshots)} playlist snapshot(s)")
+    except Exception as e:
+        print(f"Error loading playlist snapshots: {e}")
+        snapshots = {}
+
+
+def save_snapshot(name):
+    """Write one snapshot to the state backend"""
+    try:
+        state_backend.get_backend().set('playlists', name, snapshots[name])
+    except Exception as e:
+        print(f"Error saving playlist snapshot '{name}': {e}")
+
+
+def get_tracks_for_url(url):
+    """
+    Get the snapshot tracks for a curated playlist URL
+    Returns a list of track dicts, or None if there's no snapshot for it
+    """
+    name = get_curated_name(url)
+    if not name:
+        return None
+    if name not in snapshots:
+        metrics.cache_requests.inc(cache='playlist_snapshot', result='miss')
+        return None
+    metrics.cache_requests.inc(cache='playlist_snapshot', result='hit')
+    return [track.copy() for track in snapshots[name]['tracks']]
+
+
+def store_snapshot(name, tracks):
+    """
+    Replace the snapshot for a curated playlist
+    Returns (added, removed) where added is a list of tracks and removed a set of video ids
+    """
+    old_tracks = snapshots.get(name, {}).get('tracks', [])
+    old_ids = {track['video_id'] for track in old_tracks}
+    new_ids = {track['video_id'] for track in tracks}
+
+    added = [track for track in tracks if track['video_id'] not in old_ids]
+    removed = old_ids - new_ids
+
+    snapshots[name] = {
+        'url': CURATED_PLAYLISTS.get(name),
+        'updated': time.time(),
+        'tracks': tracks,
+    }
+    save_snapshot(name)
+    return added, removed
+
+
+async def refresh_playlist(name, extract_info):
+    """Re-extract a curated playlist and update its snapshot. Returns (added, removed)"""
+    url = CURATED_PLAYLISTS[name]
+    loop = asyncio.get_running_loop()
+    data = await loop.run_in_executor(None, lambda: extract_info(url, download=False))
+    tracks = tracks_from_info(data)
+    if not tracks:
+        # Don't wipe a good snapshot because of a bad extraction
+        raise Exception("playlist extraction returned no tracks")
+    return store_snapshot(name, tracks)
+
+
+async def _refresh_loop(extract_info, on_change):
+    """Refresh every curated playlist on a schedule"""
+    while True:
+        for name in CURATED_PLAYLISTS:
+            snapshot = snapshots.get(name)
+            if snapshot and time.time() - snapshot.get('updated', 0) < REFRESH_INTERVAL:
+                continue
+            try:
+                added, removed = await refresh_playlist(name, extract_info)
+                print(f"Refreshed playlist '{name}': +{len(added)} -{len(removed)}")
+                if (added or removed) and snapshot:
+                    await on_change(name, added, removed)
+            except Exception as e:
+                print(f"Error refreshing playlist '{name}': {e}")
+        await asyncio.sleep(min(REFRESH_INTERVAL, 600))
+
+
+def start_refresh_loop(extract_info, on_change):
+    """
+    Start the background refresh task (safe to call more than once)
+    await on_change(name, added, removed) is called when a playlist's contents change
+    """
+    global _refresh_task
+    if _refresh_task is None or _refresh_task.done():
+        _refresh_task = asyncio.get_running_loop().create_task(_refresh_loop(extract_info, on_change))
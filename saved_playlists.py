@@ -0,0 +1,209 @@
+"""
+MikuBot Saved Playlists Module
+Named per-server playlists of already resolved songs (video ID, title, duration) and
+their loop mode, so a queue can be rebuilt without extracting anything. Songs are
+re-checked in the background when a playlist hasn't been validated for a while.
+
+Stored through the state backend, one entry per server.
+"""
+
+import asyncio
+import os
+import re
+import time
+from dotenv import load_dotenv
+import state_backend
+import urls
+
+# Load environment variables
+load_dotenv()
+
+SAVED_PLAYLIST_LIMIT = int(os.getenv('SAVED_PLAYLIST_LIMIT', '25'))  # Playlists per server
+SAVED_PLAYLIST_MAX_TRACKS = int(os.getenv('SAVED_PLAYLIST_MAX_TRACKS', '2000'))
+REVALIDATE_AFTER = float(os.getenv('SAVED_PLAYLIST_REVALIDATE_DAYS', '7')) * 86400
+
+# If more than this share of songs fail to validate it's probably YouTube or the network, not the songs
+MAX_INVALID_SHARE = 0.5
+
+NAME_PATTERN = re.compile(r'^[\w\- ]{1,32}$')
+FILE_HEADER = '#mikubot-playlist'
+LOOP_MODES = ('song', 'queue')
+
+_revalidating = set()  # (guild_id, name) pairs being checked
+
+
+def normalize_name(name):
+    """Playlist names are case-insensitive. Raises ValueError for names that can't be used"""
+    name = ' '.join(name.split()).lower()
+    if not NAME_PATTERN.match(name):
+        raise ValueError("Playlist names can be up to 32 letters, numbers, spaces, - or _")
+    return name
+
+
+def normalize_ref(ref):
+    """
+    Check a song reference from an imported file: a YouTube video ID, a ytsearch: query or a
+    YouTube video link (reduced to its ID). Raises ValueError for anything else, since imported
+    refs go straight to yt-dlp and ffmpeg
+    """
+    if urls.VIDEO_ID.match(ref):
+        return ref
+    if ref.startswith('ytsearch:') and ref[len('ytsearch:'):].strip():
+        return ref
+    link = urls.parse(ref)
+    if link is None:
+        raise ValueError("isn't a YouTube video ID or link")
+    if link['provider'] != 'youtube' or link['kind'] != 'video':
+        # Playlists and Spotify links would need resolving, saved playlists only hold single songs
+        raise ValueError("only single YouTube songs can be imported")
+    return link['id']
+
+
+def to_record(track):
+    """Compact saved form of a track: [video ID (or URL if there isn't one), title, duration]"""
+    return [track.get('video_id') or track.get('url'), track.get('title', 'Unknown'), track.get('duration') or 0]
+
+
+def from_record(record, requester=None):
+    """Build a queue track from a saved record"""
+    ref, title, duration = record
+    # Video IDs never contain ':', URLs and ytsearch: queries do
+    is_url = ':' in ref
+    return {
+        'url': ref if is_url else f"https://www.youtube.com/watch?v={ref}",
+        'title': title,
+        'duration': duration,
+        'thumbnail': None,
+        'video_id': urls.video_id(ref) if is_url else ref,
+        'requester': requester,
+    }
+
+
+def get_playlists(guild_id):
+    """All of a server's saved playlists, {name: playlist}"""
+    return state_backend.get_backend().get('saved_playlists', str(guild_id)) or {}
+
+
+def get_playlist(guild_id, name):
+    return get_playlists(guild_id).get(normalize_name(name))
+
+
+def save_playlist(guild_id, name, records, loop=None, validated=None):
+    """
+    Save (or replace) a playlist of track records
+    validated is when the songs were last known to play, now by default
+    """
+    name = normalize_name(name)
+    if not records:
+        raise ValueError("There are no songs to save")
+    if len(records) > SAVED_PLAYLIST_MAX_TRACKS:
+        raise ValueError(f"Playlists can have up to {SAVED_PLAYLIST_MAX_TRACKS} songs")
+    playlists = get_playlists(guild_id)
+    if name not in playlists and len(playlists) >= SAVED_PLAYLIST_LIMIT:
+        raise ValueError(f"This server already has {SAVED_PLAYLIST_LIMIT} saved playlists, delete one first")
+
+    now = time.time()
+    playlists[name] = {
+        'loop': loop if loop in LOOP_MODES else None,
+        'saved': now,
+        'validated': now if validated is None else validated,
+        'tracks': records,
+    }
+    state_backend.get_backend().set('saved_playlists', str(guild_id), playlists)
+    return playlists[name]
+
+
+def delete_playlist(guild_id, name):
+    """Delete a playlist, returns False if it didn't exist"""
+    name = normalize_name(name)
+    playlists = get_playlists(guild_id)
+    if playlists.pop(name, None) is None:
+        return False
+    backend = state_backend.get_backend()
+    if playlists:
+        backend.set('saved_playlists', str(guild_id), playlists)
+    else:
+        backend.delete('saved_playlists', str(guild_id))
+    return True
+
+
+def needs_revalidation(playlist):
+    return time.time() - playlist.get('validated', 0) > REVALIDATE_AFTER
+
+
+def export_text(name, playlist):
+    """
+    Export a playlist as text: a header line, then one song per line as
+    video ID, duration and title separated by tabs
+    """
+    lines = [f"{FILE_HEADER} name={name} loop={playlist.get('loop') or 'off'}"]
+    for ref, title, duration in playlist['tracks']:
+        # Tabs and newlines in titles would break the line format
+        lines.append(f"{ref}\t{int(duration or 0)}\t{' '.join(title.split())}")
+    return "\n".join(lines) + "\n"
+
+
+def parse_text(text):
+    """Read an exported playlist, returns (records, loop mode). Raises ValueError if it isn't one"""
+    lines = text.splitlines()
+    if not lines or not lines[0].startswith(FILE_HEADER):
+        raise ValueError("That isn't an exported MikuBot playlist")
+    options = dict(part.split('=', 1) for part in lines[0].split()[1:] if '=' in part)
+
+    records = []
+    for number, line in enumerate(lines[1:], start=2):
+        if not line.strip():
+            continue
+        parts = line.split('\t', 2)
+        if len(parts) != 3 or not parts[0]:
+            raise ValueError(f"Can't read line {number} of the playlist")
+        ref, duration, title = parts
+        try:
+            ref = normalize_ref(ref.strip())
+        except ValueError as e:
+            raise ValueError(f"Line {number} of the playlist: `{ref[:100]}` {e}")
+        records.append([ref, title or 'Unknown', int(duration) if duration.isdigit() else 0])
+    return records, options.get('loop') if options.get('loop') in LOOP_MODES else None
+
+
+async def revalidate(guild_id, name, check_track):
+    """
+    Check every song in a playlist again and update the saved copy
+    check_track(record) is a coroutine returning the song's current [ref, title, duration], raising if it can't play
+    Returns the refs of songs that were removed, or None if the check was skipped
+    """
+    key = (guild_id, name)
+    if key in _revalidating:
+        return None
+    _revalidating.add(key)
+    try:
+        playlist = get_playlist(guild_id, name)
+        if playlist is None:
+            return None
+        updated = {}
+        invalid = set()
+        # One at a time, this runs in the background and shouldn't compete with playback
+        for record in playlist['tracks']:
+            try:
+                updated[record[0]] = await check_track(record)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                invalid.add(record[0])
+        if len(invalid) > len(playlist['tracks']) * MAX_INVALID_SHARE:
+            print(f"Skipped revalidating playlist '{name}' for guild {guild_id}: "
+                  f"{len(invalid)}/{len(playlist['tracks'])} songs failed")
+            return None
+
+        # The playlist may have been changed or deleted while we were checking
+        playlist = get_playlist(guild_id, name)
+        if playlist is None:
+            return None
+        records = [updated.get(record[0], record) for record in playlist['tracks'] if record[0] not in invalid]
+        if records:
+            save_playlist(guild_id, name, records, playlist.get('loop'))
+        else:
+            delete_playlist(guild_id, name)
+        return invalid
+    finally:
+        _revalidating.discard(key)
@@ -0,0 +1,177 @@
+"""
+MikuBot Search Module
+YouTube search for /search and /play autocomplete. Results are kept in an LRU
+cache, and a query that extends a cached one (like "miku sen" after "miku") is
+answered from the cached results right away. Autocomplete queries are debounced
+per user, and searches nobody is waiting for anymore are cancelled before they start.
+
+Discord gives autocomplete about 3 seconds to answer, so it falls back to the
+closest cached results when a search takes longer than that.
+"""
+
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from dotenv import load_dotenv
+import metrics
+
+# Load environment variables
+load_dotenv()
+
+SEARCH_RESULTS = int(os.getenv('SEARCH_RESULTS', '10'))  # Results per search
+SEARCH_CACHE_SIZE = int(os.getenv('SEARCH_CACHE_SIZE', '1000'))  # Queries kept
+SEARCH_CACHE_TTL = int(os.getenv('SEARCH_CACHE_MINUTES', '60')) * 60
+SEARCH_CONCURRENCY = int(os.getenv('SEARCH_CONCURRENCY', '4'))  # Searches running at once
+
+AUTOCOMPLETE_DEBOUNCE = 0.35  # Wait this long for the next keystroke before searching
+AUTOCOMPLETE_BUDGET = 2.5  # Seconds until autocomplete must answer (Discord allows ~3)
+MIN_QUERY_LENGTH = 3
+
+_cache = OrderedDict()  # query -> (fetched_at, results), least recently used first
+_searches = {}  # query -> search task
+_running = set()  # Queries whose search has started in the executor
+_waiters = {}  # query -> callers waiting for it
+_latest = {}  # user_id -> future, resolved when that user types another keystroke
+_slots = None
+
+
+def normalize(query):
+    return ' '.join(query.lower().split())
+
+
+def looks_like_url(text):
+    text = text.strip().lower()
+    return '://' in text or text.startswith(('www.', 'youtube.com', 'youtu.be', 'open.spotify.com'))
+
+
+def _get_cached(query):
+    """Fresh cached results for exactly this query, None on a miss"""
+    entry = _cache.get(query)
+    if entry is None or time.monotonic() - entry[0] > SEARCH_CACHE_TTL:
+        return None
+    _cache.move_to_end(query)
+    return entry[1]
+
+
+def _store(query, results):
+    _cache[query] = (time.monotonic(), results)
+    _cache.move_to_end(query)
+    while len(_cache) > SEARCH_CACHE_SIZE:
+        _cache.popitem(last=False)
+
+
+def prefix_results(query):
+    """
+    Results for the longest cached query this one extends, narrowed to titles
+    containing every word typed so far. None if no cached query is a prefix
+    """
+    best = None
+    for cached_query in _cache:
+        if query.startswith(cached_query) and (best is None or len(cached_query) > len(best)):
+            best = cached_query
+    if best is None:
+        return None
+    results = _get_cached(best)
+    if results is None:
+        return None
+    words = query.split()
+    return [result for result in results if all(word in result['title'].lower() for word in words)]
+
+
+def cached_results(query):
+    """The best answer available without searching: exact results, else narrowed prefix results"""
+    query = normalize(query)
+    results = _get_cached(query)
+    if results is not None:
+        return results
+    return prefix_results(query)
+
+
+async def _run_search(query, search):
+    """Run one search in the executor when a slot is free, and cache its results"""
+    global _slots
+    if _slots is None:
+        _slots = asyncio.Semaphore(SEARCH_CONCURRENCY)
+    async with _slots:
+        # Once running in the executor it can't be stopped, so it's left to finish and fill the cache
+        _running.add(query)
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(None, lambda: search(query))
+        finally:
+            _running.discard(query)
+    _store(query, results)
+    return results
+
+
+async def search(query, search_fn):
+    """
+    Search for a query, from the cache when possible
+    search_fn(query) is the blocking search, returning a list of results with at least a title
+    Concurrent calls for the same query share one search
+    """
+    query = normalize(query)
+    results = _get_cached(query)
+    if results is not None:
+        metrics.cache_requests.inc(cache='search', result='hit')
+        return results
+    metrics.cache_requests.inc(cache='search', result='miss')
+
+    task = _searches.get(query)
+    if task is None:
+        task = _searches[query] = asyncio.get_running_loop().create_task(_run_search(query, search_fn))
+        task.add_done_callback(lambda done: _searches.pop(query) if _searches.get(query) is done else None)
+    _waiters[query] = _waiters.get(query, 0) + 1
+    try:
+        return await asyncio.shield(task)
+    finally:
+        _waiters[query] -= 1
+        if not _waiters[query]:
+            del _waiters[query]
+            # Nobody wants it anymore (e.g. the user kept typing), don't spend a slot on it
+            if not task.done() and query not in _running:
+                if _searches.get(query) is task:
+                    del _searches[query]
+                task.cancel()
+
+
+async def autocomplete(user_id, query, search_fn):
+    """
+    Results for one autocomplete keystroke, within Discord's deadline
+    Waits briefly for the next keystroke and gives up on queries the user has typed past
+    """
+    started = time.monotonic()
+    query = normalize(query)
+    # Each keystroke supersedes the user's previous one
+    loop = asyncio.get_running_loop()
+    previous = _latest.get(user_id)
+    if previous is not None and not previous.done():
+        previous.set_result(None)
+    superseded = _latest[user_id] = loop.create_future()
+    try:
+        if len(query) < MIN_QUERY_LENGTH or looks_like_url(query):
+            return []
+        results = _get_cached(query)
+        if results is not None:
+            return results
+
+        try:
+            await asyncio.wait_for(asyncio.shield(superseded), AUTOCOMPLETE_DEBOUNCE)
+            return prefix_results(query) or []
+        except asyncio.TimeoutError:
+            pass
+
+        lookup = loop.create_task(search(query, search_fn))
+        budget = AUTOCOMPLETE_BUDGET - (time.monotonic() - started)
+        done, _ = await asyncio.wait({lookup, superseded}, timeout=budget, return_when=asyncio.FIRST_COMPLETED)
+        if lookup not in done:
+            # Too slow or superseded: cancelling drops this caller's interest in the search
+            lookup.cancel()
+        elif not lookup.cancelled():
+            if lookup.exception() is None:
+                return lookup.result()
+            print(f"Search failed for '{query}': {lookup.exception()}")
+        return prefix_results(query) or []
+    finally:
+        if _latest.get(user_id) is superseded:
+            del _latest[user_id]
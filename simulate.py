@@ -0,0 +1,700 @@
+"""
+MikuBot Load Simulation
+Runs the real slash command handlers and MusicPlayer logic against many simulated
+guilds at once, to find scaling problems before production does.
+
+Voice clients consume audio frames in real time on their own threads (like discord.py's
+AudioPlayer), yt-dlp and Spotify are replaced with local stand-ins with configurable
+latency and failure rates, and each guild runs a random mix of commands.
+
+Usage:
+    python simulate.py                                   # 20 guilds for 60 seconds
+    python simulate.py --guilds 200 --duration 300       # A bigger run
+    python simulate.py --latency 1.5 --failure-rate 0.1 # Slow, flaky extraction
+    python simulate.py --mix play=5,skip=1,queue=1       # Change the command mix
+    python simulate.py --mix play=5,voice_drop=1         # Drop voice connections to test resuming
+    python simulate.py --json sim.json                   # Also save machine-readable results
+"""
+
+import argparse
+import asyncio
+import atexit
+import collections
+import concurrent.futures
+import hashlib
+import json
+import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+# Keep every file the bot writes inside a temp dir, and make sure optional features stay offline
+WORK_DIR = tempfile.mkdtemp(prefix='mikubot-sim-')
+os.environ.setdefault('STATE_BACKEND', 'json')
+os.environ['STATE_SQLITE_PATH'] = os.path.join(WORK_DIR, 'mikubot_state.db')
+os.environ['AUDIO_CACHE_ENABLED'] = 'false'
+atexit.register(shutil.rmtree, WORK_DIR, ignore_errors=True)
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+ORIGINAL_DIR = os.getcwd()
+sys.path.insert(0, REPO_DIR)
+os.chdir(WORK_DIR)
+
+import discord  # noqa: E402
+import main  # noqa: E402
+import audio_cache  # noqa: E402
+import loudness  # noqa: E402
+import playlist_snapshots  # noqa: E402
+import state_backend  # noqa: E402
+
+FRAME_LENGTH = discord.opus.Encoder.FRAME_LENGTH / 1000  # Seconds of audio per frame
+SILENCE_FRAME = b'\x00' * discord.opus.Encoder.FRAME_SIZE
+LOOP_LAG_INTERVAL = 0.05  # How often the loop lag probe wakes up
+
+# The running simulation (fakes created by the bot's own code look it up here)
+SIM = None
+
+DEFAULT_MIX = 'play=30,play_playlist=10,play_spotify=5,skip=20,shuffle=10,queue=20,nowplaying=5'
+
+
+class Stats:
+    """Measurements shared by the simulation (voice threads append, so only use thread-safe ops)"""
+    def __init__(self):
+        self.command_latency = collections.defaultdict(list)  # Time to the first response
+        self.command_total = collections.defaultdict(list)  # Time until the handler returned
+        self.command_errors = collections.Counter()
+        self.frame_lateness = collections.deque(maxlen=500000)
+        self.loop_lag = []
+        self.extractions = 0
+        self.extraction_failures = 0
+        self.tracks_started = 0
+        self.ffmpeg_processes = 0
+        self.max_ffmpeg_processes = 0
+        self.bot_log = collections.Counter()
+        self.lock = threading.Lock()
+
+
+class Simulation:
+    """Settings and shared state for one run"""
+    def __init__(self, args):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.stats = Stats()
+        self.text_channels = {}
+
+    def track_duration(self, video_id):
+        """Stable pseudo-random track length for a video id"""
+        digest = int(hashlib.md5(video_id.encode()).hexdigest(), 16)
+        low, high = self.args.track_length
+        return low + digest % (high - low + 1)
+
+    def video_info(self, video_id):
+        """Full extraction result like yt-dlp returns for one video"""
+        duration = self.track_duration(video_id)
+        return {
+            'id': video_id,
+            'title': f"Simulated Song {video_id}",
+            'duration': duration,
+            'thumbnail': None,
+            'url': f"https://sim.invalid/audio/{video_id}?duration={duration}",
+        }
+
+    def extraction_delay(self):
+        """Sleep like a remote extraction would"""
+        # Exponential around the mean, so a few requests are much slower than the rest
+        time.sleep(self.rng.expovariate(1 / self.args.latency) if self.args.latency else 0)
+        with self.stats.lock:
+            self.stats.extractions += 1
+            failed = self.rng.random() < self.args.failure_rate
+            if failed:
+                self.stats.extraction_failures += 1
+        if failed:
+            raise Exception("Simulated extraction failure")
+
+
+class FakeYoutubeDL:
+    """Stand-in for yt_dlp.YoutubeDL (called from executor threads, like the real one)"""
+    def __init__(self, sim, flat=False):
+        self.sim = sim
+        self.flat = flat
+
+    def extract_info(self, url, download=False):
+        self.sim.extraction_delay()
+        if 'list=' in url:
+            playlist_id = url.split('list=')[-1].split('&')[0]
+            return {'entries': [
+                {
+                    'id': f"{playlist_id}-{i}",
+                    'title': f"Simulated Song {playlist_id}-{i}",
+                    'duration': self.sim.track_duration(f"{playlist_id}-{i}"),
+                }
+                for i in range(self.sim.args.playlist_size)
+            ]}
+        if url.startswith('ytsearch:'):
+            video_id = hashlib.md5(url.encode()).hexdigest()[:11]
+            return {'entries': [self.sim.video_info(video_id)]}
+        if url.startswith('ytsearch'):
+            # ytsearchN: from /search and autocomplete
+            count, query = url[len('ytsearch'):].split(':', 1)
+            return {'entries': [
+                self.sim.video_info(hashlib.md5(f"{query}-{i}".encode()).hexdigest()[:11]) for i in range(int(count))
+            ]}
+        return self.sim.video_info(url.split('watch?v=')[-1].split('&')[0])
+
+    def prepare_filename(self, data):
+        return data['url']
+
+
+class FakeSpotify:
+    """Stand-in for spotipy.Spotify (blocking calls, like the real client)"""
+    PAGE_SIZE = 100
+
+    def __init__(self, sim):
+        self.sim = sim
+
+    def _wait(self):
+        time.sleep(self.sim.args.spotify_latency)
+
+    def _page(self, playlist_id, offset):
+        total = self.sim.args.playlist_size
+        items = [
+            {'track': {'type': 'track', 'name': f"Song {playlist_id}-{i}", 'artists': [{'name': 'Simulated Artist'}]}}
+            for i in range(offset, min(offset + self.PAGE_SIZE, total))
+        ]
+        has_next = offset + self.PAGE_SIZE < total
+        return {'items': items, 'next': (playlist_id, offset + self.PAGE_SIZE) if has_next else None}
+
+    def playlist_tracks(self, playlist_id):
+        self._wait()
+        return self._page(playlist_id, 0)
+
+    def next(self, results):
+        self._wait()
+        return self._page(*results['next'])
+
+    def track(self, track_id):
+        self._wait()
+        return {'name': f"Song {track_id}", 'artists': [{'name': 'Simulated Artist'}]}
+
+
+class FakePCMAudio(discord.AudioSource):
+    """Stand-in for discord.FFmpegPCMAudio that produces silence for the track's length"""
+    def __init__(self, source, *, before_options=None, options=None, **kwargs):
+        duration = int(source.split('duration=')[-1]) if 'duration=' in source else 10
+        start = 0
+        if before_options and before_options.startswith('-ss '):
+            start = float(before_options.split()[1])
+        self.frames_left = max(0, int((duration - start) / FRAME_LENGTH))
+        self.closed = False
+        stats = SIM.stats
+        with stats.lock:
+            stats.ffmpeg_processes += 1
+            stats.max_ffmpeg_processes = max(stats.max_ffmpeg_processes, stats.ffmpeg_processes)
+
+    def read(self):
+        if self.frames_left <= 0:
+            return b''
+        self.frames_left -= 1
+        return SILENCE_FRAME
+
+    def is_opus(self):
+        return False
+
+    def cleanup(self):
+        if not self.closed:
+            self.closed = True
+            with SIM.stats.lock:
+                SIM.stats.ffmpeg_processes -= 1
+
+
+class FakeAudioPlayer(threading.Thread):
+    """Reads frames every 20ms like discord.py's AudioPlayer and records how late each one is"""
+    def __init__(self, source, after, stats):
+        super().__init__(daemon=True)
+        self.source = source
+        self.after = after
+        self.stats = stats
+        self._end = threading.Event()
+        self._resumed = threading.Event()
+        self._resumed.set()
+        self.error = None  # Passed to the after callback, like a send failing in discord.py
+
+    def run(self):
+        started = time.perf_counter()
+        frames = 0
+        while not self._end.is_set():
+            if not self._resumed.is_set():
+                self._resumed.wait()
+                started = time.perf_counter()
+                frames = 0
+                continue
+
+            data = self.source.read()
+            if not data:
+                break
+            now = time.perf_counter()
+            self.stats.frame_lateness.append(now - (started + FRAME_LENGTH * frames))
+            frames += 1
+            time.sleep(max(0, started + FRAME_LENGTH * frames - time.perf_counter()))
+
+        self.source.cleanup()
+        self._end.set()
+        if self.after is not None:
+            try:
+                self.after(self.error)
+            except Exception:
+                pass  # The loop may already be gone at the end of the run
+
+    def stop(self):
+        self._end.set()
+        self._resumed.set()
+
+    def pause(self):
+        self._resumed.clear()
+
+    def resume(self):
+        self._resumed.set()
+
+    def is_playing(self):
+        return self._resumed.is_set() and not self._end.is_set()
+
+    def is_paused(self):
+        return not self._end.is_set() and not self._resumed.is_set()
+
+
+class FakeVoiceClient:
+    """Stand-in for discord.VoiceClient"""
+    def __init__(self, channel, stats):
+        self.channel = channel
+        self.stats = stats
+        self._connected = True
+        self._player = None
+
+    def is_connected(self):
+        return self._connected
+
+    def play(self, source, *, after=None):
+        if self.is_playing():
+            raise discord.ClientException('Already playing audio.')
+        with self.stats.lock:
+            self.stats.tracks_started += 1
+        self._player = FakeAudioPlayer(source, after, self.stats)
+        self._player.start()
+
+    def is_playing(self):
+        return self._player is not None and self._player.is_playing()
+
+    def is_paused(self):
+        return self._player is not None and self._player.is_paused()
+
+    def stop(self):
+        if self._player is not None:
+            self._player.stop()
+            self._player = None
+
+    def pause(self):
+        if self._player is not None:
+            self._player.pause()
+
+    def resume(self):
+        if self._player is not None:
+            self._player.resume()
+
+    @property
+    def source(self):
+        return self._player.source if self._player is not None else None
+
+    @source.setter
+    def source(self, value):
+        # Swapping keeps the after callback and resumes playback, like discord.py
+        if self._player is not None:
+            self._player.source = value
+            self._player.resume()
+
+    async def move_to(self, channel):
+        self.channel = channel
+
+    async def disconnect(self, *, force=False):
+        self.stop()
+        self._connected = False
+
+    def drop(self):
+        """Lose the connection under a song: the audio player fails and reports the error"""
+        self._connected = False
+        if self._player is not None:
+            self._player.error = ConnectionResetError("voice socket closed")
+        self.stop()
+
+
+class FakeMember:
+    """Stand-in for discord.Member"""
+    class Permissions:
+        administrator = True
+
+    def __init__(self, user_id, channel):
+        self.id = user_id
+        self.bot = False
+        self.guild_permissions = self.Permissions()
+        self.voice = type('VoiceState', (), {'channel': channel})()
+
+
+class FakeVoiceChannel:
+    """Stand-in for discord.VoiceChannel"""
+    def __init__(self, channel_id, stats):
+        self.id = channel_id
+        self.name = f"voice-{channel_id}"
+        self.stats = stats
+        self.members = []
+        self.voice_states = {}
+
+    async def connect(self, **kwargs):
+        await asyncio.sleep(SIM.args.connect_latency)
+        return FakeVoiceClient(self, self.stats)
+
+
+class FakeTextChannel:
+    """Stand-in for the text channel players report problems to"""
+    def __init__(self, channel_id):
+        self.id = channel_id
+        self.messages = 0
+
+    async def send(self, content=None, **kwargs):
+        self.messages += 1
+
+
+class FakeResponse:
+    """Stand-in for discord.InteractionResponse"""
+    def __init__(self, interaction):
+        self.interaction = interaction
+        self._done = False
+
+    def is_done(self):
+        return self._done
+
+    def _respond(self):
+        if self._done:
+            raise discord.InteractionResponded(self.interaction)
+        self._done = True
+        self.interaction.responded_at = time.perf_counter()
+
+    async def send_message(self, content=None, *, view=None, **kwargs):
+        self._respond()
+        self.interaction.view = view
+
+    async def defer(self, **kwargs):
+        self._respond()
+
+    async def edit_message(self, **kwargs):
+        self._respond()
+
+
+class FakeMessage:
+    """Stand-in for a sent followup message, progress edits just replace its content"""
+    _next_id = 1
+
+    def __init__(self, content):
+        self.id = FakeMessage._next_id
+        FakeMessage._next_id += 1
+        self.content = content
+        self.edits = 0
+
+    async def edit(self, content=None, **kwargs):
+        self.content = content
+        self.edits += 1
+
+
+class FakeFollowup:
+    """Stand-in for the interaction followup webhook"""
+    def __init__(self, interaction):
+        self.interaction = interaction
+
+    async def send(self, content=None, wait=False, **kwargs):
+        self.interaction.followups.append(content)
+        return FakeMessage(content) if wait else None
+
+
+class FakeInteraction:
+    """Stand-in for discord.Interaction"""
+    _next_id = 1
+
+    def __init__(self, guild):
+        self.id = FakeInteraction._next_id
+        FakeInteraction._next_id += 1
+        self.guild_id = guild.guild_id
+        self.channel_id = guild.text_channel.id
+        self.user = guild.member
+        self.response = FakeResponse(self)
+        self.followup = FakeFollowup(self)
+        self.followups = []
+        self.view = None
+        self.responded_at = None
+        self.extras = {}
+
+
+class SimulatedGuild:
+    """One guild with a listener in a voice channel, running random commands"""
+    def __init__(self, sim, index):
+        self.sim = sim
+        self.guild_id = 1000 + index
+        self.voice_channel = FakeVoiceChannel(200000 + index, sim.stats)
+        self.text_channel = FakeTextChannel(300000 + index)
+        self.member = FakeMember(400000 + index, self.voice_channel)
+        self.voice_channel.members.append(self.member)
+        self.voice_channel.voice_states[self.member.id] = self.member.voice
+        sim.text_channels[self.text_channel.id] = self.text_channel
+        self.rng = random.Random(sim.args.seed * 100003 + index)
+        self.requests = 0
+
+    def new_url(self, kind):
+        self.requests += 1
+        tag = f"{self.guild_id}x{self.requests}"
+        if kind == 'play_playlist':
+            return f"https://www.youtube.com/playlist?list=SIM{tag}"
+        if kind == 'play_spotify':
+            # Spotify IDs are 22 characters
+            return f"https://open.spotify.com/playlist/{tag:0>22}"
+        # Draw from a shared pool so popular songs repeat across guilds
+        return f"https://www.youtube.com/watch?v=vid{self.rng.randrange(self.sim.args.song_pool):08d}"
+
+    async def run_command(self, name):
+        interaction = FakeInteraction(self)
+        started = time.perf_counter()
+        try:
+            if name.startswith('play'):
+                await main.play.callback(interaction, self.new_url(name))
+            elif name == 'skip':
+                await main.skip.callback(interaction)
+            elif name == 'shuffle':
+                await main.shuffle.callback(interaction)
+            elif name == 'nowplaying':
+                await main.nowplaying.callback(interaction)
+            elif name == 'voice_drop':
+                player = main.music_players.get(self.guild_id)
+                if player is not None and player.voice_client is not None:
+                    player.voice_client.drop()
+            elif name == 'queue':
+                await main.queue.callback(interaction)
+                # Page through a few pages like a user clicking Next
+                for _ in range(self.rng.randint(0, 3)):
+                    if not interaction.view or not interaction.view.children:
+                        break
+                    await interaction.view.next_page(FakeInteraction(self))
+            else:
+                raise ValueError(f"Unknown command {name}")
+        except Exception as e:
+            self.sim.stats.command_errors[f"{name}: {type(e).__name__}"] += 1
+        finished = time.perf_counter()
+        stats = self.sim.stats
+        stats.command_latency[name].append((interaction.responded_at or finished) - started)
+        stats.command_total[name].append(finished - started)
+        for followup in interaction.followups:
+            if isinstance(followup, str) and followup.startswith('Error'):
+                stats.command_errors[f"{name}: {followup[:60]}"] += 1
+
+    async def run(self, deadline, mix_names, mix_weights):
+        # Start with some music, then act like a server full of people
+        await self.run_command('play')
+        while time.perf_counter() < deadline:
+            await asyncio.sleep(self.rng.expovariate(self.sim.args.rate))
+            if time.perf_counter() >= deadline:
+                break
+            await self.run_command(self.rng.choices(mix_names, mix_weights)[0])
+
+
+async def measure_loop_lag(stats, deadline):
+    """Wake up at a fixed interval and record how late the loop let us run"""
+    loop = asyncio.get_running_loop()
+    while time.perf_counter() < deadline:
+        expected = loop.time() + LOOP_LAG_INTERVAL
+        await asyncio.sleep(LOOP_LAG_INTERVAL)
+        stats.loop_lag.append(max(0, loop.time() - expected))
+
+
+def percentiles(values, scale=1000):
+    """p50/p95/p99/max of a list, in ms by default"""
+    if not values:
+        return {'count': 0}
+    ordered = sorted(values)
+
+    def at(fraction):
+        return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] * scale
+
+    return {
+        'count': len(ordered),
+        'p50': round(at(0.50), 2),
+        'p95': round(at(0.95), 2),
+        'p99': round(at(0.99), 2),
+        'max': round(ordered[-1] * scale, 2),
+    }
+
+
+def parse_mix(text):
+    """'play=30,skip=20' -> (['play', 'skip'], [30, 20])"""
+    names, weights = [], []
+    for pair in text.split(','):
+        name, weight = pair.split('=')
+        names.append(name.strip())
+        weights.append(float(weight))
+    return names, weights
+
+
+def install_fakes(sim):
+    """Swap the network-facing parts of the bot for local stand-ins"""
+    main.ytdl = FakeYoutubeDL(sim)
+    main.playlist_ytdl = FakeYoutubeDL(sim, flat=True)
+    main.spotify = FakeSpotify(sim)
+    discord.FFmpegPCMAudio = FakePCMAudio
+    main.bot.get_channel = sim.text_channels.get
+
+    if not sim.args.verbose:
+        # Count the bot's log lines instead of printing them
+        def quiet_print(*args, **kwargs):
+            # Numbers (guild ids, track names) are masked so similar lines group together
+            sim.stats.bot_log[re.sub(r'\d+', 'N', ' '.join(str(arg) for arg in args))[:70]] += 1
+
+        for module in (main, audio_cache, loudness, playlist_snapshots, state_backend):
+            module.print = quiet_print
+
+
+async def run_simulation(sim):
+    """Run every guild until the deadline and collect the results"""
+    args = sim.args
+    main.bot.loop = asyncio.get_running_loop()
+    if args.executor_workers:
+        asyncio.get_running_loop().set_default_executor(
+            concurrent.futures.ThreadPoolExecutor(max_workers=args.executor_workers)
+        )
+    mix_names, mix_weights = parse_mix(args.mix)
+    guilds = [SimulatedGuild(sim, i) for i in range(args.guilds)]
+
+    memory_before = main.get_process_memory()
+    started = time.perf_counter()
+    deadline = started + args.duration
+    lag_probe = asyncio.create_task(measure_loop_lag(sim.stats, deadline))
+
+    async def staggered(guild, index):
+        # Guilds don't all start at the same instant
+        await asyncio.sleep(index * args.ramp / max(1, args.guilds))
+        await guild.run(deadline, mix_names, mix_weights)
+
+    await asyncio.gather(*(staggered(guild, i) for i, guild in enumerate(guilds)))
+    await lag_probe
+    elapsed = time.perf_counter() - started
+
+    player_stats = main.get_player_stats()
+    memory_after = main.get_process_memory()
+
+    # Stop audio threads and actors before the loop closes
+    for player in list(main.music_players.values()):
+        player.play_generation += 1
+        if player.voice_client is not None:
+            player.voice_client.stop()
+        player.close()
+
+    stats = sim.stats
+    recovery_times = list(main.metrics.voice_recovery_seconds.values.values())
+    memory_per_guild = None
+    if memory_before and memory_after:
+        memory_per_guild = (memory_after - memory_before) / max(1, args.guilds)
+
+    return {
+        'settings': {key: value for key, value in vars(args).items() if key not in ('json', 'verbose')},
+        'elapsed_s': round(elapsed, 2),
+        'state_backend': type(main.state).__name__,
+        'loop_lag_ms': percentiles(stats.loop_lag),
+        'frame_lateness_ms': percentiles(list(stats.frame_lateness)),
+        'late_frames_pct': round(
+            100 * sum(1 for lateness in stats.frame_lateness if lateness > FRAME_LENGTH) / max(1, len(stats.frame_lateness)), 3
+        ),
+        'command_response_ms': {name: percentiles(values) for name, values in sorted(stats.command_latency.items())},
+        'command_total_ms': {name: percentiles(values) for name, values in sorted(stats.command_total.items())},
+        'command_errors': dict(stats.command_errors.most_common(20)),
+        'extractions': stats.extractions,
+        'extraction_failures': stats.extraction_failures,
+        'tracks_started': stats.tracks_started,
+        'max_concurrent_sources': stats.max_ffmpeg_processes,
+        'reports_sent': sum(channel.messages for channel in sim.text_channels.values()),
+        'players': player_stats,
+        'memory_per_guild_kb': round(memory_per_guild / 1024, 1) if memory_per_guild is not None else None,
+        'queue_bytes_per_guild': round(player_stats['queue_bytes'] / max(1, args.guilds)),
+        'top_bot_log': dict(stats.bot_log.most_common(10)),
+        'voice_recoveries': {key[0]: value for key, value in main.metrics.voice_recoveries.values.items()},
+        # The histogram only keeps buckets, so the mean is what's available
+        'voice_recovery_mean_ms': round(1000 * sum(entry[1] for entry in recovery_times)
+                                        / max(1, sum(entry[2] for entry in recovery_times)), 1),
+    }
+
+
+def print_report(results):
+    """Print results as a readable summary"""
+    def line(label, values):
+        if not values.get('count'):
+            return f"{label:<24} (no samples)"
+        return (f"{label:<24} p50 {values['p50']:8.2f}  p95 {values['p95']:8.2f}  "
+                f"p99 {values['p99']:8.2f}  max {values['max']:8.2f}  (n={values['count']})")
+
+    settings = results['settings']
+    print(f"\n{settings['guilds']} guilds for {results['elapsed_s']}s on the {results['state_backend']} backend")
+    print(line('event loop lag (ms)', results['loop_lag_ms']))
+    print(line('frame lateness (ms)', results['frame_lateness_ms']))
+    print(f"{'late frames (>20ms)':<24} {results['late_frames_pct']}%")
+    print("\ncommand response time (ms):")
+    for name, values in results['command_response_ms'].items():
+        print('  ' + line(name, values))
+    print("\ncommand completion time (ms):")
+    for name, values in results['command_total_ms'].items():
+        print('  ' + line(name, values))
+    print(f"\nextractions: {results['extractions']} ({results['extraction_failures']} failed), "
+          f"tracks started: {results['tracks_started']}, "
+          f"max concurrent sources: {results['max_concurrent_sources']}, "
+          f"failure reports: {results['reports_sent']}")
+    players = results['players']
+    print(f"players: {players['players']} ({players['connected']} in voice), "
+          f"{players['queued_tracks']} queued tracks, "
+          f"~{results['queue_bytes_per_guild'] / 1024:.1f} KB of queue per guild, "
+          f"memory per guild: {results['memory_per_guild_kb']} KB")
+    if results['voice_recoveries']:
+        print(f"voice recoveries: {results['voice_recoveries']}, "
+              f"mean time to audio: {results['voice_recovery_mean_ms']} ms")
+    if results['command_errors']:
+        print("\ncommand errors:")
+        for error, count in results['command_errors'].items():
+            print(f"  {count:6d}  {error}")
+    if results['top_bot_log']:
+        print("\nmost frequent bot log lines:")
+        for message, count in results['top_bot_log'].items():
+            print(f"  {count:6d}  {message}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulate many guilds using MikuBot at once")
+    parser.add_argument('--guilds', type=int, default=20, help="Number of simulated guilds")
+    parser.add_argument('--duration', type=float, default=60, help="Seconds to run for")
+    parser.add_argument('--ramp', type=float, default=5, help="Seconds over which guilds start")
+    parser.add_argument('--rate', type=float, default=0.2, help="Commands per second per guild")
+    parser.add_argument('--mix', default=DEFAULT_MIX, help="Command weights, e.g. play=30,skip=20")
+    parser.add_argument('--latency', type=float, default=0.5, help="Mean yt-dlp extraction time in seconds")
+    parser.add_argument('--failure-rate', type=float, default=0.02, help="Fraction of extractions that fail")
+    parser.add_argument('--spotify-latency', type=float, default=0.05, help="Seconds per Spotify API call")
+    parser.add_argument('--connect-latency', type=float, default=0.2, help="Seconds to join a voice channel")
+    parser.add_argument('--playlist-size', type=int, default=50, help="Tracks per YouTube/Spotify playlist")
+    parser.add_argument('--song-pool', type=int, default=500, help="Distinct single songs users pick from")
+    parser.add_argument('--track-length', type=int, nargs=2, default=[10, 30], metavar=('MIN', 'MAX'),
+                        help="Simulated track length range in seconds (short, so tracks turn over)")
+    parser.add_argument('--executor-workers', type=int, default=None, help="Default executor size (Python's default if unset)")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help="Write results to this file")
+    parser.add_argument('--verbose', action='store_true', help="Show the bot's own log output")
+    args = parser.parse_args()
+
+    SIM = Simulation(args)
+    install_fakes(SIM)
+    results = asyncio.run(run_simulation(SIM))
+    print_report(results)
+    if args.json:
+        with open(os.path.join(ORIGINAL_DIR, args.json), 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved results to {args.json}")
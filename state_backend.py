@@ -0,0 +1,226 @@
+"""
+MikuBot State Backend Module
+Stores persistent state (queues, loudness measurements, playlist snapshots, saved playlists, play counts) as
+JSON values grouped by namespace. The JSON file backend is the default; the
+SQLite and Redis backends can be shared by several bot processes.
+
+Select with STATE_BACKEND=json|sqlite|redis in .env. The redis backend needs the
+optional redis package, unless STATE_REDIS_URL=memory:// selects the in-process
+stand-in used by tests and the load simulation.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from dotenv import load_dotenv
+import metrics
+
+# Load environment variables
+load_dotenv()
+
+STATE_BACKEND = os.getenv('STATE_BACKEND', 'json').lower()
+STATE_SQLITE_PATH = os.getenv('STATE_SQLITE_PATH', 'mikubot_state.db')
+STATE_REDIS_URL = os.getenv('STATE_REDIS_URL', 'redis://localhost:6379/0')
+
+# Files used by the JSON backend, one per namespace
+JSON_FILES = {
+    'queues': 'queue_data.json',
+    'loudness': os.getenv('LOUDNESS_CACHE_FILE', 'loudness_cache.json'),
+    'playlists': os.getenv('PLAYLIST_SNAPSHOT_FILE', 'playlist_snapshots.json'),
+    'saved_playlists': os.getenv('SAVED_PLAYLIST_FILE', 'saved_playlists.json'),
+    'meta': 'bot_meta.json',
+}
+
+
+def _record_write(namespace, started, size):
+    """Update the persistence metrics for one write"""
+    metrics.state_write_seconds.observe(time.perf_counter() - started, namespace=namespace)
+    metrics.state_write_bytes.observe(size, namespace=namespace)
+
+
+class JsonFileBackend:
+    """Keeps each namespace in memory and rewrites its JSON file on every change (single process only)"""
+    shared = False
+
+    def __init__(self, files):
+        self.files = files
+        self.data = {}
+
+    def _namespace(self, namespace):
+        if namespace not in self.data:
+            path = self.files.get(namespace, f'{namespace}.json')
+            try:
+                with open(path, 'r') as f:
+                    self.data[namespace] = json.load(f)
+            except FileNotFoundError:
+                # File doesn't exist yet, that's okay
+                self.data[namespace] = {}
+            except Exception as e:
+                print(f"Error loading {path}: {e}")
+                self.data[namespace] = {}
+        return self.data[namespace]
+
+    def _write(self, namespace):
+        path = self.files.get(namespace, f'{namespace}.json')
+        started = time.perf_counter()
+        try:
+            tmp_file = path + '.tmp'
+            with open(tmp_file, 'w') as f:
+                json.dump(self.data[namespace], f, indent=2 if namespace == 'queues' else None)
+                size = f.tell()
+            os.replace(tmp_file, path)
+            _record_write(namespace, started, size)
+        except Exception as e:
+            print(f"Error writing {path}: {e}")
+
+    def get(self, namespace, key):
+        return self._namespace(namespace).get(key)
+
+    def get_all(self, namespace):
+        return dict(self._namespace(namespace))
+
+    def set(self, namespace, key, value):
+        self._namespace(namespace)[key] = value
+        self._write(namespace)
+
+    def set_many(self, namespace, items):
+        self._namespace(namespace).update(items)
+        self._write(namespace)
+
+    def delete(self, namespace, key):
+        if self._namespace(namespace).pop(key, None) is not None:
+            self._write(namespace)
+
+
+class SqliteBackend:
+    """Stores everything in one SQLite file, safe to share between processes on the same host"""
+    shared = True
+
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path, timeout=10, isolation_level=None)
+        # WAL lets readers in other processes work while one process writes
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS state ('
+            'namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, '
+            'PRIMARY KEY (namespace, key))'
+        )
+
+    def get(self, namespace, key):
+        row = self.conn.execute(
+            'SELECT value FROM state WHERE namespace = ? AND key = ?', (namespace, key)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_all(self, namespace):
+        rows = self.conn.execute('SELECT key, value FROM state WHERE namespace = ?', (namespace,))
+        return {key: json.loads(value) for key, value in rows}
+
+    def set(self, namespace, key, value):
+        self.set_many(namespace, {key: value})
+
+    def set_many(self, namespace, items):
+        started = time.perf_counter()
+        rows = [(namespace, key, json.dumps(value)) for key, value in items.items()]
+        with self.conn:
+            self.conn.execute('BEGIN')
+            self.conn.executemany('INSERT OR REPLACE INTO state (namespace, key, value) VALUES (?, ?, ?)', rows)
+        _record_write(namespace, started, sum(len(row[2]) for row in rows))
+
+    def delete(self, namespace, key):
+        self.conn.execute('DELETE FROM state WHERE namespace = ? AND key = ?', (namespace, key))
+
+
+class LocalRedisClient:
+    """
+    In-process stand-in for the few redis.Redis hash commands RedisBackend uses, so the
+    backend can be tested without a server. Keys and values come back as bytes like redis-py
+    """
+
+    def __init__(self):
+        self.hashes = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _bytes(value):
+        return value if isinstance(value, bytes) else str(value).encode()
+
+    def hget(self, name, key):
+        with self.lock:
+            return self.hashes.get(name, {}).get(self._bytes(key))
+
+    def hgetall(self, name):
+        with self.lock:
+            return dict(self.hashes.get(name, {}))
+
+    def hset(self, name, mapping):
+        with self.lock:
+            fields = self.hashes.setdefault(name, {})
+            for key, value in mapping.items():
+                fields[self._bytes(key)] = self._bytes(value)
+        return len(mapping)
+
+    def hdel(self, name, *keys):
+        with self.lock:
+            fields = self.hashes.get(name, {})
+            return sum(1 for key in keys if fields.pop(self._bytes(key), None) is not None)
+
+
+class RedisBackend:
+    """Stores each namespace as a hash on a Redis-compatible server, shared by every process"""
+    shared = True
+
+    def __init__(self, url):
+        if url.startswith('memory://'):
+            # Only shared within this process, for tests and simulations
+            self.client = LocalRedisClient()
+        else:
+            import redis  # Only needed for this backend
+            self.client = redis.Redis.from_url(url)
+
+    def _hash(self, namespace):
+        return f'mikubot:{namespace}'
+
+    def get(self, namespace, key):
+        value = self.client.hget(self._hash(namespace), key)
+        return json.loads(value) if value is not None else None
+
+    def get_all(self, namespace):
+        return {
+            key.decode(): json.loads(value)
+            for key, value in self.client.hgetall(self._hash(namespace)).items()
+        }
+
+    def set(self, namespace, key, value):
+        self.set_many(namespace, {key: value})
+
+    def set_many(self, namespace, items):
+        if items:
+            started = time.perf_counter()
+            mapping = {key: json.dumps(value) for key, value in items.items()}
+            self.client.hset(self._hash(namespace), mapping=mapping)
+            _record_write(namespace, started, sum(len(value) for value in mapping.values()))
+
+    def delete(self, namespace, key):
+        self.client.hdel(self._hash(namespace), key)
+
+
+_backend = None
+
+
+def get_backend():
+    """Get the configured state backend (created on first use)"""
+    global _backend
+    if _backend is None:
+        if STATE_BACKEND == 'sqlite':
+            _backend = SqliteBackend(STATE_SQLITE_PATH)
+        elif STATE_BACKEND == 'redis':
+            _backend = RedisBackend(STATE_REDIS_URL)
+        else:
+            if STATE_BACKEND != 'json':
+                print(f"Unknown STATE_BACKEND '{STATE_BACKEND}', using json")
+            _backend = JsonFileBackend(JSON_FILES)
+    return _backend
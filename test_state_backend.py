@@ -0,0 +1,53 @@
+"""
+Tests for state_backend.py, run against every backend (redis through its in-process stand-in)
+
+Usage:
+    python -m pytest test_state_backend.py
+"""
+
+import pytest
+import state_backend
+
+
+@pytest.fixture(params=['json', 'sqlite', 'redis'])
+def backend(request, tmp_path):
+    if request.param == 'json':
+        return state_backend.JsonFileBackend({namespace: str(tmp_path / f'{namespace}.json') for namespace in ('queues', 'loudness')})
+    if request.param == 'sqlite':
+        return state_backend.SqliteBackend(str(tmp_path / 'state.db'))
+    return state_backend.RedisBackend('memory://')
+
+
+def test_set_and_get(backend):
+    backend.set('queues', '1', {'queue': [{'title': 'Miku'}], 'loop_queue': True})
+    assert backend.get('queues', '1') == {'queue': [{'title': 'Miku'}], 'loop_queue': True}
+    assert backend.get('queues', '2') is None
+
+
+def test_set_many_and_get_all(backend):
+    backend.set_many('queues', {'1': {'position': 10}, '2': {'position': 20}})
+    backend.set('queues', '2', {'position': 25})
+    assert backend.get_all('queues') == {'1': {'position': 10}, '2': {'position': 25}}
+
+
+def test_namespaces_are_separate(backend):
+    backend.set('queues', '1', 'queue')
+    backend.set('loudness', '1', -14.0)
+    assert backend.get('queues', '1') == 'queue'
+    assert backend.get('loudness', '1') == -14.0
+
+
+def test_delete(backend):
+    backend.set('queues', '1', {'position': 10})
+    backend.delete('queues', '1')
+    backend.delete('queues', 'missing')
+    assert backend.get('queues', '1') is None
+    assert backend.get_all('queues') == {}
+
+
+def test_shared_backends_see_each_others_writes(tmp_path):
+    """Two processes share a SQLite file, simulated with two connections"""
+    path = str(tmp_path / 'state.db')
+    first, second = state_backend.SqliteBackend(path), state_backend.SqliteBackend(path)
+    first.set('queues', '1', {'position': 10})
+    assert second.get('queues', '1') == {'position': 10}
@@ -0,0 +1,110 @@
+"""
+Tests for urls.py
+
+Usage:
+    python -m pytest test_urls.py
+"""
+
+import pytest
+import urls
+
+VIDEO = 'dQw4w9WgXcQ'
+SPOTIFY_ID = '4uLU6hMCjMI75M1A2tKUQC'
+
+# (input, expected parse result)
+PARSE_CASES = [
+    # YouTube videos, every variant reduces to the video ID
+    (f"https://www.youtube.com/watch?v={VIDEO}", {'provider': 'youtube', 'kind': 'video', 'id': VIDEO}),
+    (f"https://youtu.be/{VIDEO}", {'provider': 'youtube', 'kind': 'video', 'id': VIDEO}),
+    (f"https://youtu.be/{VIDEO}?si=abc123", {'provider': 'youtube', 'kind': 'video', 'id': VIDEO}),
+    (f"https://music.youtube.com/watch?v={VIDEO}&feature=share", {'provider': 'youtube', 'kind': 'video', 'id': VIDEO}),
+    (f"https://m.youtube.com/watch?v={VIDEO}", {'provider': 'youtube', 'kind': 'video', 'id': VIDEO}),
+    (f"https://www.youtube.com/shorts/{VIDEO}", {'provider': 'youtube', 'kind': 'video', 'id': VIDEO}),
+    (f"https://www.youtube.com/live/{VIDEO}?si=xyz", {'provider': 'youtube', 'kind': 'video', 'id': VIDEO}),
+    (f"https://www.youtube.com/watch?v={VIDEO}&si=abc&t=30s", {'provider': 'youtube', 'kind': 'video', 'id': VIDEO}),
+    (f"https://www.youtube.com/watch?v={VIDEO}&list=PLabc", {'provider': 'youtube', 'kind': 'video', 'id': VIDEO}),
+    (f"youtube.com/watch?v={VIDEO}", {'provider': 'youtube', 'kind': 'video', 'id': VIDEO}),
+    # YouTube playlists
+    ("https://www.youtube.com/playlist?list=PLabc_123-x", {'provider': 'youtube', 'kind': 'playlist', 'id': 'PLabc_123-x'}),
+    ("https://music.youtube.com/playlist?list=PLabc&si=q", {'provider': 'youtube', 'kind': 'playlist', 'id': 'PLabc'}),
+    # Spotify links, including localized paths and desktop app URIs
+    (f"https://open.spotify.com/track/{SPOTIFY_ID}", {'provider': 'spotify', 'kind': 'track', 'id': SPOTIFY_ID}),
+    (f"https://open.spotify.com/track/{SPOTIFY_ID}?si=abc", {'provider': 'spotify', 'kind': 'track', 'id': SPOTIFY_ID}),
+    (f"https://open.spotify.com/intl-de/album/{SPOTIFY_ID}", {'provider': 'spotify', 'kind': 'album', 'id': SPOTIFY_ID}),
+    (f"https://open.spotify.com/intl-pt/playlist/{SPOTIFY_ID}", {'provider': 'spotify', 'kind': 'playlist', 'id': SPOTIFY_ID}),
+    (f"https://open.spotify.com/artist/{SPOTIFY_ID}", {'provider': 'spotify', 'kind': 'artist', 'id': SPOTIFY_ID}),
+    (f"spotify:track:{SPOTIFY_ID}", {'provider': 'spotify', 'kind': 'track', 'id': SPOTIFY_ID}),
+    (f"spotify:playlist:{SPOTIFY_ID}", {'provider': 'spotify', 'kind': 'playlist', 'id': SPOTIFY_ID}),
+    # Not links we handle
+    ("hatsune miku world is mine", None),
+    ("", None),
+    (None, None),
+    ("ytsearch:miku", None),
+    ("https://example.com/watch?v=dQw4w9WgXcQ", None),
+    ("https://www.youtube.com/watch?v=short", None),
+    ("https://www.youtube.com/channel/UCabc", None),
+    ("https://open.spotify.com/track/tooshort", None),
+    ("https://open.spotify.com/show/4uLU6hMCjMI75M1A2tKUQC", None),
+    ("spotify:episode:4uLU6hMCjMI75M1A2tKUQC", None),
+]
+
+# (input, expected canonical URL)
+CANONICAL_CASES = [
+    (f"https://youtu.be/{VIDEO}?si=abc&t=42", f"https://www.youtube.com/watch?v={VIDEO}"),
+    (f"https://music.youtube.com/watch?v={VIDEO}", f"https://www.youtube.com/watch?v={VIDEO}"),
+    (f"https://www.youtube.com/shorts/{VIDEO}", f"https://www.youtube.com/watch?v={VIDEO}"),
+    ("https://youtube.com/playlist?list=PLabc&si=x", "https://www.youtube.com/playlist?list=PLabc"),
+    (f"https://open.spotify.com/intl-fr/track/{SPOTIFY_ID}?si=1", f"https://open.spotify.com/track/{SPOTIFY_ID}"),
+    (f"spotify:album:{SPOTIFY_ID}", f"https://open.spotify.com/album/{SPOTIFY_ID}"),
+    # Anything else is left alone
+    ("ytsearch:miku", "ytsearch:miku"),
+    ("https://example.com/song.mp3", "https://example.com/song.mp3"),
+    # YouTube pages without a video or playlist ID are passed to yt-dlp as they are
+    ("https://www.youtube.com/@HatsuneMiku", "https://www.youtube.com/@HatsuneMiku"),
+    ("https://www.youtube.com/channel/UCabc", "https://www.youtube.com/channel/UCabc"),
+]
+
+
+@pytest.mark.parametrize('url, expected', PARSE_CASES)
+def test_parse(url, expected):
+    assert urls.parse(url) == expected
+
+
+@pytest.mark.parametrize('url, expected', CANONICAL_CASES)
+def test_canonicalize(url, expected):
+    assert urls.canonicalize(url) == expected
+
+
+@pytest.mark.parametrize('url, expected', [
+    (f"https://youtu.be/{VIDEO}", True),
+    ("https://www.youtube.com/@HatsuneMiku", True),
+    ("https://www.youtube.com/c/HatsuneMiku", True),
+    ("youtube.com/channel/UCabc", True),
+    ("https://music.youtube.com/browse/MPREb_abc", True),
+    ("https://example.com/youtube.com", False),
+    (f"https://open.spotify.com/track/{SPOTIFY_ID}", False),
+    ("ytsearch:miku", False),
+    ("hatsune miku", False),
+    (None, False),
+])
+def test_is_youtube(url, expected):
+    assert urls.is_youtube(url) == expected
+
+
+@pytest.mark.parametrize('url, expected', [
+    (f"https://youtu.be/{VIDEO}", VIDEO),
+    ("https://www.youtube.com/playlist?list=PLabc", None),
+    (f"https://open.spotify.com/track/{SPOTIFY_ID}", None),
+    ("not a link", None),
+])
+def test_video_id(url, expected):
+    assert urls.video_id(url) == expected
+
+
+@pytest.mark.parametrize('track, expected', [
+    ({'url': f"https://youtu.be/{VIDEO}", 'video_id': VIDEO}, VIDEO),
+    ({'url': f"https://youtu.be/{VIDEO}?t=10"}, f"https://www.youtube.com/watch?v={VIDEO}"),
+    ({'url': "ytsearch:miku"}, "ytsearch:miku"),
+])
+def test_track_key(track, expected):
+    assert urls.track_key(track) == expected
@@ -0,0 +1,117 @@
+"""
+MikuBot Trace Summary
+Summarizes the /play traces written by tracing.py: time to first audio and how
+long each stage takes, as percentiles.
+
+Usage:
+    python trace_summary.py                      # Read traces.jsonl (and its rotated files)
+    python trace_summary.py old/traces.jsonl     # Read specific files
+    python trace_summary.py --since 24           # Only traces from the last 24 hours
+    python trace_summary.py --guild 1234567890   # Only one server
+"""
+
+import argparse
+import glob
+import json
+import os
+import time
+from collections import Counter, defaultdict
+
+from tracing import TRACE_FILE
+
+
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def read_traces(paths, since=None, guild=None):
+    """Yield traces from JSONL files, skipping lines that can't be parsed"""
+    for path in paths:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        trace = json.loads(line)
+                    except ValueError:
+                        continue
+                    if since and trace.get('time', 0) < since:
+                        continue
+                    if guild and str(trace.get('guild')) != str(guild):
+                        continue
+                    yield trace
+        except OSError as e:
+            print(f"Can't read {path}: {e}")
+
+
+def stage_name(span):
+    """Group spans by name, and by kind where a stage has several (e.g. resolve[search])"""
+    return f"{span['name']}[{span['kind']}]" if span.get('kind') else span['name']
+
+
+def summarize(traces):
+    outcomes = Counter()
+    first_audio = []
+    stages = defaultdict(list)
+    errors = Counter()
+
+    for trace in traces:
+        outcomes[trace.get('outcome')] += 1
+        if trace.get('outcome') == 'error':
+            errors[trace.get('error', '')[:80]] += 1
+        if trace.get('outcome') != 'played':
+            continue
+        first_audio.append(trace['total_ms'])
+        # A stage can run more than once per request (e.g. a batch of Spotify searches at the same time),
+        # so count the wall time from its first start to its last end
+        extents = {}
+        for span in trace.get('spans', []):
+            name = stage_name(span)
+            start, end = span['start_ms'], span['start_ms'] + span['duration_ms']
+            first, last = extents.get(name, (start, end))
+            extents[name] = (min(first, start), max(last, end))
+        for name, (start, end) in extents.items():
+            stages[name].append(end - start)
+    return outcomes, first_audio, stages, errors
+
+
+def print_summary(outcomes, first_audio, stages, errors):
+    total = sum(outcomes.values())
+    print(f"{total} traced /play request(s): " + ', '.join(f"{count} {outcome}" for outcome, count in outcomes.most_common()))
+    if not first_audio:
+        print("No traces that reached the first audio frame")
+        return
+
+    first_audio.sort()
+    print(f"\n{'time to first audio':<28} p50 {percentile(first_audio, 0.5):9.1f} ms  "
+          f"p95 {percentile(first_audio, 0.95):9.1f} ms  p99 {percentile(first_audio, 0.99):9.1f} ms")
+
+    print(f"\n{'stage':<28} {'p50 (ms)':>10} {'p95 (ms)':>10} {'p99 (ms)':>10} {'seen in':>8} {'share':>7}")
+    total_time = sum(first_audio)
+    # Slowest stages first, by their total contribution
+    for name, durations in sorted(stages.items(), key=lambda item: -sum(item[1])):
+        durations.sort()
+        print(f"{name:<28} {percentile(durations, 0.5):10.1f} {percentile(durations, 0.95):10.1f} "
+              f"{percentile(durations, 0.99):10.1f} {len(durations) * 100 / len(first_audio):7.0f}% "
+              f"{sum(durations) * 100 / total_time:6.1f}%")
+
+    if errors:
+        print("\nErrors:")
+        for error, count in errors.most_common(10):
+            print(f"  {count:6d}  {error}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarize MikuBot /play traces")
+    parser.add_argument('files', nargs='*', help=f"Trace files (default: {TRACE_FILE} and its rotated files)")
+    parser.add_argument('--since', type=float, help="Only traces from the last N hours")
+    parser.add_argument('--guild', help="Only traces from this server ID")
+    args = parser.parse_args()
+
+    files = args.files or sorted(glob.glob(TRACE_FILE + '.*'), reverse=True) + [TRACE_FILE]
+    files = [path for path in files if os.path.exists(path)]
+    if not files:
+        print("No trace files found (set TRACE_SAMPLE_RATE in .env to start tracing)")
+        raise SystemExit(1)
+
+    since = time.time() - args.since * 3600 if args.since else None
+    print_summary(*summarize(read_traces(files, since, args.guild)))
@@ -0,0 +1,142 @@
+"""
+MikuBot Tracing Module
+Lightweight span tracing of /play, from the command to the first audio frame, so
+we can tell which stage (Spotify lookup, search, extraction, ffmpeg startup...) is slow.
+
+A sample of traces is appended to a rotating JSONL file; summarize it with
+`python trace_summary.py`. Disabled unless TRACE_SAMPLE_RATE is set in .env
+"""
+
+import json
+import logging
+import logging.handlers
+import os
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager, nullcontext
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', '0'))  # Fraction of /play commands traced
+TRACE_FILE = os.getenv('TRACE_FILE', 'traces.jsonl')
+TRACE_MAX_MB = int(os.getenv('TRACE_MAX_MB', '10'))  # Rotate the file at this size
+TRACE_BACKUPS = 3  # Rotated files kept (traces.jsonl.1 ... .3)
+
+# Spotify playlists add many songs through one interaction, don't let one trace grow without bound
+MAX_SPANS = 50
+
+_logger = None
+
+
+def _get_logger():
+    """Logger writing one JSON trace per line (created on first use; thread-safe, traces can end on the voice thread)"""
+    global _logger
+    if _logger is None:
+        _logger = logging.getLogger('mikubot.traces')
+        _logger.setLevel(logging.INFO)
+        _logger.propagate = False
+        handler = logging.handlers.RotatingFileHandler(
+            TRACE_FILE, maxBytes=TRACE_MAX_MB * 1024 * 1024, backupCount=TRACE_BACKUPS, encoding='utf-8'
+        )
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        _logger.addHandler(handler)
+    return _logger
+
+
+class Trace:
+    """A sampled request: timed spans, written out once when it finishes"""
+    sampled = True
+
+    def __init__(self, name, tags):
+        self.id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.tags = tags
+        self.started = time.perf_counter()
+        self.wall_time = time.time()
+        self.spans = []
+        self.playback_started = False  # Set once this request started loading a song
+        self.finished = False
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name, **tags):
+        """Time the with block as a span (errors are recorded and re-raised)"""
+        started = time.perf_counter()
+        error = None
+        try:
+            yield
+        except Exception as e:
+            error = type(e).__name__
+            raise
+        finally:
+            self.add_span(name, started, time.perf_counter(), error=error, **tags)
+
+    def add_span(self, name, started, ended, **tags):
+        """Record a span from perf_counter start/end times"""
+        with self._lock:
+            if self.finished or len(self.spans) >= MAX_SPANS:
+                return
+            span = {
+                'name': name,
+                'start_ms': round((started - self.started) * 1000, 2),
+                'duration_ms': round((ended - started) * 1000, 2),
+            }
+            span.update({key: value for key, value in tags.items() if value is not None})
+            self.spans.append(span)
+
+    def finish(self, outcome, **tags):
+        """Write the trace out (only the first call counts)"""
+        with self._lock:
+            if self.finished:
+                return
+            self.finished = True
+            record = {
+                'trace': self.id,
+                'name': self.name,
+                'time': round(self.wall_time, 3),
+                'outcome': outcome,
+                'total_ms': round((time.perf_counter() - self.started) * 1000, 2),
+                **self.tags,
+                **{key: value for key, value in tags.items() if value is not None},
+                'spans': self.spans,
+            }
+        try:
+            _get_logger().info(json.dumps(record))
+        except Exception as e:
+            print(f"Error writing trace: {e}")
+
+
+class NullTrace:
+    """Stands in for a trace when the request wasn't sampled, so callers don't need to check"""
+    sampled = False
+    playback_started = False
+    finished = True
+
+    def span(self, name, **tags):
+        return nullcontext()
+
+    def add_span(self, name, started, ended, **tags):
+        pass
+
+    def finish(self, outcome, **tags):
+        pass
+
+
+NULL_TRACE = NullTrace()
+
+
+def start_trace(name, **tags):
+    """Start a trace for a sampled fraction of requests (a NullTrace for the rest)"""
+    if TRACE_SAMPLE_RATE <= 0 or random.random() >= TRACE_SAMPLE_RATE:
+        return NULL_TRACE
+    return Trace(name, tags)
+
+
+def get_trace(ctx):
+    """The trace attached to an interaction (a NullTrace if there isn't one)"""
+    extras = getattr(ctx, 'extras', None)
+    return extras.get('trace', NULL_TRACE) if extras else NULL_TRACE
@@ -0,0 +1,130 @@
+"""
+MikuBot URL Module
+Recognizes YouTube and Spotify links and reduces them to one canonical form, so
+every variant of the same video or playlist (youtu.be, music.youtube.com, /shorts/,
+&si= and &t= parameters, Spotify intl-xx paths...) is the same key for caches,
+saved state and duplicate checks.
+"""
+
+import re
+from urllib.parse import urlparse, parse_qs
+
+YOUTUBE_HOSTS = {'youtube.com', 'm.youtube.com', 'music.youtube.com', 'youtube-nocookie.com'}
+SPOTIFY_HOSTS = {'open.spotify.com', 'play.spotify.com'}
+SPOTIFY_KINDS = ('track', 'album', 'playlist', 'artist')
+
+VIDEO_ID = re.compile(r'^[A-Za-z0-9_-]{11}$')
+PLAYLIST_ID = re.compile(r'^[A-Za-z0-9_-]{2,64}$')
+SPOTIFY_ID = re.compile(r'^[A-Za-z0-9]{22}$')
+
+# YouTube paths with the video ID as the next segment
+VIDEO_PATHS = ('shorts', 'live', 'embed', 'v', 'e')
+
+
+def _host(parsed):
+    host = (parsed.hostname or '').lower()
+    return host[4:] if host.startswith('www.') else host
+
+
+def _youtube(parsed):
+    host = _host(parsed)
+    segments = [segment for segment in parsed.path.split('/') if segment]
+    query = parse_qs(parsed.query)
+
+    if host == 'youtu.be':
+        video_id = segments[0] if segments else None
+    elif host in YOUTUBE_HOSTS:
+        if segments == ['playlist']:
+            playlist_id = query.get('list', [None])[0]
+            if playlist_id and PLAYLIST_ID.match(playlist_id):
+                return {'provider': 'youtube', 'kind': 'playlist', 'id': playlist_id}
+            return None
+        if segments == ['watch']:
+            # A video opened from a playlist (&list=) still means that one video
+            video_id = query.get('v', [None])[0]
+        elif len(segments) >= 2 and segments[0] in VIDEO_PATHS:
+            video_id = segments[1]
+        else:
+            return None
+    else:
+        return None
+
+    if video_id and VIDEO_ID.match(video_id):
+        return {'provider': 'youtube', 'kind': 'video', 'id': video_id}
+    return None
+
+
+def _spotify(parsed):
+    if _host(parsed) not in SPOTIFY_HOSTS:
+        return None
+    segments = [segment for segment in parsed.path.split('/') if segment]
+    # Localized links (/intl-de/track/...) and embeds (/embed/track/...) carry a prefix
+    while segments and (segments[0].startswith('intl-') or segments[0] == 'embed'):
+        segments = segments[1:]
+    if len(segments) >= 2 and segments[0] in SPOTIFY_KINDS and SPOTIFY_ID.match(segments[1]):
+        return {'provider': 'spotify', 'kind': segments[0], 'id': segments[1]}
+    return None
+
+
+def parse(url):
+    """
+    Classify a link as {'provider': 'youtube'|'spotify', 'kind': ..., 'id': ...}
+    YouTube kinds are video and playlist; Spotify kinds are track, album, playlist and artist.
+    Returns None for anything else (including search text)
+    """
+    if not url:
+        return None
+    url = url.strip()
+    if url.startswith('spotify:'):
+        # spotify:track:<id> URIs from the desktop app
+        parts = url.split(':')
+        if len(parts) == 3 and parts[1] in SPOTIFY_KINDS and SPOTIFY_ID.match(parts[2]):
+            return {'provider': 'spotify', 'kind': parts[1], 'id': parts[2]}
+        return None
+    if '://' not in url:
+        url = 'https://' + url
+    try:
+        parsed = urlparse(url)
+    except ValueError:
+        return None
+    return _youtube(parsed) or _spotify(parsed)
+
+
+def is_youtube(url):
+    """Whether a URL is on a YouTube host, including pages parse() doesn't classify (channels, @handles)"""
+    if not url or url.startswith('ytsearch'):
+        return False
+    url = url.strip()
+    if '://' not in url:
+        url = 'https://' + url
+    try:
+        host = _host(urlparse(url))
+    except ValueError:
+        return False
+    return host == 'youtu.be' or host in YOUTUBE_HOSTS
+
+
+def build(link):
+    """The canonical URL for a parsed link"""
+    if link['provider'] == 'spotify':
+        return f"https://open.spotify.com/{link['kind']}/{link['id']}"
+    if link['kind'] == 'playlist':
+        return f"https://www.youtube.com/playlist?list={link['id']}"
+    return f"https://www.youtube.com/watch?v={link['id']}"
+
+
+def canonicalize(url):
+    """The canonical form of a YouTube or Spotify URL, anything else is returned unchanged"""
+    link = parse(url)
+    return build(link) if link else url
+
+
+def video_id(url):
+    """The YouTube video ID in a URL, None if it isn't a video link"""
+    link = parse(url)
+    return link['id'] if link and link['provider'] == 'youtube' and link['kind'] == 'video' else None
+
+
+def track_key(track):
+    """Stable identity of a queue track: its video ID, else its canonical URL (e.g. a ytsearch: query)"""
+    return track.get('video_id') or canonicalize(track.get('url'))